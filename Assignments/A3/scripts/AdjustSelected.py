@@ -0,0 +1,251 @@
+""" AdjustSelected - adjustSelected from the 16th Jan tutorial, in bulk.
+
+    For every selected mesh the tutorial compares the normal of each face
+    (from its first three points, (b - a) x (c - a)) with the vector from
+    the myRef locator to the mesh, deletes the faces facing the way asked
+    for and extrudes the rest one unit along their normals. It does so a
+    face at a time: a polyInfo string to parse, three getAttr queries and
+    one delete or extrude per face. Here the points and face vertices of
+    each mesh come from one MFnMesh call each, every normal (with
+    LegoMeshOps.face_normals) and dot product is worked out at once (with numpy when it is installed) and
+    the faces are deleted and extruded in one command each.
+
+    Two slips of the MEL are not carried over: "obtuse" picks the faces
+    with a negative dot product (the MEL tests > 0 like "acute"), and the
+    faces are extruded before any are deleted, so deleting does not shift
+    the ids of the faces still to come. "move" moves the faces along their
+    normals instead of extruding them. maya is only imported to work on
+    the selection; the maths runs without it:
+
+      python AdjustSelected.py --faces 20000 """
+
+from array import array
+import argparse
+import math
+import sys
+import time
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+import LegoGeometry
+import LegoMeshOps
+
+
+# how far from zero a dot product may be and still count as "right".
+right_tolerance = 1e-9
+
+
+def face_normals(points, counts, connects):
+  """ The unit normal of every face from its first three points, as flat
+      xyz, see LegoMeshOps.face_normals. points is flat xyz. """
+  mesh = LegoGeometry.Mesh()
+  mesh.points = array('d', points)
+  mesh.counts = array('i', counts)
+  mesh.connects = array('i', connects)
+  return LegoMeshOps.face_normals(mesh, first_three=True)
+
+
+def facing(normals, direction):
+  """ The dot product of every unit normal (flat xyz) with direction made
+      unit. """
+  length = math.sqrt(sum(value * value for value in direction)) or 1.0
+  unit = [value / length for value in direction]
+  if numpy is not None:
+    return numpy.asarray(normals, dtype=float).reshape(-1, 3).dot(unit)
+  return [normals[i] * unit[0] + normals[i + 1] * unit[1] + normals[i + 2] * unit[2] for i in range(0, len(normals), 3)]
+
+
+def pick(dots, direction):
+  """ The ids of the faces whose dot product matches direction: "acute"
+      (> 0), "obtuse" (< 0) or "right" (0). """
+  if direction == "acute":
+    test = lambda dot: dot > 0
+  elif direction == "obtuse":
+    test = lambda dot: dot < 0
+  elif direction == "right":
+    test = lambda dot: abs(dot) <= right_tolerance
+  else:
+    raise ValueError("direction must be acute, obtuse or right, not %r" % direction)
+  if numpy is not None:
+    dots = numpy.asarray(dots)
+    return numpy.nonzero(test(dots) if direction != "right" else numpy.abs(dots) <= right_tolerance)[0].tolist()
+  return [face for face, dot in enumerate(dots) if test(dot)]
+
+
+def face_ranges(mesh, faces):
+  """ Component names covering sorted face ids in as few ranges as they
+      allow, e.g. ["pSphere1.f[0:3]", "pSphere1.f[7]"]. """
+  ranges = []
+  start = previous = None
+  for face in faces:
+    if start is not None and face == previous + 1:
+      previous = face
+      continue
+    if start is not None:
+      ranges.append((start, previous))
+    start = previous = face
+  if start is not None:
+    ranges.append((start, previous))
+  return ["%s.f[%d]" % (mesh, a) if a == b else "%s.f[%d:%d]" % (mesh, a, b) for a, b in ranges]
+
+
+def read_mesh(mesh):
+  """ The flat xyz object space points, face counts and face vertex ids
+      of a mesh, one MFnMesh call each. """
+  import maya.api.OpenMaya as om
+  shape = om.MFnMesh(om.MSelectionList().add(mesh).getDagPath(0))
+  points = []
+  for point in shape.getPoints(om.MSpace.kObject):
+    points.extend((point.x, point.y, point.z))
+  counts, connects = shape.getVertices()
+  return points, list(counts), list(connects)
+
+
+def world_position(node):
+  import maya.cmds as cmds
+  return cmds.xform(node, query=True, matrix=True, worldSpace=True)[12:15]
+
+
+def adjust_selected(action, direction, reference="myRef", selection=None):
+  """ Deletes the faces of every selected mesh that face direction
+      relative to the vector from reference to the mesh and extrudes (or
+      moves) the others by one unit along their normals. Returns the
+      deleted and adjusted face counts per mesh. """
+  import maya.cmds as cmds
+  if selection is None:
+    selection = cmds.ls(selection=True, type="transform")
+  meshes = cmds.filterExpand(selection, selectionMask=12) or []
+  origin = world_position(reference)
+  report = {}
+  for mesh in meshes:
+    position = world_position(mesh)
+    points, counts, connects = read_mesh(mesh)
+    dots = facing(face_normals(points, counts, connects), [position[k] - origin[k] for k in range(0, 3)])
+    deleted = pick(dots, direction)
+    doomed = set(deleted)
+    kept = [face for face in range(0, len(counts)) if face not in doomed]
+    if kept and action == "extrude":
+      cmds.polyExtrudeFacet(face_ranges(mesh, kept), keepFacesTogether=False, localTranslateZ=1.0)
+    elif kept and action == "move":
+      cmds.polyMoveFacet(face_ranges(mesh, kept), localTranslateZ=1.0)
+    else:
+      kept = []
+    if deleted:
+      cmds.polyDelFacet(face_ranges(mesh, deleted))
+    report[mesh] = (len(deleted), len(kept))
+  return report
+
+
+def adjust_selected_per_face(action, direction, reference="myRef", selection=None):
+  """ The tutorial's loop as it is, a face at a time, for comparing. """
+  import maya.cmds as cmds
+  if selection is None:
+    selection = cmds.ls(selection=True, type="transform")
+  origin = world_position(reference)
+  report = {}
+  for mesh in cmds.filterExpand(selection, selectionMask=12) or []:
+    position = world_position(mesh)
+    direction_vector = [position[k] - origin[k] for k in range(0, 3)]
+    deleted = adjusted = 0
+    for face in range(0, cmds.polyEvaluate(mesh, face=True)):
+      ids = [int(value) for value in cmds.polyInfo("%s.f[%d]" % (mesh, face), faceToVertex=True)[0].split()[2:]]
+      a, b, c = [cmds.getAttr("%s.vt[%d]" % (mesh, i))[0] for i in ids[:3]]
+      normal = face_normals(list(a) + list(b) + list(c), [3], [0, 1, 2])
+      dot = facing(normal, direction_vector)[0]
+      if pick([dot], direction):
+        cmds.polyDelFacet("%s.f[%d]" % (mesh, face))
+        deleted += 1
+      elif action == "extrude":
+        cmds.polyExtrudeFacet("%s.f[%d]" % (mesh, face), translate=tuple(normal))
+        adjusted += 1
+      elif action == "move":
+        cmds.polyMoveFacet("%s.f[%d]" % (mesh, face), localTranslateZ=1.0)
+        adjusted += 1
+    report[mesh] = (deleted, adjusted)
+  return report
+
+
+# BENCHMARK
+
+def sphere(radius, rings, segments):
+  """ A quad sphere (triangles at the poles) like polySphere, as flat
+      points, counts and face vertex ids. """
+  points = [0.0, -radius, 0.0]
+  for ring in range(1, rings):
+    polar = math.pi * ring / rings
+    for segment in range(0, segments):
+      azimuth = 2 * math.pi * segment / segments
+      points.extend((radius * math.sin(polar) * math.cos(azimuth), -radius * math.cos(polar),
+                     -radius * math.sin(polar) * math.sin(azimuth)))
+  points.extend((0.0, radius, 0.0))
+  top = len(points) // 3 - 1
+  ring_start = lambda ring: 1 + (ring - 1) * segments
+  counts, connects = [], []
+  for segment in range(0, segments):
+    following = (segment + 1) % segments
+    counts.append(3)
+    connects.extend((0, ring_start(1) + following, ring_start(1) + segment))
+  for ring in range(1, rings - 1):
+    for segment in range(0, segments):
+      following = (segment + 1) % segments
+      counts.append(4)
+      connects.extend((ring_start(ring) + segment, ring_start(ring) + following,
+                       ring_start(ring + 1) + following, ring_start(ring + 1) + segment))
+  for segment in range(0, segments):
+    following = (segment + 1) % segments
+    counts.append(3)
+    connects.extend((ring_start(rings - 1) + segment, ring_start(rings - 1) + following, top))
+  return points, counts, connects
+
+
+def benchmark(faces=20000, action="extrude"):
+  """ Runs both versions of action on a fake scene holding the tutorial's
+      set up, a sphere at (-10, 0, -10) with about faces faces and myRef
+      at (20, 5, 20), and returns the calls and time each took. """
+  import FakeCmds
+  scene = FakeCmds.FakeScene()
+  recorder = FakeCmds.Recorder(scene)
+  FakeCmds.install(scene, recorder)
+  import maya.api.OpenMaya as om
+  side = max(3, int(math.sqrt(faces / 2.0)))
+  points, counts, connects = sphere(5, side, 2 * side)
+  report = {"faces" : len(counts), "numpy" : numpy is not None, "action" : action}
+  for label, adjust in (("per_face", adjust_selected_per_face), ("bulk", adjust_selected)):
+    vertices = [om.MPoint(points[i], points[i + 1], points[i + 2]) for i in range(0, len(points), 3)]
+    mesh = om.MFnDependencyNode(om.MFnMesh().create(vertices, counts, connects)).setName("myCube")
+    scene.move(-10, 0, -10, mesh)
+    if not scene.objExists("myRef"):
+      scene.move(20, 5, 20, scene.spaceLocator(name="myRef")[0])
+    recorder.reset()
+    start = time.time()
+    result = adjust(action=action, direction="acute", selection=[mesh])
+    report[label] = {
+      "seconds" : time.time() - start,
+      "calls" : sum(recorder.calls.values()),
+      "deleted" : result[mesh][0],
+      "adjusted" : result[mesh][1]
+    }
+    scene.delete(mesh)
+  FakeCmds.uninstall()
+  return report
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Compare the bulk and per face adjustSelected on a fake scene.")
+  parser.add_argument("--faces", type=int, default=20000)
+  parser.add_argument("--action", choices=("extrude", "move"), default="extrude")
+  arguments = parser.parse_args(argv)
+  report = benchmark(arguments.faces, arguments.action)
+  print("%d faces, normals with %s" % (report["faces"], "numpy" if report["numpy"] else "python"))
+  for label in ("per_face", "bulk"):
+    print("%s: %d calls, %.3fs, %d deleted, %d %s" % ((label, report[label]["calls"], report[label]["seconds"],
+                                                     report[label]["deleted"], report[label]["adjusted"], report["action"] + "d")))
+  same = all(report["per_face"][key] == report["bulk"][key] for key in ("deleted", "adjusted"))
+  return 0 if same else 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,891 @@
+""" FakeCmds - a stand in for maya.cmds so LegoBuilder can run without Maya.
+
+    Call install() before importing LegoBuilder and every maya.cmds and
+    maya.api.OpenMaya call is answered by a FakeScene living in memory. """
+
+import fnmatch
+import importlib
+import os
+import sys
+import time
+import types
+
+
+class FakeNode:
+  """ A node in the fake dependency graph. """
+  def __init__(self, name, node_type):
+    self.name = name
+    self.node_type = node_type
+    self.attrs = {}
+
+
+class FakeMObject:
+  """ What the node added callbacks are handed, like an MObject, and what
+      MSelectionList.getDagPath hands out, like an MDagPath. """
+  scene = None
+
+  def __init__(self, name):
+    self.node_name = name
+
+  def inclusiveMatrix(self):
+    return list(self.scene.nodes[self.node_name].attrs.get("matrix", self.scene.identity))
+
+
+class FakeMObjectHandle:
+  """ Mirrors maya.api.OpenMaya.MObjectHandle: follows its node through
+      renames and knows when it has been deleted. """
+  scene = None
+
+  def __init__(self, mobject):
+    self.node = self.scene.nodes[mobject.node_name]
+
+  def isValid(self):
+    return self.scene.nodes.get(self.node.name) is self.node
+
+  def object(self):
+    return FakeMObject(self.node.name)
+
+
+class FakeScene:
+  """ Holds the fake scene and answers the subset of maya.cmds that the
+      LegoBuilder scripts use. Commands are looked up by name, so the
+      scene can be handed out as the maya.cmds module itself. """
+
+  def __init__(self):
+    self.nodes = {}
+    self.controls = {}
+    self.selection = []
+    self.callbacks = {}
+    self.next_callback_id = 0
+    self.type_counters = {}
+    self.nodes_created = 0
+    self.batch = False
+    self.deferred = []
+    self.attribute_callbacks = {}
+    self.removal_callbacks = {}
+    self.scene_callbacks = {}
+    self.file_info = {}
+    self.saved_files = {}
+    self.member_of = {}
+    self.progress = {}
+    self.undo_queue = []
+    self.redo_queue = []
+    self.chunk_depth = 0
+    self.add_node("initialShadingGroup", "shadingEngine")
+
+  # scene bookkeeping
+
+  def populate(self, count, prefix="pCube"):
+    """ Fill the scene with count plain transforms, for timing tests. """
+    for i in range(0, count):
+      self.nodes[prefix + str(i + 1)] = FakeNode(prefix + str(i + 1), "transform")
+
+  def unique(self, name):
+    if name not in self.nodes:
+      return name
+    stem = name.rstrip("0123456789")
+    i = 1
+    while stem + str(i) in self.nodes:
+      i += 1
+    return stem + str(i)
+
+  def default_name(self, node_type):
+    self.type_counters[node_type] = self.type_counters.get(node_type, 0) + 1
+    return self.unique(node_type + str(self.type_counters[node_type]))
+
+  def add_node(self, name, node_type):
+    name = self.unique(name or self.default_name(node_type))
+    self.nodes[name] = FakeNode(name, node_type)
+    self.nodes_created += 1
+    for callback in list(self.callbacks.values()):
+      callback(FakeMObject(name), None)
+    return name
+
+  def add_poly(self, name, history_type, inputs=()):
+    """ A poly command's transform, shape and history node. The history
+        of the inputs is carried over and their shapes are left behind as
+        intermediate objects, like polyUnite and polyBoolOp do. """
+    transform = self.add_node(name, "transform")
+    shape = self.add_node(transform + "Shape", "mesh")
+    history = [self.add_node(None, history_type)]
+    for target in self.flatten(inputs):
+      input_shape = self.nodes.get(self.node_of(target) + "Shape")
+      if input_shape is not None:
+        history.extend(input_shape.attrs.pop("history", []))
+        input_shape.attrs["intermediateObject"] = True
+    self.nodes[shape].attrs["history"] = history
+    return [transform, history[0]]
+
+  def add_history(self, target, history_type):
+    history = self.add_node(None, history_type)
+    shape = self.nodes.get(self.node_of(target) + "Shape")
+    if shape is not None:
+      shape.attrs.setdefault("history", []).append(history)
+    return [history]
+
+  def flatten(self, objects):
+    names = []
+    for target in objects:
+      names.extend(target if isinstance(target, (list, tuple)) else [target])
+    return names
+
+  def node_of(self, target):
+    return target.split(".")[0]
+
+  # maya.cmds
+
+  def ls(self, *patterns, **kwargs):
+    names = list(self.selection if kwargs.get("selection") else self.nodes.keys())
+    if patterns:
+      names = [name for name in names if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+    node_type = kwargs.get("type")
+    if node_type is not None:
+      names = [name for name in names if self.nodes[name].node_type == node_type]
+    return names
+
+  def objExists(self, name):
+    return self.node_of(name) in self.nodes
+
+  def polyCube(self, name=None, **kwargs):
+    return self.add_poly(name, "polyCube")
+
+  def polyCylinder(self, name=None, **kwargs):
+    return self.add_poly(name, "polyCylinder")
+
+  def polyPipe(self, name=None, **kwargs):
+    return self.add_poly(name, "polyPipe")
+
+  def polyUnite(self, *objects, **kwargs):
+    return self.add_poly(kwargs.get("name", kwargs.get("n")), "polyUnite", objects)
+
+  def polyBoolOp(self, *objects, **kwargs):
+    return self.add_poly(kwargs.get("name", kwargs.get("n")), "polyBoolOp", objects)
+
+  def polyMergeVertex(self, *objects, **kwargs):
+    return self.add_history(self.flatten(objects)[0], "polyMergeVert")
+
+  def polyExtrudeFacet(self, *faces, **kwargs):
+    return self.add_history(self.flatten(faces)[0], "polyExtrudeFace")
+
+  def polyMoveFacet(self, *faces, **kwargs):
+    return self.add_history(self.flatten(faces)[0], "polyMoveFace")
+
+  def polyDelFacet(self, *faces, **kwargs):
+    """ Only records the deletion, the faces keep their ids. """
+    return self.add_history(self.flatten(faces)[0], "deleteComponent")
+
+  def mesh_attrs(self, target):
+    return self.nodes[self.node_of(target) + "Shape"].attrs
+
+  def polyEvaluate(self, *objects, **kwargs):
+    attrs = self.mesh_attrs(self.flatten(objects)[0])
+    if kwargs.get("face") or kwargs.get("f"):
+      return len(attrs["counts"])
+    return len(attrs["points"])
+
+  def polyInfo(self, *components, **kwargs):
+    """ faceToVertex only, in Maya's "FACE  0:  0  1  3  2" lines. """
+    lines = []
+    for component in self.flatten(components):
+      attrs = self.mesh_attrs(component)
+      face = int(component.split("[")[1].rstrip("]"))
+      start = sum(attrs["counts"][:face])
+      ids = attrs["connects"][start:start + attrs["counts"][face]]
+      lines.append("FACE %6d: " % face + "".join("%6d " % vertex_id for vertex_id in ids) + "\n")
+    return lines
+
+  def listRelatives(self, *objects, **kwargs):
+    """ Children (or all descendants) of a transform, its shape included. """
+    found = []
+    for name in self.flatten(objects):
+      names = list(self.nodes[name].attrs.get("children", []))
+      if name + "Shape" in self.nodes:
+        names.insert(0, name + "Shape")
+      for child in names:
+        node = self.nodes.get(child)
+        if node is None:
+          continue
+        if kwargs.get("noIntermediate") and node.attrs.get("intermediateObject"):
+          continue
+        if kwargs.get("shapes") and node.node_type in ("transform", "lodGroup"):
+          continue
+        found.append(child)
+        if kwargs.get("allDescendents") and node.node_type in ("transform", "lodGroup"):
+          found.extend(self.listRelatives(child, **kwargs) or [])
+    return found or None
+
+  def lattice(self, *objects, **kwargs):
+    name = kwargs.get("name", kwargs.get("n"))
+    return [self.add_node(name, "ffd"), self.add_node(None, "lattice"), self.add_node(None, "baseLattice")]
+
+  def shadingNode(self, node_type, name=None, **kwargs):
+    return self.add_node(name, node_type)
+
+  def spaceLocator(self, name=None, **kwargs):
+    transform = self.add_node(name, "transform")
+    self.add_node(transform + "Shape", "locator")
+    return [transform]
+
+  def filterExpand(self, *objects, **kwargs):
+    """ Selection masks 12 (meshes) and 22 (locators) only. """
+    wanted = {12 : "mesh", 22 : "locator"}[kwargs.get("selectionMask", kwargs.get("sm"))]
+    found = [name for name in self.flatten(objects)
+             if name + "Shape" in self.nodes and self.nodes[name + "Shape"].node_type == wanted]
+    return found or None
+
+  def createNode(self, node_type, name=None, **kwargs):
+    return self.add_node(name or kwargs.get("n"), node_type)
+
+  def parent(self, *objects, **kwargs):
+    children = []
+    for target in objects[:-1]:
+      children.extend(target if isinstance(target, list) else [target])
+    for child in children:
+      self.nodes[child].attrs["parent"] = objects[-1]
+      self.nodes[objects[-1]].attrs.setdefault("children", []).append(child)
+    return children
+
+  def move(self, *args, **kwargs):
+    """ Absolute moves only, kept as the translation of a matrix. """
+    for name in self.flatten(args[3:]):
+      node = self.nodes[self.node_of(name)]
+      matrix = list(node.attrs.get("matrix", self.identity))
+      matrix[12:15] = [float(value) for value in args[:3]]
+      node.attrs["matrix"] = matrix
+      self.attribute_changed(node)
+
+  identity = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+  def attribute_changed(self, node):
+    for watched, function in list(self.attribute_callbacks.values()):
+      if watched is node:
+        function(0, None, None, None)
+
+  def xform(self, *objects, **kwargs):
+    if kwargs.get("query") and kwargs.get("matrix"):
+      return list(self.nodes[self.node_of(objects[0])].attrs.get("matrix", self.identity))
+
+  def particle_shape(self, target):
+    name = self.node_of(target)
+    return name + "Shape" if name + "Shape" in self.nodes else name
+
+  def particle(self, *objects, **kwargs):
+    if kwargs.get("query") or kwargs.get("q"):
+      return len(self.nodes[self.particle_shape(objects[0])].attrs["position"]) if kwargs.get("count") else None
+    transform = self.add_node(kwargs.get("name", kwargs.get("n")), "transform")
+    shape = self.add_node(transform + "Shape", "particle")
+    self.nodes[shape].attrs["position"] = list(kwargs.get("position", kwargs.get("p", [])))
+    return [transform, shape]
+
+  def emit(self, **kwargs):
+    """ Adds particles at position to object, as emit does. """
+    shape = self.nodes[self.particle_shape(kwargs.get("object", kwargs.get("o")))]
+    shape.attrs["position"].extend(kwargs.get("position", kwargs.get("pos", [])))
+
+  def saveInitialState(self, *objects, **kwargs):
+    pass
+
+  def particleInstancer(self, particle, **kwargs):
+    instancer = self.add_node(None, "instancer")
+    self.nodes[instancer].attrs["objects"] = [kwargs.get("object")]
+    self.nodes[instancer].attrs["particle"] = particle
+    return instancer
+
+  def rotate(self, *args, **kwargs):
+    pass
+
+  def duplicate(self, *objects, **kwargs):
+    source = self.node_of(objects[0])
+    name = self.add_node(kwargs.get("name", kwargs.get("n")) or source, self.nodes[source].node_type)
+    self.nodes[name].attrs = dict(self.nodes[source].attrs)
+    shape = self.nodes.get(source + "Shape")
+    if shape is not None:
+      self.add_node(name + "Shape", "mesh")
+      self.nodes[name + "Shape"].attrs = dict(shape.attrs)
+      self.nodes[name + "Shape"].attrs.pop("history", None)
+    self.nodes[name].attrs["children"] = []
+    for child in self.nodes[source].attrs.get("children", []):
+      copy = self.duplicate(child)[0]
+      self.parent(copy, name)
+    return [name]
+
+  def instance(self, *objects, **kwargs):
+    source = self.node_of(objects[0])
+    name = self.add_node(kwargs.get("name", kwargs.get("n")) or source, "transform")
+    self.nodes[name].attrs = dict(self.nodes[source].attrs)
+    return [name]
+
+  def hide(self, *objects, **kwargs):
+    for name in objects:
+      self.nodes[name].attrs["visibility"] = False
+
+  def showHidden(self, *objects, **kwargs):
+    for name in objects:
+      self.nodes[name].attrs["visibility"] = True
+
+  def delete(self, *objects, **kwargs):
+    if kwargs.get("ch") or kwargs.get("constructionHistory"):
+      for name in self.flatten(objects):
+        shape = self.nodes.get(self.node_of(name) + "Shape")
+        for history in (shape.attrs.pop("history", []) if shape is not None else []):
+          self.nodes.pop(history, None)
+      return
+    for name in self.flatten(objects):
+      if ".pt[" in name:
+        # particle components, e.g. particleShape1.pt[4:9].
+        ids = name.split(".pt[", 1)[1][:-1].split(":")
+        del self.nodes[self.particle_shape(name)].attrs["position"][int(ids[0]):int(ids[-1]) + 1]
+      if "." not in name and name in self.nodes:
+        for function in list(self.nodes[name].attrs.get("removal_callbacks", {}).values()):
+          function(None, None, None)
+        for child in self.nodes[name].attrs.get("children", []):
+          self.delete(child)
+        self.nodes.pop(name, None)
+        self.nodes.pop(name + "Shape", None)
+        for owner in self.member_of.pop(name, ()):
+          if owner in self.nodes:
+            self.nodes[owner].attrs["members"].pop(name, None)
+
+  def setAttr(self, attribute, *values, **kwargs):
+    node = self.nodes[self.node_of(attribute)]
+    if kwargs.get("type") == "vectorArray":
+      # a count followed by that many xyz tuples.
+      node.attrs[attribute.split(".", 1)[1]] = [tuple(value) for value in values[1:1 + values[0]]]
+      return
+    node.attrs[attribute.split(".", 1)[1]] = values[0] if len(values) == 1 else values
+
+  def getAttr(self, attribute, **kwargs):
+    name = attribute.split(".", 1)[1]
+    if name.startswith(("vt[", "pt[")):
+      return [tuple(self.mesh_attrs(attribute)["points"][int(name[3:-1])])]
+    return self.nodes[self.node_of(attribute)].attrs.get(attribute.split(".", 1)[1])
+
+  def select(self, *objects, **kwargs):
+    self.selection = [name for name in self.flatten(objects) if name]
+
+  def hyperShade(self, **kwargs):
+    pass
+
+  def sets(self, *objects, **kwargs):
+    # members are kept as an ordered dict per set, and member_of maps
+    # every member back to its sets so nothing has to scan the scene.
+    if kwargs.get("query") or kwargs.get("q"):
+      return list(self.nodes[objects[0]].attrs.get("members", {})) or None
+    if "forceElement" in kwargs:
+      group = kwargs["forceElement"]
+      members = self.nodes[group].attrs.setdefault("members", {})
+      for name in self.flatten(objects):
+        owners = self.member_of.setdefault(name, set())
+        for owner in list(owners):
+          if owner in self.nodes and self.nodes[owner].node_type == "shadingEngine":
+            self.nodes[owner].attrs["members"].pop(name, None)
+            owners.discard(owner)
+        members[name] = True
+        owners.add(group)
+      return group
+    name = self.add_node(kwargs.get("name", kwargs.get("n")), "shadingEngine" if kwargs.get("renderable") else "objectSet")
+    self.nodes[name].attrs["members"] = dict.fromkeys(self.flatten(objects), True)
+    for member in self.nodes[name].attrs["members"]:
+      self.member_of.setdefault(member, set()).add(name)
+    return name
+
+  def connectAttr(self, source, destination, **kwargs):
+    self.nodes[self.node_of(destination)].attrs[destination.split(".", 1)[1]] = source
+
+  def listConnections(self, attribute, **kwargs):
+    """ The plug driving attribute, the only direction connectAttr keeps. """
+    source = self.nodes[self.node_of(attribute)].attrs.get(attribute.split(".", 1)[1])
+    if not isinstance(source, str) or "." not in source:
+      return None
+    return [source if kwargs.get("plugs") else source.split(".", 1)[0]]
+
+  # ui
+
+  def window(self, name=None, **kwargs):
+    if kwargs.get("exists"):
+      return name in self.controls
+    if kwargs.get("query") or kwargs.get("q"):
+      return self.controls[name].get("visible", False) if kwargs.get("visible") else None
+    self.controls[name] = {"window" : True}
+    return name
+
+  def deleteUI(self, name, **kwargs):
+    """ Deleting a window deletes the controls drawn after it, up to the
+        next window, as they were drawn into it. """
+    names = list(self.controls)
+    if name in self.controls and self.controls[name].get("window"):
+      for child in names[names.index(name) + 1:]:
+        if self.controls[child].get("window"):
+          break
+        del self.controls[child]
+    self.controls.pop(name, None)
+
+  def control(self, name, kwargs, value_flag, default):
+    if kwargs.get("query") or kwargs.get("q"):
+      return self.controls.get(name, {}).get(value_flag, default)
+    values = self.controls.setdefault(name, {})
+    for flag in ("minValue", "maxValue", "dragCommand", "changeCommand"):
+      if flag in kwargs:
+        values[flag] = kwargs[flag]
+    if value_flag in kwargs:
+      values[value_flag] = kwargs[value_flag]
+    elif value_flag == "value" and "minValue" in kwargs:
+      values.setdefault(value_flag, kwargs["minValue"])
+    return name
+
+  def intSliderGrp(self, name, **kwargs):
+    return self.control(name, kwargs, "value", 0)
+
+  def colorSliderGrp(self, name, **kwargs):
+    return self.control(name, kwargs, "rgbValue", [1.0, 1.0, 1.0])
+
+  def scrollField(self, name, **kwargs):
+    if kwargs.get("exists"):
+      return name in self.controls
+    return self.control(name, kwargs, "text", "")
+
+  def columnLayout(self, *args, **kwargs):
+    return args[0] if args else "columnLayout"
+
+  def tabLayout(self, name, **kwargs):
+    """ Keeps the tab labels, the select command and the selected tab,
+        which selecting by edit does not report, as in Maya. """
+    values = self.controls.setdefault(name, {"selectTabIndex" : 1})
+    if kwargs.get("query") or kwargs.get("q"):
+      return values.get("selectTabIndex")
+    for flag in ("tabLabel", "selectCommand", "selectTabIndex"):
+      if flag in kwargs:
+        values[flag] = kwargs[flag]
+    return name
+
+  def frameLayout(self, *args, **kwargs):
+    return "frameLayout"
+
+  def text(self, *args, **kwargs):
+    return "text"
+
+  def button(self, *args, **kwargs):
+    return "button"
+
+  def setParent(self, *args, **kwargs):
+    pass
+
+  def showWindow(self, *args, **kwargs):
+    self.controls[args[0]]["visible"] = True
+
+  # general
+
+  def fileInfo(self, *args, **kwargs):
+    if kwargs.get("query") or kwargs.get("q"):
+      return [self.file_info[args[0]]] if args[0] in self.file_info else []
+    self.file_info[args[0]] = args[1]
+
+  def file(self, path=None, **kwargs):
+    """ save, open and new only run the scene callbacks and carry the
+        fileInfo entries along; the nodes are left as they are. """
+    if kwargs.get("save"):
+      self.scene_message("beforeSave")
+      self.saved_files[path] = dict(self.file_info)
+    elif kwargs.get("open"):
+      self.file_info = dict(self.saved_files[path])
+      self.scene_message("afterOpen")
+    elif kwargs.get("new"):
+      self.file_info = {}
+      self.scene_message("afterNew")
+
+  def scene_message(self, message):
+    for kind, function in list(self.scene_callbacks.values()):
+      if kind == message:
+        function(None)
+
+  def about(self, **kwargs):
+    return self.batch if kwargs.get("batch") else ""
+
+  def undoInfo(self, **kwargs):
+    if kwargs.get("openChunk"):
+      if self.chunk_depth == 0:
+        self.undo_queue.append([])
+      self.chunk_depth += 1
+    elif kwargs.get("closeChunk"):
+      self.chunk_depth -= 1
+      if self.chunk_depth == 0 and not self.undo_queue[-1]:
+        self.undo_queue.pop()
+
+  # only plug-in commands go on the undo queue, the fake commands do not.
+
+  def loadPlugin(self, path, **kwargs):
+    """ Imports a python plug-in and registers its commands as commands
+        of the scene. """
+    name = os.path.splitext(os.path.basename(path))[0]
+    module = sys.modules.get(name)
+    if module is None:
+      sys.path.insert(0, os.path.dirname(path))
+      module = importlib.import_module(name)
+    module.initializePlugin(FakeMObject(path))
+    return [name]
+
+  def run_command(self, creator, args):
+    command = creator()
+    command.doIt(FakeArgList(args))
+    if command.isUndoable():
+      if self.chunk_depth:
+        self.undo_queue[-1].append(command)
+      else:
+        self.undo_queue.append([command])
+      self.redo_queue = []
+    return command.result
+
+  def undo(self, **kwargs):
+    if self.undo_queue:
+      commands = self.undo_queue.pop()
+      for command in reversed(commands):
+        command.undoIt()
+      self.redo_queue.append(commands)
+
+  def redo(self, **kwargs):
+    if self.redo_queue:
+      commands = self.redo_queue.pop()
+      for command in commands:
+        command.redoIt()
+      self.undo_queue.append(commands)
+
+  def refresh(self, **kwargs):
+    pass
+
+  def evalDeferred(self, function, **kwargs):
+    self.deferred.append(function)
+
+  def run_deferred(self, limit=None):
+    """ The fake event loop: runs what evalDeferred queued, including what
+        the queued calls queue themselves, and returns how many ran. """
+    ran = 0
+    while self.deferred and (limit is None or ran < limit):
+      self.deferred.pop(0)()
+      ran += 1
+    return ran
+
+  def progressWindow(self, **kwargs):
+    if kwargs.get("query") or kwargs.get("q"):
+      for flag in ("isCancelled", "progress", "status"):
+        if kwargs.get(flag):
+          return self.progress.get(flag, False if flag == "isCancelled" else None)
+      return None
+    if kwargs.get("endProgress"):
+      self.progress = {}
+      return None
+    for flag in ("title", "progress", "maxValue", "status", "isInterruptable"):
+      if flag in kwargs:
+        self.progress[flag] = kwargs[flag]
+    return None
+
+
+class FakeDGMessage:
+  """ Mirrors maya.api.OpenMaya.MDGMessage for the active scene. """
+  scene = None
+
+  @classmethod
+  def addNodeAddedCallback(cls, function, node_type="dependNode", client_data=None):
+    cls.scene.next_callback_id += 1
+    cls.scene.callbacks[cls.scene.next_callback_id] = function
+    return cls.scene.next_callback_id
+
+
+class FakeMessage:
+  """ Mirrors maya.api.OpenMaya.MMessage. """
+  scene = None
+
+  @classmethod
+  def removeCallback(cls, callback_id):
+    cls.scene.callbacks.pop(callback_id, None)
+    cls.scene.attribute_callbacks.pop(callback_id, None)
+    cls.scene.scene_callbacks.pop(callback_id, None)
+    node = cls.scene.removal_callbacks.pop(callback_id, None)
+    if node is not None:
+      node.attrs["removal_callbacks"].pop(callback_id, None)
+
+
+class FakeNodeMessage:
+  """ Mirrors maya.api.OpenMaya.MNodeMessage. The fake only reports
+      attribute changes made by move and removals made by delete. """
+  scene = None
+
+  @classmethod
+  def addAttributeChangedCallback(cls, mobject, function, client_data=None):
+    cls.scene.next_callback_id += 1
+    cls.scene.attribute_callbacks[cls.scene.next_callback_id] = (cls.scene.nodes[mobject.node_name], function)
+    return cls.scene.next_callback_id
+
+  @classmethod
+  def addNodePreRemovalCallback(cls, mobject, function, client_data=None):
+    cls.scene.next_callback_id += 1
+    node = cls.scene.nodes[mobject.node_name]
+    node.attrs.setdefault("removal_callbacks", {})[cls.scene.next_callback_id] = function
+    cls.scene.removal_callbacks[cls.scene.next_callback_id] = node
+    return cls.scene.next_callback_id
+
+
+class FakeSceneMessage:
+  """ Mirrors maya.api.OpenMaya.MSceneMessage. Callbacks run when the
+      scene's save, open and new are called. """
+  scene = None
+  kBeforeSave = "beforeSave"
+  kAfterOpen = "afterOpen"
+  kAfterNew = "afterNew"
+
+  @classmethod
+  def addCallback(cls, message, function, client_data=None):
+    cls.scene.next_callback_id += 1
+    cls.scene.scene_callbacks[cls.scene.next_callback_id] = (message, function)
+    return cls.scene.next_callback_id
+
+
+class FakeDependencyNode:
+  """ Mirrors maya.api.OpenMaya.MFnDependencyNode. """
+  scene = None
+
+  def __init__(self, mobject):
+    self.mobject = mobject
+
+  def name(self):
+    return self.mobject.node_name
+
+  def setName(self, name):
+    scene = self.scene
+    old = self.mobject.node_name
+    name = scene.unique(name)
+    node = scene.nodes.pop(old)
+    node.name = name
+    scene.nodes[name] = node
+    shape = scene.nodes.pop(old + "Shape", None)
+    if shape is not None:
+      shape.name = name + "Shape"
+      scene.nodes[shape.name] = shape
+    self.mobject.node_name = name
+    return name
+
+
+class FakeSpace:
+  """ Mirrors maya.api.OpenMaya.MSpace. """
+  kObject = "object"
+  kWorld = "world"
+
+
+class FakePoint:
+  """ Mirrors maya.api.OpenMaya.MPoint. """
+  def __init__(self, x=0.0, y=0.0, z=0.0, w=1.0):
+    self.x, self.y, self.z, self.w = x, y, z, w
+
+
+class FakeSelectionList:
+  """ Mirrors maya.api.OpenMaya.MSelectionList, just enough to get at a
+      node by name. """
+  def __init__(self):
+    self.names = []
+
+  def add(self, name):
+    self.names.append(name)
+    return self
+
+  def getDagPath(self, index):
+    return FakeMObject(self.names[index])
+
+  def getDependNode(self, index):
+    return FakeMObject(self.names[index])
+
+
+class FakeMesh:
+  """ Mirrors maya.api.OpenMaya.MFnMesh. The mesh arrays are kept on the
+      shape node so callers can inspect them. """
+  scene = None
+
+  def __init__(self, target=None):
+    self.target = target
+
+  def shape_attrs(self, transform):
+    return self.scene.nodes[transform + "Shape"].attrs
+
+  def create(self, vertices, counts, connects, *args):
+    transform = self.scene.add_node("polySurface1", "transform")
+    self.scene.add_node(transform + "Shape", "mesh")
+    self.target = FakeMObject(transform)
+    FakeMesh.createInPlace(self, vertices, counts, connects)
+    return self.target
+
+  def createInPlace(self, vertices, counts, connects):
+    attrs = self.shape_attrs(self.target.node_name)
+    attrs["points"] = [(point.x, point.y, point.z) for point in vertices]
+    attrs["counts"] = list(counts)
+    attrs["connects"] = list(connects)
+    return self
+
+  def getPoints(self, space="object"):
+    points = self.shape_attrs(self.target.node_name).get("points", [])
+    if space == FakeSpace.kWorld:
+      m = self.target.inclusiveMatrix()
+      points = [(x * m[0] + y * m[4] + z * m[8] + m[12], x * m[1] + y * m[5] + z * m[9] + m[13],
+                 x * m[2] + y * m[6] + z * m[10] + m[14]) for x, y, z in points]
+    return [FakePoint(*point) for point in points]
+
+  def getPolygonVertices(self, face):
+    attrs = self.shape_attrs(self.target.node_name)
+    start = sum(attrs["counts"][:face])
+    return attrs["connects"][start:start + attrs["counts"][face]]
+
+  def getVertices(self):
+    attrs = self.shape_attrs(self.target.node_name)
+    return list(attrs.get("counts", [])), list(attrs.get("connects", []))
+
+  def setPoints(self, vertices, *args):
+    attrs = self.shape_attrs(self.target.node_name)
+    if len(vertices) != len(attrs["points"]):
+      raise RuntimeError("setPoints: wrong number of points")
+    attrs["points"] = [(point.x, point.y, point.z) for point in vertices]
+
+
+class FakeArgList:
+  """ Mirrors maya.api.OpenMaya.MArgList. """
+  def __init__(self, args):
+    self.args = args
+
+  def __len__(self):
+    return len(self.args)
+
+  def asString(self, index):
+    return str(self.args[index])
+
+
+class FakeCommand:
+  """ Mirrors maya.api.OpenMaya.MPxCommand. """
+  def __init__(self):
+    self.result = None
+
+  def setResult(self, value):
+    self.result = value
+
+  def isUndoable(self):
+    return False
+
+
+class FakePlugin:
+  """ Mirrors maya.api.OpenMaya.MFnPlugin: a registered command becomes a
+      command of the scene, so it is recorded like the others. """
+  scene = None
+
+  def __init__(self, mobject, vendor=None, version=None):
+    self.mobject = mobject
+
+  def registerCommand(self, name, creator, syntax=None):
+    scene = self.scene
+    setattr(scene, name, lambda *args, **kwargs: scene.run_command(creator, args))
+
+  def deregisterCommand(self, name):
+    delattr(self.scene, name)
+
+
+class FakeDagModifier:
+  """ Mirrors maya.api.OpenMaya.MDagModifier, deleting nodes only. """
+  scene = None
+
+  def __init__(self):
+    self.doomed = []
+
+  def deleteNode(self, mobject):
+    self.doomed.append(mobject.node_name)
+
+  def doIt(self):
+    for name in self.doomed:
+      self.scene.delete(name)
+    self.doomed = []
+
+
+class Recorder:
+  """ Sits in front of a FakeScene as maya.cmds and counts and times
+      every command that goes through it. """
+
+  def __init__(self, scene):
+    self.scene = scene
+    self.reset()
+
+  def reset(self):
+    self.calls = {}
+    self.seconds = {}
+
+  def record(self, *args, **kwargs):
+    # (name, function, *arguments), positional so no command flag clashes.
+    name, function, args = args[0], args[1], args[2:]
+    start = time.time()
+    try:
+      return function(*args, **kwargs)
+    finally:
+      self.calls[name] = self.calls.get(name, 0) + 1
+      self.seconds[name] = self.seconds.get(name, 0.0) + time.time() - start
+
+  def __getattr__(self, name):
+    attribute = getattr(self.scene, name)
+    if name.startswith("_") or not callable(attribute):
+      return attribute
+    return lambda *args, **kwargs: self.record(name, attribute, *args, **kwargs)
+
+
+def install(scene=None, recorder=None):
+  """ Registers a FakeScene as maya.cmds (and the bits of
+      maya.api.OpenMaya LegoBuilder touches) and returns it. Pass a
+      Recorder for the scene to have every call counted and timed. """
+  scene = scene or FakeScene()
+  maya = types.ModuleType("maya")
+  api = types.ModuleType("maya.api")
+  open_maya = types.ModuleType("maya.api.OpenMaya")
+  FakeDGMessage.scene = scene
+  FakeMessage.scene = scene
+  FakeDependencyNode.scene = scene
+  FakeMesh.scene = scene
+  FakeMObjectHandle.scene = scene
+  FakeNodeMessage.scene = scene
+  FakeSceneMessage.scene = scene
+  FakeMObject.scene = scene
+  FakePlugin.scene = scene
+  FakeDagModifier.scene = scene
+  open_maya.MDGMessage = FakeDGMessage
+  open_maya.MMessage = FakeMessage
+  open_maya.MFnDependencyNode = FakeDependencyNode
+  open_maya.MFnMesh = FakeMesh
+  if recorder is not None:
+    class RecordingMesh(FakeMesh):
+      def create(self, *args):
+        return recorder.record("MFnMesh.create", FakeMesh.create, self, *args)
+
+      def createInPlace(self, *args):
+        return recorder.record("MFnMesh.createInPlace", FakeMesh.createInPlace, self, *args)
+
+      def setPoints(self, *args):
+        return recorder.record("MFnMesh.setPoints", FakeMesh.setPoints, self, *args)
+
+      def getPoints(self, *args):
+        return recorder.record("MFnMesh.getPoints", FakeMesh.getPoints, self, *args)
+
+      def getVertices(self, *args):
+        return recorder.record("MFnMesh.getVertices", FakeMesh.getVertices, self, *args)
+    open_maya.MFnMesh = RecordingMesh
+  open_maya.MPoint = FakePoint
+  open_maya.MSpace = FakeSpace
+  open_maya.MPxCommand = FakeCommand
+  open_maya.MFnPlugin = FakePlugin
+  open_maya.MDagModifier = FakeDagModifier
+  open_maya.MSelectionList = FakeSelectionList
+  open_maya.MObjectHandle = FakeMObjectHandle
+  open_maya.MNodeMessage = FakeNodeMessage
+  open_maya.MSceneMessage = FakeSceneMessage
+  maya.cmds = recorder or scene
+  maya.api = api
+  api.OpenMaya = open_maya
+  sys.modules["maya"] = maya
+  sys.modules["maya.cmds"] = recorder or scene
+  sys.modules["maya.api"] = api
+  sys.modules["maya.api.OpenMaya"] = open_maya
+  return scene
+
+
+def uninstall():
+  """ Removes the fake modules again. """
+  for name in ("maya", "maya.cmds", "maya.api", "maya.api.OpenMaya"):
+    sys.modules.pop(name, None)
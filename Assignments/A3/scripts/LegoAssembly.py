@@ -0,0 +1,386 @@
+""" LegoAssembly - turns a voxel build into as few polygons as possible.
+
+    A build is an occupancy grid, a dict of (x, y, z) cell -> rgb colour,
+    one cell being a one unit brick in the LegoConstants units (y is the
+    layer). Cells of the same colour in a layer are tiled exactly with
+    Block footprints min_block_width to max_block_width on a side, the
+    largest that still let the rest be tiled, then every body face and
+    stud another cell covers is left out, and what is left is emitted as
+    one mesh per colour. Cells no legal Blocks tile become 1x1 plates.
+    Nothing in here imports maya.
+
+      python LegoAssembly.py --size 16 8 16 """
+
+from array import array
+import argparse
+import collections
+import sys
+
+import LegoGeometry
+from LegoConstants import Constants
+
+
+Brick = collections.namedtuple("Brick", ("x", "y", "z", "width", "depth", "color"))
+
+
+def half(num):
+  return num/2.00
+
+
+def rectangles(cells, limit=None):
+  """ Covers a set of (a, b) cells with rectangles (a, b, width, depth),
+      growing each one from its lowest corner as far as it goes along a,
+      then along b, or the other way round when that covers more. """
+  free = set(cells)
+  found = []
+  for a, b in sorted(free, key=lambda cell: (cell[1], cell[0])):
+    if (a, b) not in free:
+      continue
+    best = None
+    for along_a in (True, False):
+      size = [1, 1]
+      first, second = (0, 1) if along_a else (1, 0)
+      while limit is None or size[first] < limit:
+        step = [0, 0]
+        step[first] = size[first]
+        if (a + step[0], b + step[1]) not in free:
+          break
+        size[first] += 1
+      while limit is None or size[second] < limit:
+        row = []
+        for i in range(0, size[first]):
+          step = [0, 0]
+          step[first], step[second] = i, size[second]
+          row.append((a + step[0], b + step[1]))
+        if not all(cell in free for cell in row):
+          break
+        size[second] += 1
+      if best is None or size[0] * size[1] > best[0] * best[1]:
+        best = size
+    for i in range(0, best[0]):
+      for j in range(0, best[1]):
+        free.discard((a + i, b + j))
+    found.append((a, b, best[0], best[1]))
+  return found
+
+
+def components(cells):
+  """ Splits a set of (a, b) cells into its edge connected groups. """
+  free = set(cells)
+  groups = []
+  while free:
+    seed = free.pop()
+    group = [seed]
+    for a, b in group:
+      for cell in ((a + 1, b), (a - 1, b), (a, b + 1), (a, b - 1)):
+        if cell in free:
+          free.discard(cell)
+          group.append(cell)
+    groups.append(group)
+  return groups
+
+
+def legal_rectangles(cells, low, high, budget=100000):
+  """ Tiles a set of (a, b) cells exactly with rectangles (a, b, width,
+      depth), each group of connected cells with sides all low to high
+      where tile_group finds a way, otherwise with plate_rectangles. """
+  found = []
+  for group in components(cells):
+    tiling = tile_group(group, low, high, budget)
+    found.extend(tiling if tiling is not None else plate_rectangles(group, low, high))
+  return found
+
+
+def split_length(length, low, high):
+  """ Cuts length into as few parts low to high long as it goes into,
+      as even as they come, or returns None. """
+  parts = -(-length // high)
+  if parts == 0 or length < parts * low:
+    return None
+  return [length // parts + (1 if i < length % parts else 0) for i in range(0, parts)]
+
+
+def tile_group(group, low, high, budget):
+  """ Tiles the cells of group exactly with rectangles whose sides are all
+      low to high, or returns None. Any rectangle whose sides split_length
+      can cut is as good as its pieces, so the search places those, from
+      the lowest free cell up, largest first, backing up when the cells
+      left over cannot be tiled, and cuts them at the end. The free cells
+      every dead end started from are remembered, since the same
+      rectangles placed in another order leave the same cells behind.
+      budget caps the tries. """
+  order = sorted(group, key=lambda cell: (cell[1], cell[0]))
+  free = set(group)
+  placed = []
+  dead = set()
+  # each frame is (position in order, sizes that fit there, next try,
+  # the free cells it started from).
+  frames = []
+  position = 0
+  tries = 0
+  while True:
+    while position < len(order) and order[position] not in free:
+      position += 1
+    if position == len(order):
+      break
+    a, b = order[position]
+    state = frozenset(free)
+    sizes = []
+    if state not in dead:
+      # the deepest rectangle of every width that fits at (a, b).
+      depth = None
+      width = 0
+      while (a + width, b) in free:
+        run = 0
+        while (depth is None or run < depth) and (a + width, b + run) in free:
+          run += 1
+        depth = run
+        width += 1
+        if split_length(width, low, high) is not None:
+          sizes.extend((width, rows) for rows in range(low, depth + 1) if split_length(rows, low, high) is not None)
+      sizes.sort(key=lambda size: -size[0] * size[1])
+    frames.append([position, sizes, 0, state])
+    while True:
+      tries += 1
+      if tries > budget:
+        return None
+      frame = frames[-1]
+      if frame[2] < len(frame[1]):
+        width, depth = frame[1][frame[2]]
+        frame[2] += 1
+        a, b = order[frame[0]]
+        for i in range(0, width):
+          for j in range(0, depth):
+            free.discard((a + i, b + j))
+        placed.append((a, b, width, depth))
+        position = frame[0]
+        break
+      dead.add(frames.pop()[3])
+      if not frames:
+        return None
+      a, b, width, depth = placed.pop()
+      for i in range(0, width):
+        for j in range(0, depth):
+          free.add((a + i, b + j))
+  found = []
+  for a, b, width, depth in placed:
+    x = a
+    for piece_width in split_length(width, low, high):
+      z = b
+      for piece_depth in split_length(depth, low, high):
+        found.append((x, z, piece_width, piece_depth))
+        z += piece_depth
+      x += piece_width
+  return found
+
+
+def plate_rectangles(group, low, high):
+  """ Covers cells no legal tiling was found for: from the lowest free cell
+      up, the largest low to high rectangle that fits, or a 1x1 plate
+      where none does. """
+  order = sorted(group, key=lambda cell: (cell[1], cell[0]))
+  free = set(group)
+  found = []
+  for a, b in order:
+    if (a, b) not in free:
+      continue
+    sizes = [(width, depth) for width in range(low, high + 1) for depth in range(low, high + 1)
+             if all((a + i, b + j) in free for i in range(0, width) for j in range(0, depth))]
+    width, depth = max(sizes, key=lambda size: size[0] * size[1]) if sizes else (1, 1)
+    for i in range(0, width):
+      for j in range(0, depth):
+        free.discard((a + i, b + j))
+    found.append((a, b, width, depth))
+  return found
+
+
+def merge_bricks(grid):
+  """ Tiles the cells of every layer and colour with Bricks, see
+      legal_rectangles. """
+  layers = collections.OrderedDict()
+  for (x, y, z), color in sorted(grid.items()):
+    layers.setdefault((y, tuple(color)), []).append((x, z))
+  bricks = []
+  for (y, color), cells in layers.items():
+    for x, z, width, depth in legal_rectangles(cells, Constants["min_block_width"], Constants["max_block_width"]):
+      bricks.append(Brick(x, y, z, width, depth, color))
+  return bricks
+
+
+def open_stud():
+  """ A stud without its bottom cap, which would sit flush on the body. """
+  subdivs = Constants["cylinder_subdivs"]
+  stud = LegoGeometry.cylinder(Constants["stub_radius"], Constants["stub_height"])
+  stud.counts = stud.counts[:subdivs] + stud.counts[subdivs + 1:]
+  stud.connects = stud.connects[:4 * subdivs] + stud.connects[5 * subdivs:]
+  return stud
+
+
+class SurfaceMesh(LegoGeometry.Mesh):
+  """ A Mesh that shares the points of the rectangles added to it. """
+
+  def __init__(self):
+    LegoGeometry.Mesh.__init__(self)
+    self.point_ids = {}
+
+  def shared_point(self, x, y, z):
+    key = (round(x, 9), round(y, 9), round(z, 9))
+    if key not in self.point_ids:
+      self.point_ids[key] = self.add_point(x, y, z)
+    return self.point_ids[key]
+
+  def add_rectangle(self, corners):
+    self.add_face([self.shared_point(*corner) for corner in corners])
+
+
+def brick_faces(brick, grid):
+  """ Yields the corners of the visible body faces of a brick, counter
+      clockwise seen from outside, each side merged as far as it goes. """
+  unit_width = Constants["block_width_unit"]
+  unit_depth = Constants["block_depth_unit"]
+  unit_height = Constants["block_height_unit"]
+  x, y, z = brick.x, brick.y, brick.z
+  y0, y1 = y * unit_height - half(unit_height), y * unit_height + half(unit_height)
+
+  for dy, height in ((1, y1), (-1, y0)):
+    exposed = [(x + i, z + j) for i in range(0, brick.width) for j in range(0, brick.depth)
+               if (x + i, y + dy, z + j) not in grid]
+    for a, b, width, depth in rectangles(exposed):
+      x0, x1 = a * unit_width, (a + width) * unit_width
+      z0, z1 = b * unit_depth, (b + depth) * unit_depth
+      if dy > 0:
+        yield ((x0, height, z1), (x1, height, z1), (x1, height, z0), (x0, height, z0))
+      else:
+        yield ((x0, height, z0), (x1, height, z0), (x1, height, z1), (x0, height, z1))
+
+  for dz, row in ((1, z + brick.depth), (-1, z - 1)):
+    side = (row + (0 if dz > 0 else 1)) * unit_depth
+    exposed = [(x + i, 0) for i in range(0, brick.width) if (x + i, y, row) not in grid]
+    for a, b, width, depth in rectangles(exposed):
+      x0, x1 = a * unit_width, (a + width) * unit_width
+      if dz > 0:
+        yield ((x0, y0, side), (x1, y0, side), (x1, y1, side), (x0, y1, side))
+      else:
+        yield ((x0, y1, side), (x1, y1, side), (x1, y0, side), (x0, y0, side))
+
+  for dx, column in ((1, x + brick.width), (-1, x - 1)):
+    side = (column + (0 if dx > 0 else 1)) * unit_width
+    exposed = [(0, z + j) for j in range(0, brick.depth) if (column, y, z + j) not in grid]
+    for a, b, width, depth in rectangles(exposed):
+      z0, z1 = b * unit_depth, (b + depth) * unit_depth
+      if dx > 0:
+        yield ((side, y0, z1), (side, y0, z0), (side, y1, z0), (side, y1, z1))
+      else:
+        yield ((side, y0, z0), (side, y0, z1), (side, y1, z1), (side, y1, z0))
+
+
+def assembly_meshes(grid, bricks=None):
+  """ Returns an OrderedDict of colour -> Mesh holding the visible body
+      faces and the uncovered studs of every brick of that colour. """
+  unit_width = Constants["block_width_unit"]
+  unit_depth = Constants["block_depth_unit"]
+  stud = open_stud()
+  stud_y = half(Constants["block_height_unit"]) + half(Constants["stub_height"])
+  meshes = collections.OrderedDict()
+  for brick in bricks if bricks is not None else merge_bricks(grid):
+    mesh = meshes.setdefault(brick.color, SurfaceMesh())
+    for corners in brick_faces(brick, grid):
+      mesh.add_rectangle(corners)
+    for i in range(0, brick.width):
+      for j in range(0, brick.depth):
+        if (brick.x + i, brick.y + 1, brick.z + j) not in grid:
+          mesh.append(stud, ((brick.x + i + 0.5) * unit_width,
+                             brick.y * Constants["block_height_unit"] + stud_y,
+                             (brick.z + j + 0.5) * unit_depth))
+  return meshes
+
+
+def triangle_count(mesh):
+  return sum(count - 2 for count in mesh.counts)
+
+
+def assembly_stats(grid):
+  """ Compares the triangles of the assembly against the baseline output,
+      the same Bricks built as Blocks are today: every stud and all six
+      faces kept, whatever covers them. """
+  bricks = merge_bricks(grid)
+  whole = {}
+  for brick in bricks:
+    size = (brick.width, brick.depth)
+    if size not in whole:
+      whole[size] = triangle_count(LegoGeometry.block(brick.width, 1, brick.depth))
+  baseline = sum(whole[(brick.width, brick.depth)] for brick in bricks)
+  culled = sum(triangle_count(mesh) for mesh in assembly_meshes(grid, bricks).values())
+  return {
+    "cells" : len(grid),
+    "bricks" : len(bricks),
+    "plates" : sum(1 for brick in bricks if min(brick.width, brick.depth) < Constants["min_block_width"]),
+    "baseline_triangles" : baseline,
+    "assembly_triangles" : culled,
+    "reduction" : 1.0 - culled / float(baseline) if baseline else 0.0
+  }
+
+
+def solid_grid(width, height, depth, color=(1.0, 1.0, 1.0)):
+  """ A filled width x height x depth box of cells, for trying things out. """
+  return dict(((x, y, z), color) for x in range(0, width) for y in range(0, height) for z in range(0, depth))
+
+
+def covered(rectangles):
+  """ Every cell of rectangles, once per rectangle covering it. """
+  return sorted((a + i, b + j) for a, b, width, depth in rectangles for i in range(0, width) for j in range(0, depth))
+
+
+# (a, b) layers legal_rectangles has to cover exactly, and how many of the
+# rectangles may be plates narrower than min_block_width.
+Layers = collections.OrderedDict((
+  ("L shape", ([(a, b) for a in range(0, 6) for b in range(0, 2)] + [(a, b) for a in range(0, 2) for b in range(2, 6)], 0)),
+  ("1x7 strip", ([(a, 0) for a in range(0, 7)], 7)),
+  ("8x8 around a 2x2 hole", ([(a, b) for a in range(0, 8) for b in range(0, 8) if not (3 <= a < 5 and 3 <= b < 5)], 0)),
+  ("6x6 checkerboard", ([(a, b) for a in range(0, 6) for b in range(0, 6) if (a + b) % 2 == 0], 18)),
+  ("31x31 square", ([(a, b) for a in range(0, 31) for b in range(0, 31)], 0))
+))
+
+
+def checks():
+  """ Tiles every layer of Layers and checks its cells are covered exactly
+      once, with no more plates than it needs and every other rectangle a
+      legal Block, then that the assembly of a solid box and of a build
+      with a strip in it comes out smaller than the baseline. Returns the
+      failures. """
+  failures = []
+  low, high = Constants["min_block_width"], Constants["max_block_width"]
+  for label, (cells, plates) in Layers.items():
+    found = legal_rectangles(cells, low, high)
+    if covered(found) != sorted(cells):
+      failures.append("%s: %d rectangles do not cover its %d cells exactly once" % (label, len(found), len(cells)))
+    narrow = [size for size in found if min(size[2:]) < low]
+    if len(narrow) != plates or any(size[2:] != (1, 1) for size in narrow):
+      failures.append("%s: %d plates %s, expected %d 1x1 plates" % (label, len(narrow), narrow, plates))
+    if any(max(size[2:]) > high for size in found):
+      failures.append("%s: a rectangle is wider than %d" % (label, high))
+  strip = solid_grid(4, 2, 4)
+  strip.update(((x, 2, 0), (1.0, 1.0, 1.0)) for x in range(0, 5))
+  for label, grid in (("solid 4x2x4", solid_grid(4, 2, 4)), ("4x2x4 with a 1x5 strip on top", strip)):
+    stats = assembly_stats(grid)
+    if stats["assembly_triangles"] >= stats["baseline_triangles"]:
+      failures.append("%s: %d triangles, no fewer than the baseline %d" % (label, stats["assembly_triangles"], stats["baseline_triangles"]))
+  return failures
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Check the brick tiling and report the triangle savings of a merged, culled voxel build.")
+  parser.add_argument("--size", type=int, nargs=3, default=(16, 8, 16), metavar=("WIDTH", "HEIGHT", "DEPTH"))
+  arguments = parser.parse_args(argv)
+  failures = checks()
+  for failure in failures:
+    print("FAILED: " + failure)
+  stats = assembly_stats(solid_grid(*arguments.size))
+  print("%(cells)d cells -> %(bricks)d bricks, %(plates)d of them plates" % stats)
+  print("triangles: %(baseline_triangles)d as whole Blocks, %(assembly_triangles)d merged and culled (%(reduction).1f%% fewer)"
+        % dict(stats, reduction=100 * stats["reduction"]))
+  return 1 if failures else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
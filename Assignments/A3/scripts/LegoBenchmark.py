@@ -0,0 +1,617 @@
+""" LegoBenchmark - measures what every LegoBuilder generator costs.
+
+    LegoBuilder is loaded against a recording FakeCmds scene and every
+    generator is run over the full range of its sliders. For each run the
+    commands issued (count and time per command), the nodes created and
+    the wall time are written out as JSON, so two versions can be diffed:
+
+      python LegoBenchmark.py --output new.json --compare old.json """
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import FakeCmds
+
+
+def load_builder():
+  """ Imports LegoBuilder against a fresh recording fake scene, with the
+      part cache off so every run pays for a full build. """
+  scene = FakeCmds.FakeScene()
+  scene.batch = True
+  recorder = FakeCmds.Recorder(scene)
+  FakeCmds.install(scene, recorder)
+  for name in ("LegoBuilder", "LegoMeshCommand"):
+    sys.modules.pop(name, None)
+  import LegoBuilder
+  LegoBuilder.part_cache.limit = 0
+  return LegoBuilder, scene, recorder
+
+
+def run_import(nodes=100000):
+  """ Times importing LegoBuilder into a scene of nodes transforms, then
+      the first name handed out for a stem (which seeds it with one
+      wildcard ls of that stem) and a second one (which does not). Returns
+      the report and whether the import itself looked at the scene. """
+  scene = FakeCmds.FakeScene()
+  scene.populate(nodes)
+  scene.batch = True
+  recorder = FakeCmds.Recorder(scene)
+  FakeCmds.install(scene, recorder)
+  for name in ("LegoBuilder", "LegoMeshCommand"):
+    sys.modules.pop(name, None)
+  start = time.time()
+  import LegoBuilder as builder
+  import_seconds = time.time() - start
+  import_calls = dict(recorder.calls)
+  report = {"nodes" : nodes, "import_seconds" : import_seconds, "import_calls" : import_calls}
+  for label in ("first_name", "second_name"):
+    recorder.reset()
+    start = time.time()
+    builder.get_unique_name("Block", "")
+    report[label] = {"seconds" : time.time() - start, "calls" : dict(recorder.calls)}
+  return report, "ls" in import_calls
+
+
+def slider_ranges(builder, scene, generator):
+  """ Opens the generator's tab and reads back its slider ranges. """
+  generator.draw_ui()
+  ranges = []
+  for name in generator.Parameters._fields:
+    control = scene.controls[generator.get_prefix() + builder.Labels[name + "_label"]]
+    ranges.append((name, control["minValue"], control["maxValue"]))
+  return ranges
+
+
+def benchmark_generator(builder, scene, recorder, generator):
+  runs = []
+  ranges = slider_ranges(builder, scene, generator)
+  for values in itertools.product(*[range(low, high + 1) for name, low, high in ranges]):
+    for (name, low, high), value in zip(ranges, values):
+      scene.intSliderGrp(generator.get_prefix() + builder.Labels[name + "_label"], edit=True, value=value)
+    recorder.reset()
+    nodes_before = scene.nodes_created
+    scene_before = len(scene.nodes)
+    start = time.time()
+    generator.generate()
+    runs.append({
+      "parameters" : dict(zip(generator.Parameters._fields, values)),
+      "seconds" : time.time() - start,
+      "calls" : dict(recorder.calls),
+      "call_seconds" : dict(recorder.seconds),
+      "nodes_created" : scene.nodes_created - nodes_before,
+      "nodes_kept" : len(scene.nodes) - scene_before
+    })
+  return runs
+
+
+def summarize(runs):
+  calls = [sum(run["calls"].values()) for run in runs]
+  return {
+    "runs" : len(runs),
+    "total_seconds" : sum(run["seconds"] for run in runs),
+    "min_calls" : min(calls),
+    "max_calls" : max(calls),
+    "max_nodes_created" : max(run["nodes_created"] for run in runs),
+    "max_nodes_kept" : max(run["nodes_kept"] for run in runs)
+  }
+
+
+def run(generators=None):
+  """ Benchmarks the named generators (all of them by default). """
+  builder, scene, recorder = load_builder()
+  report = {"generators" : {}}
+  for name in sorted(generators or builder.Generator.registered()):
+    runs = benchmark_generator(builder, scene, recorder, builder.Generator.registered()[name])
+    report["generators"][name] = {"summary" : summarize(runs), "runs" : runs}
+  return report
+
+
+def run_templates(generators=None):
+  """ Benchmarks the boolean builds of the perforated generators with the
+      primitive template library off (before) and on (after). """
+  builder, scene, recorder = load_builder()
+  report = {"generators" : {}}
+  for name in sorted(generators or ("PerforatedBlock", "PerforatedBar", "PerforatedBarWithKink", "PerforatedBarWithRightAngle")):
+    generator = builder.Generator.registered()[name]
+    mode = generator.perforation_mode
+    generator.perforation_mode = "boolean"
+    entry = report["generators"][name] = {}
+    try:
+      for label, enabled in (("before", False), ("after", True)):
+        builder.templates.enabled = enabled
+        builder.templates.clear()
+        entry[label] = summarize(benchmark_generator(builder, scene, recorder, generator))
+    finally:
+      generator.perforation_mode = mode
+  return report
+
+
+def run_library(directory=None, generators=None):
+  """ Benchmarks the kernel generators building every part cold, into an
+      empty part library, and then warm, loading them back from it. """
+  builder, scene, recorder = load_builder()
+  library = builder.enable_part_library(directory or tempfile.mkdtemp(prefix="LegoLibrary"))
+  library.clear()
+  report = {"directory" : library.directory, "generators" : {}}
+  for name in sorted(generators or ("Block", "PerforatedBlock", "PerforatedBar", "PerforatedBarWithKink", "PerforatedBarWithRightAngle")):
+    entry = report["generators"][name] = {}
+    for label in ("cold", "warm"):
+      library.hits = library.misses = 0
+      entry[label] = summarize(benchmark_generator(builder, scene, recorder, builder.Generator.registered()[name]))
+      entry[label]["hits"] = library.hits
+  builder.disable_part_library()
+  return report
+
+
+def run_lock(sessions=8, directory=None):
+  """ Leaves a stale index lock behind and has sessions threads take the
+      lock at once. Every one of them has to get it, never two at the same
+      time, and no broken lock files may be left. Returns the report and
+      what went wrong. """
+  import LegoLibrary
+  directory = directory or tempfile.mkdtemp(prefix="LegoLock")
+  path = os.path.join(directory, "index.lock")
+  with open(path, "w") as lock:
+    lock.write("crashed")
+  os.utime(path, (time.time() - 3600, time.time() - 3600))
+  barrier = threading.Barrier(sessions)
+  holding = []
+  overlaps = []
+  taken = []
+  def session():
+    barrier.wait()
+    with LegoLibrary.Lock(path):
+      holding.append(True)
+      if len(holding) > 1:
+        overlaps.append(len(holding))
+      time.sleep(0.01)
+      holding.pop()
+      taken.append(True)
+  threads = [threading.Thread(target=session) for index in range(sessions)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  report = {"sessions" : sessions, "taken" : len(taken), "overlaps" : len(overlaps), "left" : sorted(os.listdir(directory))}
+  wrong = []
+  if report["taken"] != sessions:
+    wrong.append("%d of %d sessions got the lock" % (report["taken"], sessions))
+  if overlaps:
+    wrong.append("%d sessions held the lock at the same time" % len(overlaps))
+  if report["left"]:
+    wrong.append("left behind " + ", ".join(report["left"]))
+  return report, wrong
+
+
+def run_compact(generators=None):
+  """ Builds every generator (both perforation modes where it has them)
+      in compact mode and checks no part keeps more nodes than its
+      node_budget. Returns the report and the budget overruns. """
+  builder, scene, recorder = load_builder()
+  builder.compact_output = True
+  report = {"generators" : {}}
+  overruns = []
+  for name in sorted(generators or builder.Generator.registered()):
+    generator = builder.Generator.registered()[name]
+    modes = ("topology", "boolean") if hasattr(generator, "perforation_mode") else (None,)
+    original = getattr(generator, "perforation_mode", None)
+    try:
+      for mode in modes:
+        if mode is not None:
+          generator.perforation_mode = mode
+        label = name if mode is None else "%s (%s)" % (name, mode)
+        # the first build makes the shared material and template masters.
+        slider_ranges(builder, scene, generator)
+        generator.generate()
+        summary = report["generators"][label] = summarize(benchmark_generator(builder, scene, recorder, generator))
+        if summary["max_nodes_kept"] > generator.node_budget:
+          overruns.append("%s kept %d nodes, its budget is %d" % (label, summary["max_nodes_kept"], generator.node_budget))
+    finally:
+      if original is not None:
+        generator.perforation_mode = original
+  report["totals"] = dict(builder.compact_totals)
+  return report, overruns
+
+
+def mesh_bytes(mesh):
+  """ Roughly what a mesh costs in Maya: float points and int ids. """
+  return 12 * mesh.vertex_count() + 4 * (len(mesh.counts) + len(mesh.connects))
+
+
+def run_studs(count=10000, seed=0):
+  """ Builds count random Blocks with instanced studs and reports the
+      mesh memory against baking the studs into every brick, the nodes
+      made and how long regenerating the studs after a move takes, then
+      deletes some bricks. The particle made for the first build has to
+      be the one holding the studs of the bricks left at the end. The
+      viewport frame rate needs a real Maya, see LegoBuilder.viewport_fps. """
+  builder, scene, recorder = load_builder()
+  builder.part_cache.limit = builder.Constants["part_cache_size"]
+  builder.instanced_studs = True
+  choice = random.Random(seed)
+  parts = [builder.Block.part(width=choice.randint(2, 10), height=choice.randint(1, 3), depth=choice.randint(2, 10))
+           for brick in range(0, count)]
+
+  baked = bare = 0
+  sizes = {}
+  for part in parts:
+    if part.parameters not in sizes:
+      sizes[part.parameters] = (mesh_bytes(builder.LegoGeometry.block(*part.parameters)),
+                                mesh_bytes(builder.LegoGeometry.block(*part.parameters, studs=False)))
+    baked += sizes[part.parameters][0]
+    bare += sizes[part.parameters][1]
+
+  nodes_before = len(scene.nodes)
+  start = time.time()
+  names = builder.build_parts(parts)
+  scene.run_deferred()
+  build_seconds = time.time() - start
+  studs = len(builder.stud_instancer.positions) // 3
+  particle = builder.stud_instancer.particle
+
+  for name in names[:100]:
+    scene.move(1, 0, 0, name)
+  start = time.time()
+  refreshes = scene.run_deferred()
+  refresh_seconds = time.time() - start
+
+  scene.delete(names[100:110])
+  delete_refreshes = scene.run_deferred()
+  left = sum(len(builder.LegoGeometry.stud_positions(*part.parameters)) for part in parts[:100] + parts[110:])
+
+  instanced = bare + mesh_bytes(builder.LegoGeometry.cylinder(builder.Constants["stub_radius"], builder.Constants["stub_height"])) + 24 * studs
+  return {
+    "bricks" : count,
+    "studs" : studs,
+    "baked_bytes" : baked,
+    "instanced_bytes" : instanced,
+    "saving" : 1.0 - instanced / float(baked),
+    "nodes_kept" : len(scene.nodes) - nodes_before,
+    "build_seconds" : build_seconds,
+    "refreshes_after_moving_100_bricks" : refreshes,
+    "refresh_seconds" : refresh_seconds,
+    "refreshes_after_deleting_10_bricks" : delete_refreshes,
+    "studs_after_delete" : scene.particle(builder.stud_instancer.particle, query=True, count=True),
+    "studs_expected_after_delete" : left,
+    "particle_kept" : builder.stud_instancer.particle == particle
+  }
+
+
+def run_registry(count=10000, seed=0):
+  """ Builds count random Blocks and PerforatedBars in palette colours
+      and times finding parts through the registry, exporting the bill
+      of materials and saving and reloading the registry with the scene. """
+  builder, scene, recorder = load_builder()
+  builder.part_cache.limit = builder.Constants["part_cache_size"]
+  choice = random.Random(seed)
+  colors = sorted(builder.Palette)
+  parts = []
+  for index in range(0, count):
+    color = builder.Palette[choice.choice(colors)]
+    if choice.random() < 0.8:
+      parts.append(builder.Block.part(width=choice.randint(builder.Constants["min_block_width"], 4), height=1,
+                                      depth=choice.randint(builder.Constants["min_block_width"], 4), color=color))
+    else:
+      parts.append(builder.PerforatedBar.part(width=choice.randint(builder.Constants["min_block_width"], 5), color=color))
+  builder.build_parts(parts)
+
+  start = time.time()
+  red_2x4 = builder.find_parts("Block", "red", width=2, depth=4)
+  query_seconds = time.time() - start
+  start = time.time()
+  scanned = [name for name in scene.ls(type="transform") if name.startswith("Block_")]
+  scan_seconds = time.time() - start
+
+  directory = tempfile.mkdtemp(prefix="LegoRegistry")
+  start = time.time()
+  entries = builder.export_bill_of_materials(directory + "/bom.csv")
+  csv_seconds = time.time() - start
+  start = time.time()
+  builder.export_bill_of_materials(directory + "/bom.json")
+  json_seconds = time.time() - start
+
+  start = time.time()
+  scene.file("parts.mb", save=True)
+  save_seconds = time.time() - start
+  scene.file(new=True)
+  start = time.time()
+  scene.file("parts.mb", open=True)
+  load_seconds = time.time() - start
+  registry = builder.part_registry
+  return {
+    "parts" : count,
+    "red_2x4_blocks" : len(red_2x4),
+    "query_seconds" : query_seconds,
+    "ls_scan_seconds" : scan_seconds,
+    "bill_of_materials_entries" : len(entries),
+    "csv_seconds" : csv_seconds,
+    "json_seconds" : json_seconds,
+    "saved_characters" : len(scene.file_info[builder.registry_key]),
+    "save_seconds" : save_seconds,
+    "load_seconds" : load_seconds,
+    "reloaded_parts" : len(registry),
+    "reloaded_matches" : registry.query("Block", builder.material_pool.quantize(builder.Palette["red"]), width=2, depth=4) == red_2x4
+  }
+
+
+def run_startup():
+  """ Times opening the Picker on a fresh scene, then every tab the first
+      time and again, then the window closed and opened again. Returns the
+      report and the tabs or reopenings that drew controls again, as
+      nothing should be drawn twice. """
+  builder, scene, recorder = load_builder()
+
+  def measure(function, *args):
+    recorder.reset()
+    start = time.time()
+    function(*args)
+    return {
+      "seconds" : time.time() - start,
+      "calls" : sum(recorder.calls.values()),
+      "drawn" : recorder.calls.get("frameLayout", 0) + recorder.calls.get("intSliderGrp", 0)
+    }
+
+  report = {"startup" : measure(builder.Picker.draw_ui), "tabs" : {}}
+  redrawn = []
+  for name, generator in builder.Generator.registered().items():
+    entry = report["tabs"][name] = {}
+    for label in ("first_open", "reopen"):
+      entry[label] = measure(builder.Picker.show, generator)
+    if entry["reopen"]["drawn"]:
+      redrawn.append(name)
+  # closing a retained window only hides it.
+  report["reopen_window"] = measure(builder.Picker.draw_ui)
+  if report["reopen_window"]["drawn"]:
+    redrawn.append("window")
+  return report, redrawn
+
+
+def run_undo():
+  """ Builds the smallest part of every generator as one batch, undoes it
+      and redoes it. Every mesh the legoMesh command made has to be gone
+      after the undo and back after the redo; the rest of the fake
+      commands are not undoable, so only those meshes are checked.
+      Returns the report and the meshes that were not. """
+  builder, scene, recorder = load_builder()
+  parts = []
+  for generator in builder.Generator.registered().values():
+    values = dict((name, low) for name, low, high in slider_ranges(builder, scene, generator))
+    parts.append(generator.part(**values))
+  builder.build_parts(parts)
+  made = [command.result for command in scene.undo_queue[-1] if command.mode == "create"]
+  scene.undo()
+  kept = [name for name in made if scene.objExists(name)]
+  scene.redo()
+  lost = [name for name in made if not scene.objExists(name)]
+  return {"parts" : len(parts), "meshes" : len(made), "kept_after_undo" : kept, "lost_after_redo" : lost}, kept + lost
+
+
+def run_cancel(parts=6, slices=3):
+  """ Runs a batch of Blocks through a BuildScheduler a part per slice,
+      has the artist make a polyCube between two slices and cancels after
+      slices slices. The cube has to survive the cancel and the parts
+      built so far have to be gone. A second batch whose second slice
+      raises has to end "failed" with its progressWindow closed. Returns
+      the report and what went wrong. """
+  builder, scene, recorder = load_builder()
+  values = dict((name, low) for name, low, high in slider_ranges(builder, scene, builder.Block))
+  scheduler = builder.BuildScheduler([builder.Block.part(**values)] * parts, frame_time=1e-9).start()
+  scene.run_deferred(limit=slices - 1)
+  cube = scene.polyCube(name="artistCube")[0]
+  scene.run_deferred(limit=1)
+  built = list(scheduler.names)
+  scheduler.cancel()
+  scene.run_deferred()
+
+  # a slice that raises has to close the progressWindow and stop stepping.
+  failing = builder.BuildScheduler([builder.Block.part(**values)] * parts, frame_time=1e-9)
+  failing.interactive = True
+  fetch = builder.part_cache.fetch
+  def broken(generator, parameters):
+    raise RuntimeError("broken part")
+  failing.start()
+  scene.run_deferred(limit=1)
+  builder.part_cache.fetch = broken
+  try:
+    scene.run_deferred(limit=1)
+    raised = False
+  except RuntimeError:
+    raised = True
+  finally:
+    builder.part_cache.fetch = fetch
+  steps_left = scene.run_deferred()
+
+  report = {
+    "parts" : parts,
+    "built_before_cancel" : len(built),
+    "state" : scheduler.state,
+    "cube_kept" : scene.objExists(cube),
+    "parts_left" : [name for name in built if scene.objExists(name)],
+    "failed_state" : failing.state,
+    "failed_progress_open" : bool(scene.progress),
+    "failed_position" : failing.position
+  }
+  wrong = ["part %s survived the cancel" % name for name in report["parts_left"]]
+  if not report["cube_kept"]:
+    wrong.append("the cancel deleted %s, made between slices" % cube)
+  if not built or report["state"] != "cancelled":
+    wrong.append("the scheduler built %d parts and ended %s" % (len(built), report["state"]))
+  if not raised or report["failed_state"] != "failed":
+    wrong.append("a failing slice ended the scheduler %s" % report["failed_state"])
+  if report["failed_progress_open"]:
+    wrong.append("a failing slice left the progressWindow open")
+  if steps_left or report["failed_position"] != 1:
+    wrong.append("the scheduler went on for %d steps after a failing slice" % steps_left)
+  return report, wrong
+
+
+def run_preview(colours=50):
+  """ Drags a Block's colour slider through colours colours and lets go.
+      The drag has to recolour one preview shader rather than make a
+      material per colour, and the preview has to end up in the pooled
+      material of the colour it was let go at. Returns the report and
+      what went wrong. """
+  builder, scene, recorder = load_builder()
+  builder.live_preview.interval = 0
+  slider_ranges(builder, scene, builder.Block)
+  slider = builder.Block.get_prefix() + builder.Labels["color_label"]
+  shaders = lambda: [name for name, node in scene.nodes.items() if node.node_type == "blinn"]
+  before = len(shaders())
+  for index in range(colours):
+    scene.colorSliderGrp(slider, edit=True, rgbValue=[index / float(colours), 0.5, 0.25])
+    scene.controls[slider]["dragCommand"]()
+  dragged = len(shaders()) - before
+  scene.controls[slider]["changeCommand"]()
+  node = builder.live_preview.node
+  shader, group = builder.material_pool.material(scene.colorSliderGrp(slider, query=True, rgbValue=True))
+  report = {
+    "colours" : colours,
+    "shaders_made_dragging" : dragged,
+    "shaders_made" : len(shaders()) - before,
+    "committed" : node in (scene.sets(group, query=True) or [])
+  }
+  wrong = []
+  if report["shaders_made_dragging"] > 1:
+    wrong.append("dragging through %d colours made %d shaders" % (colours, dragged))
+  if not report["committed"]:
+    wrong.append("letting go left %s out of the pooled material %s" % (node, group))
+  return report, wrong
+
+
+def run_lods():
+  """ Builds each wheel and checks every level of its lodGroup is driven
+      by the matching lodGroup output, without which Maya draws them all.
+      Returns the report and the levels left unconnected. """
+  builder, scene, recorder = load_builder()
+  report = {}
+  wrong = []
+  for generator in (builder.Wheel, builder.BigWheel):
+    values = dict((name, low) for name, low, high in slider_ranges(builder, scene, generator))
+    group = generator.build(**values)[0]
+    levels = scene.nodes[group].attrs.get("children", [])
+    report[generator.__name__] = dict((level, scene.listConnections(level + ".lodVisibility", source=True, plugs=True)) for level in levels)
+    if len(levels) != len(builder.Constants["wheel_lod_levels"]):
+      wrong.append("%s has %d levels" % (group, len(levels)))
+    for index, level in enumerate(levels):
+      if report[generator.__name__][level] != [group + ".output[%d]" % index]:
+        wrong.append("%s is not driven by %s.output[%d]" % (level, group, index))
+  return report, wrong
+
+
+def compare(old, new):
+  """ Lists the generators whose worst case command or node count grew. """
+  regressions = []
+  for name, entry in new["generators"].items():
+    if name not in old["generators"]:
+      continue
+    before, after = old["generators"][name]["summary"], entry["summary"]
+    for key in ("max_calls", "max_nodes_created"):
+      if after[key] > before[key]:
+        regressions.append("%s %s went from %d to %d" % (name, key, before[key], after[key]))
+  return regressions
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark the LegoBuilder generators on a fake maya.cmds.")
+  parser.add_argument("--generator", action="append", dest="generators")
+  parser.add_argument("--output", help="write the full JSON report here")
+  parser.add_argument("--compare", help="a previous JSON report to check for regressions")
+  parser.add_argument("--templates", action="store_true", help="compare the boolean builds without and with the primitive templates")
+  parser.add_argument("--studs", type=int, metavar="BRICKS", help="report the instanced stud savings on this many random bricks")
+  parser.add_argument("--registry", type=int, metavar="PARTS", help="time registry queries, bill of materials export and reload on this many parts")
+  parser.add_argument("--compact", action="store_true", help="check every generator stays within its node budget in compact mode")
+  parser.add_argument("--import-scene", type=int, metavar="NODES", dest="import_scene", help="time importing LegoBuilder into a scene of this many nodes")
+  parser.add_argument("--undo", action="store_true", help="check undoing and redoing a batch build removes and restores its meshes")
+  parser.add_argument("--cancel", action="store_true", help="check cancelling or failing a scheduled build cleans up after itself")
+  parser.add_argument("--preview", action="store_true", help="check dragging the colour slider reuses one preview shader")
+  parser.add_argument("--lods", action="store_true", help="check every wheel level of detail is driven by its lodGroup")
+  parser.add_argument("--startup", action="store_true", help="time opening the Picker and its tabs and check nothing is drawn twice")
+  parser.add_argument("--library", nargs="?", const="", metavar="DIRECTORY", help="compare cold builds against warm part library loads and check a stale lock is broken once")
+  arguments = parser.parse_args(argv)
+
+  if arguments.studs:
+    report = run_studs(arguments.studs)
+    print(json.dumps(report, indent=1, sort_keys=True))
+    stale = not report["particle_kept"] or report["studs_after_delete"] != report["studs_expected_after_delete"]
+    if stale:
+      print("STALE: the studs were not updated in place after deleting bricks")
+    return 1 if stale else 0
+  if arguments.registry:
+    print(json.dumps(run_registry(arguments.registry), indent=1, sort_keys=True))
+    return 0
+  if arguments.import_scene:
+    report, scanned = run_import(arguments.import_scene)
+    print(json.dumps(report, indent=1, sort_keys=True))
+    if scanned:
+      print("SCANNED: importing LegoBuilder listed the scene")
+    return 1 if scanned else 0
+  if arguments.undo:
+    report, wrong = run_undo()
+    print(json.dumps(report, indent=1, sort_keys=True))
+    return 1 if wrong else 0
+  if arguments.cancel:
+    report, wrong = run_cancel()
+    print(json.dumps(report, indent=1, sort_keys=True))
+    for problem in wrong:
+      print("WRONG: " + problem)
+    return 1 if wrong else 0
+  if arguments.preview:
+    report, wrong = run_preview()
+    print(json.dumps(report, indent=1, sort_keys=True))
+    for problem in wrong:
+      print("WRONG: " + problem)
+    return 1 if wrong else 0
+  if arguments.lods:
+    report, wrong = run_lods()
+    print(json.dumps(report, indent=1, sort_keys=True))
+    for problem in wrong:
+      print("WRONG: " + problem)
+    return 1 if wrong else 0
+  if arguments.startup:
+    report, redrawn = run_startup()
+    print(json.dumps(report, indent=1, sort_keys=True))
+    for name in redrawn:
+      print("REDRAWN: " + name)
+    return 1 if redrawn else 0
+  if arguments.compact:
+    report, overruns = run_compact(arguments.generators)
+    print(json.dumps(report, indent=1, sort_keys=True))
+    for overrun in overruns:
+      print("OVER BUDGET: " + overrun)
+    return 1 if overruns else 0
+  if arguments.library is not None:
+    report = run_library(arguments.library, arguments.generators)
+    report["stale_lock"], wrong = run_lock()
+    print(json.dumps(report, indent=1, sort_keys=True))
+    for problem in wrong:
+      print("WRONG: " + problem)
+    return 1 if wrong else 0
+  if arguments.templates:
+    print(json.dumps(run_templates(arguments.generators), indent=1, sort_keys=True))
+    return 0
+
+  report = run(arguments.generators)
+  if arguments.output:
+    with open(arguments.output, "w") as output:
+      json.dump(report, output, indent=1, sort_keys=True)
+  summaries = dict((name, entry["summary"]) for name, entry in report["generators"].items())
+  print(json.dumps(summaries, indent=1, sort_keys=True))
+
+  if arguments.compare:
+    with open(arguments.compare) as previous:
+      regressions = compare(json.load(previous), report)
+    for regression in regressions:
+      print("REGRESSION: " + regression)
+    return 1 if regressions else 0
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
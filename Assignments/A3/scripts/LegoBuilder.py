@@ -1,57 +1,26 @@
 """ LegoBuilder - Maya Python Module"""
 
 import maya.cmds as cmds
+import maya.api.OpenMaya as om
+from array import array
+import atexit
+import collections
+import csv
+import json
+import math
+import os
 import re
-
-# use the next available id
-all_scene_objects = cmds.ls() 
-matching_objects = []
-for name in all_scene_objects:
-    regex = re.compile('\d+')
-    match = regex.search(name) 
-    if match is not None:
-        matching_objects.append(match.group())
-used_ids = []
-for integer in matching_objects:
-    used_ids.append(int(integer))
-    
-    
-
-next_id = max(used_ids)
-
-Constants = {
-  "window_width" : 500,
-  "window_height" : 400,
-  "window_padding" : 10,
-  "block_height_unit" : 1,
-  "block_width_unit" : 1,
-  "block_depth_unit" : 1,
-  "stub_height" : 0.1,
-  "stub_radius" : 0.3,
-  "perforation_radius" : 0.3,
-  "min_block_width" : 2,
-  "max_block_width" : 10,
-  "min_block_height" : 1,
-  "max_block_height" : 3,
-  "wheel_min_radius" : 2,
-  "wheel_radius_unit" : 1,
-  "wheel_ridge_depth" : 0.1,
-  "wheel_height_unit" : 0.5,
-  "wheel_min_subdivs" : 5,
-  "wheel_max_subdivs" : 30
-}
-
-Labels = {
-  "width_label" : "Width",
-  "depth_label" : "Depth",
-  "height_label" : "Height",
-  "dimensions_label" : "Dimensions",
-  "before_kink_label" : "before_kink",
-  "after_kink_label" : "after_kink",
-  "radius_label" : "Radius",
-  "subdivs_label" : "Subdivs",
-  "color_label" : "Color"
-}
+import time
+
+import LegoAssembly
+import LegoConnections
+import LegoGeometry
+import LegoLibrary
+import LegoMeshCommand
+import LegoMeshOps
+import LegoProfiler
+import LegoRegistry
+from LegoConstants import Constants, Labels, Palette, Ranges
 
 #Functions for readability.
 def half(num):
@@ -60,114 +29,893 @@ def half(num):
 def twice(num):
   return num*2.00
 
-def get_unique_name(prefix, identifier):
-  global next_id
-  next_id += 1
-  return prefix + "_" + identifier + "_" + "%03d" % (next_id,)
-
+class IdAllocator:
+  """ Hands out the next free id for each name prefix. A prefix is only
+      looked up in the scene the first time it is used, after that the
+      counters are kept current by a node added callback. That first
+      lookup is one wildcard ls of the prefix, so its cost grows with the
+      scene (about 0.1s per prefix on a 100k node FakeScene, see LegoBenchmark
+      --import-scene) but is paid once per prefix and never on import. """
+
+  name_pattern = re.compile(r"^(.*)_(\d+)$")
+
+  def __init__(self):
+    self.counters = {}
+    self.callback_id = None
+    try:
+      self.callback_id = om.MDGMessage.addNodeAddedCallback(self.node_added, "dependNode")
+    except (AttributeError, RuntimeError):
+      pass
+
+  def seed(self, stem):
+    highest = 0
+    for name in cmds.ls(stem + "_*") or []:
+      match = self.name_pattern.match(name)
+      if match is not None and match.group(1) == stem:
+        highest = max(highest, int(match.group(2)))
+    return highest
+
+  def node_added(self, node, *args):
+    match = self.name_pattern.match(om.MFnDependencyNode(node).name())
+    if match is not None and match.group(1) in self.counters:
+      stem = match.group(1)
+      self.counters[stem] = max(self.counters[stem], int(match.group(2)))
+
+  def next_name(self, stem):
+    if stem not in self.counters:
+      self.counters[stem] = self.seed(stem)
+    # the callback can miss renames, so never trust the counter blindly.
+    while True:
+      self.counters[stem] += 1
+      name = stem + "_" + "%03d" % (self.counters[stem],)
+      if not cmds.objExists(name):
+        return name
+
+  def release(self):
+    if self.callback_id is not None:
+      om.MMessage.removeCallback(self.callback_id)
+      self.callback_id = None
+
+id_allocator = None
+
+def get_id_allocator():
+  """ Creates the allocator on first use so importing stays cheap. """
+  global id_allocator
+  if id_allocator is None:
+    id_allocator = IdAllocator()
+  return id_allocator
+
+def reset_id_allocator():
+  """ Forget all counters, e.g. after opening a new scene. """
+  global id_allocator
+  if id_allocator is not None:
+    id_allocator.release()
+  id_allocator = None
 
+def get_unique_name(prefix, identifier):
+  return get_id_allocator().next_name(prefix + "_" + identifier)
+
+class NodeTracker:
+  """ Records every node created between start and stop, by handle so
+      renames are followed and deleted nodes are noticed. """
+
+  def __init__(self):
+    self.handles = []
+    self.callback_id = None
+
+  def start(self):
+    self.callback_id = om.MDGMessage.addNodeAddedCallback(self.node_added, "dependNode")
+    return self
+
+  def stop(self):
+    if self.callback_id is not None:
+      om.MMessage.removeCallback(self.callback_id)
+      self.callback_id = None
+
+  def node_added(self, node, *args):
+    self.handles.append(om.MObjectHandle(node))
+
+  def names(self):
+    """ The tracked nodes that still exist, oldest first. """
+    return [om.MFnDependencyNode(handle.object()).name() for handle in self.handles if handle.isValid()]
+
+  def delete(self):
+    """ Deletes the tracked nodes that still exist, newest first. """
+    for name in reversed(self.names()):
+      if cmds.objExists(name):
+        cmds.delete(name)
+
+# PROFILING
+
+maya_cmds = cmds
+profiler = LegoProfiler.Profiler()
+profiler_summary = LegoProfiler.SummarySink()
+profiler_callback_id = None
+
+def enable_profiling(*sinks):
+  """ Starts profiling every generate into sinks (the Picker summary is
+      always one of them). cmds is swapped for a counting stand in. """
+  global cmds, profiler_callback_id
+  profiler.sinks = [profiler_summary] + list(sinks)
+  profiler.enabled = True
+  cmds = LegoProfiler.CountingCmds(maya_cmds, profiler)
+  if profiler_callback_id is None:
+    profiler_callback_id = om.MDGMessage.addNodeAddedCallback(profiler.node_added, "dependNode")
+  # an open Picker gets its Profile frame now, not when next opened.
+  Picker.refresh()
+
+def disable_profiling():
+  global cmds, profiler_callback_id
+  profiler.enabled = False
+  cmds = maya_cmds
+  if profiler_callback_id is not None:
+    om.MMessage.removeCallback(profiler_callback_id)
+    profiler_callback_id = None
+  Picker.refresh()
+
+# the legoMesh command (see LegoMeshCommand) is loaded on first use.
+mesh_command = None
+
+def has_mesh_command():
+  """ Loads the legoMesh plug-in the first time a mesh is made. Without
+      it meshes are made with OpenMaya directly, which undo skips. """
+  global mesh_command
+  if mesh_command is None:
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LegoMeshCommand.py")
+    try:
+      cmds.loadPlugin(path, quiet=True)
+      mesh_command = True
+    except (AttributeError, RuntimeError):
+      mesh_command = False
+  return mesh_command
+
+def create_mesh(mesh, name):
+  """ Turns a LegoGeometry.Mesh into a mesh node with one legoMesh call,
+      returns [transform] like the poly commands do. """
+  with profiler.phase("primitive"):
+    if has_mesh_command():
+      name = cmds.legoMesh("create", name, LegoMeshCommand.encode(mesh))
+    else:
+      transform = om.MFnMesh().create(LegoMeshCommand.vertices(mesh.points), mesh.counts, mesh.connects)
+      name = om.MFnDependencyNode(transform).setName(name)
+  cmds.sets(name, edit=True, forceElement="initialShadingGroup")
+  return [name]
+
+def weld_node(transform, tolerance=None, shells=False):
+  """ Welds the points of a mesh node that has no history with
+      LegoMeshOps.clean (or clean_shells with shells, to keep overlapping
+      shells apart), so only points within tolerance of each other merge,
+      and writes the result back in place. """
+  with profiler.phase("unite"):
+    shape = om.MFnMesh(om.MSelectionList().add(transform).getDagPath(0))
+    mesh = LegoGeometry.Mesh()
+    for point in shape.getPoints():
+      mesh.points.extend((point.x, point.y, point.z))
+    counts, connects = shape.getVertices()
+    mesh.counts.extend(counts)
+    mesh.connects.extend(connects)
+    welded = (LegoMeshOps.clean_shells if shells else LegoMeshOps.clean)(mesh, tolerance)
+    if has_mesh_command():
+      cmds.legoMesh("edit", transform, LegoMeshCommand.encode(welded))
+    else:
+      shape.createInPlace(LegoMeshCommand.vertices(welded.points), welded.counts, welded.connects)
+  return [transform]
+
+# PART LIBRARY
+
+part_library = None
+
+def enable_part_library(directory, limit=None):
+  """ Keeps the meshes of built parts in directory (see LegoLibrary), so
+      later sessions load them instead of computing them again. Its
+      pending load times are written when it is disabled or maya quits. """
+  global part_library
+  disable_part_library()
+  part_library = LegoLibrary.PartLibrary(directory, limit)
+  return part_library
+
+def disable_part_library():
+  global part_library
+  if part_library is not None:
+    part_library.close()
+  part_library = None
+
+# registered once here rather than per library, so enabling and disabling
+# libraries does not pile up exit handlers keeping closed ones alive.
+atexit.register(disable_part_library)
+
+def kernel_part(generator, parameters):
+  """ The LegoGeometry mesh of a part, welded as LegoGeometry.Welds says
+      (see LegoMeshOps.kernel_part). """
+  return LegoMeshOps.kernel_part(generator.__name__, parameters)
+
+def kernel_mesh(generator, *parameters):
+  """ The LegoGeometry mesh of a part, from the part library if enabled. """
+  build = lambda *parameters: kernel_part(generator, parameters)
+  if part_library is None:
+    return build(*parameters)
+  return part_library.fetch(generator.__name__, parameters, build, LegoGeometry.Welds.get(generator.__name__))
+
+# a shared library directory can be set up for every session at once.
+if os.environ.get("LEGOBUILDER_LIBRARY"):
+  enable_part_library(os.environ["LEGOBUILDER_LIBRARY"])
+
+# the camera level of detail groups measure their distance from.
+lod_camera = "perspShape"
+
+def create_lod_group(meshes, name):
+  """ Creates a node per LegoGeometry.Mesh in meshes, most detailed first,
+      under a lodGroup switching between them at wheel_lod_distances from
+      lod_camera. Levels sharing a mesh share it as an instance. Returns
+      [lodGroup]. """
+  group = cmds.createNode("lodGroup", name=name)
+  levels = []
+  created = {}
+  for mesh in meshes:
+    if id(mesh) in created:
+      levels.append(cmds.instance(created[id(mesh)], name=get_unique_name(name, "lod"))[0])
+    else:
+      levels.append(create_mesh(mesh, get_unique_name(name, "lod"))[0])
+      created[id(mesh)] = levels[-1]
+  levels = cmds.parent(levels, group)
+  # the lodGroup only switches the levels wired to its outputs.
+  for index, level in enumerate(levels):
+    cmds.connectAttr(group + ".output[%d]" % index, level + ".lodVisibility", force=True)
+  for index, distance in enumerate(Constants["wheel_lod_distances"]):
+    cmds.setAttr(group + ".threshold[%d]" % index, distance)
+  if cmds.objExists(lod_camera):
+    cmds.connectAttr(lod_camera + ".worldMatrix[0]", group + ".cameraMatrix", force=True)
+  return [group]
+
+class PartCache:
+  """ Remembers a hidden master of the parts built this session, keyed on
+      the generator and its parameters, and hands out a duplicate (or an
+      instance) of it instead of building the same part again. The least
+      recently used master is deleted once there are more than limit. """
+
+  def __init__(self, limit, mode="duplicate"):
+    self.limit = limit
+    self.mode = mode
+    self.masters = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def key(self, generator, parameters):
+    return (generator.__name__, getattr(generator, "perforation_mode", None), instanced_studs) + tuple(parameters)
+
+  def fetch(self, generator, parameters):
+    if self.limit <= 0:
+      self.misses += 1
+      final = build_output(generator, parameters)
+      place(generator, final[0], parameters)
+      return final
+
+    key = self.key(generator, parameters)
+    master = self.masters.pop(key, None)
+    if master is not None and cmds.objExists(master):
+      self.hits += 1
+    else:
+      self.misses += 1
+      master = build_output(generator, parameters)[0]
+      cmds.hide(master)
+    self.masters[key] = master
+    self.evict()
+
+    name = get_unique_name(generator.get_prefix(), "")
+    if self.mode == "instance":
+      copy = cmds.instance(master, name=name)
+    else:
+      copy = cmds.duplicate(master, name=name, inputConnections=generator.keep_input_connections)
+    cmds.showHidden(copy[0])
+    place(generator, copy[0], parameters)
+    return copy
+
+  def evict(self):
+    while len(self.masters) > max(self.limit, 0):
+      key, master = self.masters.popitem(last=False)
+      if cmds.objExists(master):
+        cmds.delete(master)
+
+  def clear(self):
+    for master in self.masters.values():
+      if cmds.objExists(master):
+        cmds.delete(master)
+    self.masters.clear()
+
+part_cache = PartCache(Constants["part_cache_size"])
+
+# PRIMITIVE TEMPLATES
+
+def build_cap(name, radius, depth):
+  """ A half cylinder bar end, cut out of a full polyCylinder. """
+  cap = cmds.polyCylinder(sc=1, sy=2, radius=radius, height=depth, name=name)
+  cmds.delete(cap[0] + ".f[0:3]", cap[0] + ".f[14:23]", cap[0] + ".f[34:43]", cap[0] + ".f[54:63]", cap[0] + ".f[74:79]")
+  return cap
+
+def build_cylinder(name, radius, height):
+  return cmds.polyCylinder(name=name, radius=radius, height=height)
+
+class TemplateLibrary:
+  """ Builds each primitive the boolean generators are put together from
+      (caps, studs and holes) once per size as a hidden master, and
+      stamps out duplicates of it. While disabled every stamp builds the
+      primitive from scratch, which is what the masters are compared
+      against. """
+
+  builders = {
+    "cap" : build_cap,
+    "stud" : build_cylinder,
+    "hole" : build_cylinder
+  }
+
+  def __init__(self):
+    self.enabled = True
+    self.masters = {}
+
+  def stamp(self, kind, name, *parameters):
+    """ Returns [transform] of a fresh kind primitive called name. """
+    if not self.enabled:
+      return self.builders[kind](name, *parameters)
+    key = (kind,) + parameters
+    master = self.masters.get(key)
+    if master is None or not cmds.objExists(master):
+      master = self.builders[kind](get_unique_name("LegoBuilder", kind), *parameters)[0]
+      # copies only need the finished mesh, not how it was made.
+      cmds.delete(master, ch=1)
+      cmds.hide(master)
+      self.masters[key] = master
+    copy = cmds.duplicate(master, name=name)
+    cmds.showHidden(copy[0])
+    return copy
+
+  def clear(self):
+    for master in self.masters.values():
+      if cmds.objExists(master):
+        cmds.delete(master)
+    self.masters.clear()
+
+templates = TemplateLibrary()
+
+def subtract(prefix, solid, cutters):
+  """ Unites the cutter transforms and cuts them out of solid with
+      polyBoolOp. The result keeps no history, and the cutters, their
+      united group and the solid transform, which polyUnite and polyBoolOp
+      leave behind empty, are deleted. Returns [transform]. """
+  group = cmds.polyUnite(cutters, name=get_unique_name(prefix, "boolean"))
+  result = cmds.polyBoolOp(solid, group[0], op=2, n=get_unique_name(prefix, ""))
+  cmds.delete(result[0], ch=1)
+  leftovers = [name for name in [solid, group[0]] + list(cutters) if cmds.objExists(name)]
+  if leftovers:
+    cmds.delete(leftovers)
+  return [result[0]]
+
+# INSTANCED STUDS
+
+# when set bricks are built without studs and stud_instancer draws them.
+instanced_studs = False
+
+class StudInstancer:
+  """ Draws the studs of every tracked brick through one particle
+      instancer fed from a flat array of stud positions, instead of each
+      brick carrying its own stud geometry. Moving or deleting a tracked
+      brick marks the array dirty and it is gathered again once, on idle.
+      The particle and instancer are made once; a refresh only emits or
+      deletes particles to match the stud count and sets their positions. """
+
+  def __init__(self):
+    self.bricks = collections.OrderedDict()
+    self.positions = array('d')
+    self.master = None
+    self.particle = None
+    self.instancer = None
+    self.pending = False
+
+  def track(self, transform, studs):
+    """ Adds a brick and the local positions of its studs. """
+    node = om.MSelectionList().add(transform).getDependNode(0)
+    callback_ids = (om.MNodeMessage.addAttributeChangedCallback(node, self.brick_changed),
+                    om.MNodeMessage.addNodePreRemovalCallback(node, self.brick_changed))
+    self.bricks[transform] = (studs, callback_ids)
+    self.brick_changed()
+
+  def brick_changed(self, *args):
+    if not self.pending:
+      self.pending = True
+      cmds.evalDeferred(self.refresh, lowestPriority=True)
+
+  def refresh(self):
+    """ Gathers the world position of every stud and rebuilds the
+        instancer from them, dropping bricks that were deleted. """
+    self.pending = False
+    positions = array('d')
+    for transform, (studs, callback_ids) in list(self.bricks.items()):
+      if not cmds.objExists(transform):
+        for callback_id in callback_ids:
+          om.MMessage.removeCallback(callback_id)
+        del self.bricks[transform]
+        continue
+      m = cmds.xform(transform, query=True, matrix=True, worldSpace=True)
+      for x, y, z in studs:
+        positions.extend((x * m[0] + y * m[4] + z * m[8] + m[12],
+                          x * m[1] + y * m[5] + z * m[9] + m[13],
+                          x * m[2] + y * m[6] + z * m[10] + m[14]))
+    self.positions = positions
+    self.rebuild()
+
+  def rebuild(self):
+    if self.master is None or not cmds.objExists(self.master):
+      stud = LegoGeometry.cylinder(Constants["stub_radius"], Constants["stub_height"])
+      self.master = create_mesh(stud, get_unique_name("LegoBuilder", "studMaster"))[0]
+      cmds.hide(self.master)
+    if not self.positions:
+      # a particle object cannot be emptied, so it goes until needed.
+      for node in (self.instancer, self.particle):
+        if node is not None and cmds.objExists(node):
+          cmds.delete(node)
+      self.particle = self.instancer = None
+      return
+    points = [tuple(self.positions[i:i + 3]) for i in range(0, len(self.positions), 3)]
+    if self.particle is None or not cmds.objExists(self.particle):
+      if self.instancer is not None and cmds.objExists(self.instancer):
+        cmds.delete(self.instancer)
+      self.particle = cmds.particle(position=points, name=get_unique_name("LegoBuilder", "studs"))[0]
+      shape = cmds.listRelatives(self.particle, shapes=True)[0]
+      cmds.setAttr(shape + ".isDynamic", False)
+      self.instancer = cmds.particleInstancer(shape, addObject=True, object=self.master)
+      return
+    shape = cmds.listRelatives(self.particle, shapes=True)[0]
+    count = cmds.particle(self.particle, query=True, count=True)
+    if count < len(points):
+      cmds.emit(object=self.particle, position=points[count:])
+    elif count > len(points):
+      cmds.delete("%s.pt[%d:%d]" % (shape, len(points), count - 1))
+    cmds.setAttr(shape + ".position", len(points), *points, type="vectorArray")
+    cmds.saveInitialState(shape)
+
+  def clear(self):
+    for studs, callback_ids in self.bricks.values():
+      for callback_id in callback_ids:
+        om.MMessage.removeCallback(callback_id)
+    self.bricks.clear()
+    self.positions = array('d')
+    self.rebuild()
+
+stud_instancer = StudInstancer()
+
+def viewport_fps(frames=100):
+  """ Redraws the current viewport frames times and returns the frame
+      rate, for comparing scenes with and without instanced studs. """
+  start = time.time()
+  for frame in range(0, frames):
+    cmds.refresh(currentView=True, force=True)
+  seconds = time.time() - start
+  return frames / seconds if seconds else 0.0
+
+# CONNECTIONS
+
+# when set every placed part is registered with connection_tracker.
+track_connections = False
+
+def place(generator, transform, parameters):
+  """ Hands a part just put in the scene to whatever keeps track of it. """
+  generator.placed(transform, parameters)
+  if track_connections and generator.__name__ in LegoGeometry.Parts:
+    connection_tracker.track(transform, generator, parameters)
+
+class ConnectionTracker:
+  """ Keeps a LegoConnections index of the tracked parts in the scene, for
+      snapping parts onto free studs and finding overlaps. Moving or
+      deleting a part marks it dirty and the dirty parts are rehashed
+      (or dropped) once, on idle. """
+
+  def __init__(self):
+    self.index = LegoConnections.ConnectionIndex()
+    self.callbacks = {}
+    self.dirty = set()
+    self.pending = False
+
+  def translation(self, transform):
+    return cmds.xform(transform, query=True, matrix=True, worldSpace=True)[12:15]
+
+  def track(self, transform, generator, parameters):
+    node = om.MSelectionList().add(transform).getDependNode(0)
+    changed = lambda *args: self.part_changed(transform)
+    self.callbacks[transform] = (om.MNodeMessage.addAttributeChangedCallback(node, changed),
+                                 om.MNodeMessage.addNodePreRemovalCallback(node, changed))
+    self.index.add(transform, generator.__name__, parameters, self.translation(transform))
+
+  def part_changed(self, transform):
+    self.dirty.add(transform)
+    if not self.pending:
+      self.pending = True
+      cmds.evalDeferred(self.refresh, lowestPriority=True)
+
+  def refresh(self):
+    """ Rehashes the parts that moved, dropping the ones deleted. """
+    self.pending = False
+    dirty, self.dirty = self.dirty, set()
+    for transform in dirty:
+      if transform not in self.index.parts:
+        continue
+      if cmds.objExists(transform):
+        self.index.move(transform, self.translation(transform))
+      else:
+        self.untrack(transform)
+
+  def untrack(self, transform):
+    for callback_id in self.callbacks.pop(transform):
+      om.MMessage.removeCallback(callback_id)
+    self.index.remove(transform)
+
+  def snap(self, names=None, radius=None):
+    """ Moves every tracked part in names (the selection by default) onto
+        the nearest free stud within radius. Returns the parts moved. """
+    self.refresh()
+    moved = []
+    for name in names or cmds.ls(selection=True, type="transform") or []:
+      if name in self.index.parts:
+        position = self.index.snap_part(name, radius)
+        if position is not None:
+          cmds.move(position[0], position[1], position[2], name, absolute=True)
+          moved.append(name)
+    return moved
+
+  def overlaps(self, name):
+    """ The tracked parts whose bodies cut into name. """
+    self.refresh()
+    return self.index.part_overlaps(name)
+
+  def clear(self):
+    for transform in list(self.callbacks):
+      self.untrack(transform)
+    self.dirty.clear()
+
+connection_tracker = ConnectionTracker()
+
+# COMPACT OUTPUT
+
+# when set every part is cut down to its own nodes as soon as it is built.
+compact_output = False
+compact_totals = {"parts" : 0, "nodes_before" : 0, "nodes_after" : 0}
+
+def build_output(generator, parameters):
+  """ Builds a part, compacted if compact_output is set. """
+  if not compact_output:
+    return generator.build(*parameters)
+  tracker = NodeTracker().start()
+  try:
+    final = generator.build(*parameters)
+  finally:
+    tracker.stop()
+  before, after = compact_part(final[0], tracker)
+  compact_totals["parts"] += 1
+  compact_totals["nodes_before"] += before
+  compact_totals["nodes_after"] += after
+  return final
+
+def compact_part(transform, tracker):
+  """ Deletes the history of a freshly built part and every other node
+      its build left behind, keeping the part (a transform and its shape,
+      or a level of detail group and its levels) and the template masters.
+      Returns the node counts the build left before and after. """
+  cmds.delete(transform, constructionHistory=True)
+  keep = set([transform] + (cmds.listRelatives(transform, allDescendents=True) or []))
+  for master in templates.masters.values():
+    keep.update([master] + (cmds.listRelatives(master, allDescendents=True) or []))
+  names = tracker.names()
+  for name in reversed(names):
+    if name not in keep and cmds.objExists(name):
+      cmds.delete(name)
+  return len(names), len([name for name in names if name in keep and cmds.objExists(name)])
+
+def compact_scene():
+  """ Compacts the LegoBuilder parts already in the scene: history is
+      deleted from every part and the empty transforms left over from
+      building them are removed. Returns the scene's node count before
+      and after. """
+  before = len(cmds.ls())
+  part_pattern = re.compile(r"^(%s)_" % "|".join(Generator.registered()))
+  candidates = [name for name in cmds.ls(type="transform") if part_pattern.match(name) and "_preview_" not in name]
+  parts = [name for name in candidates if cmds.listRelatives(name, allDescendents=True, noIntermediate=True)]
+  if parts:
+    cmds.delete(parts, constructionHistory=True)
+  for name in candidates:
+    if name not in parts and cmds.objExists(name):
+      cmds.delete(name)
+  return {"parts" : len(parts), "nodes_before" : before, "nodes_after" : len(cmds.ls())}
+
+class MaterialPool:
+  """ Shares one blinn and shading group per colour between all parts.
+      Colours are snapped to the nearest entry of palette when one is set,
+      otherwise rounded to precision decimals. """
+
+  def __init__(self, palette=None, precision=3):
+    self.palette = palette
+    self.precision = precision
+    self.materials = {}
+
+  def quantize(self, rgb):
+    if self.palette:
+      return min(self.palette.values(), key=lambda colour: sum((a - b) ** 2 for a, b in zip(colour, rgb)))
+    return tuple(round(value, self.precision) for value in rgb)
+
+  def material(self, rgb):
+    """ Returns (shader, shading group) for rgb, creating them once. """
+    colour = tuple(self.quantize(rgb))
+    entry = self.materials.get(colour)
+    if entry is None or not cmds.objExists(entry[1]):
+      shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name("LegoBuilder", "mat"))
+      cmds.setAttr(shader + ".color", colour[0], colour[1], colour[2], type='double3')
+      group = cmds.sets(renderable=True, noSurfaceShader=True, empty=True, name=shader + "SG")
+      cmds.connectAttr(shader + ".outColor", group + ".surfaceShader", force=True)
+      entry = self.materials[colour] = (shader, group)
+    return entry
+
+  def assign(self, nodes, rgb):
+    """ Puts every node in nodes into the shading group for rgb at once. """
+    shader, group = self.material(rgb)
+    cmds.sets(nodes, edit=True, forceElement=group)
+    return shader
+
+  def purge(self):
+    """ Deletes the pooled materials nothing is assigned to anymore. """
+    for colour, (shader, group) in list(self.materials.items()):
+      if cmds.objExists(group) and cmds.sets(group, query=True):
+        continue
+      cmds.delete([node for node in (shader, group) if cmds.objExists(node)])
+      del self.materials[colour]
+
+material_pool = MaterialPool()
+
+class LivePreview:
+  """ One preview part that follows a generator's sliders while they are
+      dragged. Drag updates closer together than interval seconds are
+      skipped and the last value is applied when the slider is let go.
+      The mesh node is only created once: when the topology is unchanged
+      just the points are moved, otherwise the mesh is rebuilt in place.
+      While the colour is dragged the preview wears a shader of its own
+      that is recoloured in place; the pooled material is only assigned
+      once the slider is let go. """
+
+  def __init__(self, interval):
+    self.interval = interval
+    self.node = None
+    self.generator = None
+    self.part = None
+    self.topology = None
+    self.last_update = 0.0
+    self.shader = None
+    self.shading_group = None
+
+  def attach(self, generator):
+    """ Hooks the preview up to every slider of generator's window and to
+        its colour slider. """
+    for name in generator.Parameters._fields:
+      cmds.intSliderGrp(generator.get_prefix() + Labels[name + "_label"], edit=True,
+                        dragCommand=lambda *args: self.drag(generator),
+                        changeCommand=lambda *args: self.update(generator, commit=True))
+    cmds.colorSliderGrp(generator.get_prefix() + Labels["color_label"], edit=True,
+                        dragCommand=lambda *args: self.drag(generator),
+                        changeCommand=lambda *args: self.update(generator, commit=True))
+
+  def drag(self, generator):
+    if time.time() - self.last_update >= self.interval:
+      self.update(generator)
+
+  def update(self, generator, commit=False):
+    self.last_update = time.time()
+    part = generator.query_part()
+    if self.node is not None and part == self.part and cmds.objExists(self.node):
+      if commit:
+        material_pool.assign(self.node, part.color)
+      return self.node
+    if self.node is not None and generator is self.generator and part.parameters == self.part.parameters and cmds.objExists(self.node):
+      # only the colour moved, the mesh stays as it is.
+      self.paint(part.color, commit)
+      self.part = part
+      return self.node
+    mesh = kernel_part(generator, part.parameters)
+    if self.node is None or generator is not self.generator or not cmds.objExists(self.node):
+      self.clear()
+      self.node = create_mesh(mesh, get_unique_name(generator.get_prefix(), "preview"))[0]
+      self.generator = generator
+    else:
+      # drag updates stay off the undo queue, undo skips the preview.
+      vertices = LegoMeshCommand.vertices(mesh.points)
+      shape = om.MFnMesh(om.MSelectionList().add(self.node).getDagPath(0))
+      if (mesh.counts, mesh.connects) == self.topology:
+        shape.setPoints(vertices)
+      else:
+        shape.createInPlace(vertices, mesh.counts, mesh.connects)
+    if self.part is None or part.color != self.part.color or commit:
+      self.paint(part.color, commit)
+    self.part = part
+    self.topology = (mesh.counts, mesh.connects)
+    return self.node
+
+  def paint(self, rgb, commit):
+    """ Gives the preview the pooled material for rgb on commit, otherwise
+        recolours the preview's own shader, so a drag through many colours
+        leaves no materials behind. """
+    if commit:
+      material_pool.assign(self.node, rgb)
+      return
+    if self.shading_group is None or not cmds.objExists(self.shading_group):
+      self.shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name("LegoBuilder", "previewMat"))
+      self.shading_group = cmds.sets(renderable=True, noSurfaceShader=True, empty=True, name=self.shader + "SG")
+      cmds.connectAttr(self.shader + ".outColor", self.shading_group + ".surfaceShader", force=True)
+    colour = material_pool.quantize(rgb)
+    cmds.setAttr(self.shader + ".color", colour[0], colour[1], colour[2], type='double3')
+    cmds.sets(self.node, edit=True, forceElement=self.shading_group)
+
+  def clear(self):
+    if self.node is not None and cmds.objExists(self.node):
+      cmds.delete(self.node)
+    self.node = self.generator = self.part = self.topology = None
+
+live_preview = LivePreview(Constants["preview_interval"])
+
+
+
+
+class Generator(object):
+  """ This class represents and interface that all LegoBuilder generators
+      are required to adhere to. Every subclass with Parameters is picked
+      up by registered, so defining one gives it a tab in the Picker. """
 
+  # whether copies of a cached part stay hooked up to what feeds it.
+  keep_input_connections = False
+  # how many nodes a compacted part may be: one transform, one shape.
+  node_budget = 2
 
-class Generator:
-  """ This class represents and interface that all LegoBuilder generators
-      are required to adhere to. """
+  @classmethod
+  def placed(cls, transform, parameters):
+    """ Called with every part put in the scene, for the generators that
+        need to keep track of their parts. """
+    pass
 
   @classmethod
   def get_prefix(cls):
     return cls.__name__
 
+  @classmethod
+  def slider_range(cls, parameter):
+    """ The minValue and maxValue of parameter's slider, from Ranges. """
+    for name, low, high in Ranges[cls.__name__]:
+      if name == parameter:
+        return {"minValue" : low, "maxValue" : high}
+    raise KeyError("%s has no %s slider" % (cls.__name__, parameter))
+
+  @classmethod
+  def registered(cls):
+    """ Every generator that builds parts, by name, in the order they are
+        defined. In between classes like ComposedBar have no Parameters
+        and are left out. """
+    generators = collections.OrderedDict()
+    for subclass in cls.__subclasses__():
+      if "Parameters" in vars(subclass):
+        generators[subclass.__name__] = subclass
+      generators.update(subclass.registered())
+    return generators
+
   @classmethod
   def draw_ui(cls, *args):
+    """ Opens the Picker on this generator's tab. """
+    Picker.show(cls)
+
+  @classmethod
+  def draw_panel(cls):
     """ This method is required to be implemented by the superclass, 
-        it should handle drawing and calling the UI and setting up 
-        listeners to call the generate method on the right class. """
-    raise NotImplementedError("Generator did not implement a draw_ui method")
+        it should draw the generator's controls into the current layout
+        and set up listeners to call the generate method on the right
+        class. It is called once, the first time the tab is opened. """
+    raise NotImplementedError("Generator did not implement a draw_panel method")
   
   @classmethod
-  def generate(cls, *args):
-    """ This method should be implemented by the superclass in order to """
-    raise NotImplementedError("Generator did not implement a generate method")
+  def build(cls, *parameters):
+    """ This method should be implemented by the superclass, it builds the
+        part from the values of its parameters and returns [transform]. """
+    raise NotImplementedError("Generator did not implement a build method")
 
-# GENERATORS
+  @classmethod
+  def part(cls, color=(1.0, 1.0, 1.0), **values):
+    """ Describes one part without touching the UI, for example
+        Block.part(width=2, height=1, depth=4, color=(1, 0, 0)). """
+    return Part(cls, cls.Parameters(**values), tuple(color))
 
-class Block(Generator):
-  """ Generates your standard lego block """
   @classmethod
-  def generate(cls, *args):
-    components = []
-    width = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], query=True, value=True)
-    height = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], query=True, value=True)
-    depth = cmds.intSliderGrp(cls.get_prefix() + Labels["depth_label"], query=True, value=True)
+  def query_part(cls):
+    """ Describes the part currently set up in the generator's window. """
+    values = dict((name, cmds.intSliderGrp(cls.get_prefix() + Labels[name + "_label"], query=True, value=True)) for name in cls.Parameters._fields)
     rgb = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], query=True, rgbValue=True)
+    return cls.part(color=rgb, **values)
 
-    block_width = width * Constants["block_width_unit"]
-    block_height = height * Constants["block_height_unit"]
-    block_depth = depth * Constants["block_depth_unit"]
+  @classmethod
+  def generate(cls, *args):
+    live_preview.clear()
+    profile = profiler.begin(cls.__name__)
+    try:
+      return build_part(cls.query_part())
+    finally:
+      profiler.end(profile)
+      if profile is not None:
+        Picker.show_profile()
 
-    #stubs
-    for x in range(0, width):
-      for z in range(0, depth):
-        stub = cmds.polyCylinder(name=get_unique_name(cls.get_prefix(), "Stub"), radius=Constants["stub_radius"], height = Constants["stub_height"])
-        components.append(stub[0])
-        cmds.move(Constants["block_width_unit"] * x + half(Constants["block_width_unit"]), half(Constants["block_height_unit"]) * height + half(Constants["stub_height"]), Constants["block_depth_unit"] * z + half(Constants["block_depth_unit"]), stub[0])
+# GENERATORS
 
-    cube = cmds.polyCube(name=get_unique_name(cls.get_prefix(), "block"), width=block_width, height=block_height, depth=block_depth)
-    components.append(cube[0])
-    cmds.move(half(width * Constants["block_width_unit"]), 0, half(depth * Constants["block_depth_unit"]), cube)
-    if components.count > 1:
-      final = cmds.polyUnite(components, name=get_unique_name(cls.get_prefix(), ""))
-    else:
-      final = components[0]
+class Block(Generator):
+  """ Generates your standard lego block """
+  Parameters = collections.namedtuple("BlockParameters", ("width", "height", "depth"))
 
-    shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name(cls.get_prefix(),"mat"))
-    cmds.setAttr(shader + ".color", rgb[0],rgb[1],rgb[2], type='double3')
-    cmds.select(final[0], r=True)
-    cmds.hyperShade(assign=shader)
+  @classmethod
+  def build(cls, width, height, depth):
+    if instanced_studs:
+      return create_mesh(LegoGeometry.block(width, height, depth, studs=False), get_unique_name(cls.get_prefix(), ""))
+    # body and every stub are computed in one pass and created as one mesh.
+    mesh = kernel_mesh(cls, width, height, depth)
+    return create_mesh(mesh, get_unique_name(cls.get_prefix(), ""))
+
+  @classmethod
+  def placed(cls, transform, parameters):
+    if instanced_studs:
+      stud_instancer.track(transform, LegoGeometry.stud_positions(*parameters))
 
   
   @classmethod
-  def draw_ui(cls, *args):
-    if cmds.window(cls.get_prefix(), exists=True):
-      cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+  def draw_panel(cls):
     cmds.frameLayout(collapsable=True, width=Constants["window_width"], label=Labels["dimensions_label"])
     cmds.columnLayout(width=Constants["window_width"])
     
     cmds.text(Labels["width_label"])
-    width_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], annotation=Labels["width_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"], field=True)
+    width_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], annotation=Labels["width_label"], width=Constants["window_width"], field=True, **cls.slider_range("width"))
     cmds.text(Labels["height_label"])
-    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], annotation=Labels["height_label"], width=Constants["window_width"], minValue=Constants["min_block_height"], maxValue=Constants["max_block_height"], field=True)
+    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], annotation=Labels["height_label"], width=Constants["window_width"], field=True, **cls.slider_range("height"))
     cmds.text(Labels["depth_label"])
-    depth_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["depth_label"], annotation=Labels["depth_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"], field=True)
+    depth_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["depth_label"], annotation=Labels["depth_label"], width=Constants["window_width"], field=True, **cls.slider_range("depth"))
     cmds.text(Labels["color_label"])
     color_slider = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], annotation=Labels["color_label"], width=Constants["window_width"])
 
     cmds.setParent('..')
     cmds.button(command=cls.generate, label="Generate")
     cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    live_preview.attach(cls)
 
 class PerforatedBlock(Generator):
   """ Generates your standard lego block """
+  # "topology" cuts the holes straight into the mesh, "boolean" subtracts
+  # hole cylinders with polyBoolOp.
+  perforation_mode = "topology"
+  Parameters = collections.namedtuple("PerforatedBlockParameters", ("width",))
+
   @classmethod
-  def generate(cls, *args):
+  def build(cls, width):
+    if cls.perforation_mode == "boolean":
+      return cls.generate_boolean(width)
+    if instanced_studs:
+      return create_mesh(LegoGeometry.perforated_block(width, studs=False), get_unique_name(cls.get_prefix(), ""))
+    return create_mesh(kernel_mesh(cls, width), get_unique_name(cls.get_prefix(), ""))
+
+  @classmethod
+  def placed(cls, transform, parameters):
+    # the boolean build always carries its own studs.
+    if instanced_studs and cls.perforation_mode != "boolean":
+      stud_instancer.track(transform, LegoGeometry.stud_positions(parameters[0], 1, 1))
+
+  @classmethod
+  def generate_boolean(cls, width):
     components = []
     boolean = []
-    width = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], query=True, value=True)
-    rgb = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], query=True, rgbValue=True)
-
     block_width = width * Constants["block_width_unit"]
     block_height = Constants["block_height_unit"]
     block_depth = Constants["block_depth_unit"]
 
     for x in range(0, width):
-      stub = cmds.polyCylinder(name=get_unique_name(cls.get_prefix(), "Stub"), radius=Constants["stub_radius"], height = Constants["stub_height"])
+      stub = templates.stamp("stud", get_unique_name(cls.get_prefix(), "Stub"), Constants["stub_radius"], Constants["stub_height"])
       components.append(stub[0])
       cmds.move(Constants["block_width_unit"] * x + half(Constants["block_width_unit"]), half(Constants["block_height_unit"]) + half(Constants["stub_height"]), half(Constants["block_depth_unit"]), stub[0])
       
     for x in range(0, width-1):
-      hole = cmds.polyCylinder(name=get_unique_name(cls.get_prefix(), "Hole"), radius=Constants["perforation_radius"], height=Constants["block_depth_unit"] + 0.2)
+      hole = templates.stamp("hole", get_unique_name(cls.get_prefix(), "Hole"), Constants["perforation_radius"], Constants["block_depth_unit"] + 0.2)
       boolean.append(hole[0])
       cmds.rotate('90deg', 0, 0, hole[0])
       cmds.move(Constants["block_width_unit"] * x + Constants["block_width_unit"], 0, half(Constants["block_depth_unit"]), hole[0])
@@ -176,50 +924,45 @@ class PerforatedBlock(Generator):
     components.append(cube[0])
     cmds.move(half(width * Constants["block_width_unit"]), 0, half(Constants["block_depth_unit"]), cube)
     solid = cmds.polyUnite(components, name=get_unique_name(cls.get_prefix(), ""))
-    boolean_group = cmds.polyUnite(boolean, name=get_unique_name(cls.get_prefix(),"boolean"))
-    final = cmds.polyBoolOp( solid[0], boolean_group[0], op=2, n=get_unique_name(cls.get_prefix(), "") )
-
-    shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name(cls.get_prefix(),"mat"))
-    cmds.setAttr(shader + ".color", rgb[0],rgb[1],rgb[2], type='double3')
-    cmds.select(final[0], r=True)
-    cmds.hyperShade(assign=shader)
-    #cmds.delete(boolean_group)
+    return subtract(cls.get_prefix(), solid[0], boolean)
 
   
   @classmethod
-  def draw_ui(cls, *args):
-    if cmds.window(cls.get_prefix(), exists=True):
-      cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+  def draw_panel(cls):
     cmds.frameLayout(collapsable=True, width=Constants["window_width"], label=Labels["dimensions_label"])
     cmds.columnLayout(width=Constants["window_width"])
     
     cmds.text(Labels["width_label"])
-    width_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], annotation=Labels["width_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"], field=True)
+    width_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], annotation=Labels["width_label"], width=Constants["window_width"], field=True, **cls.slider_range("width"))
     cmds.text(Labels["color_label"])
     color_slider = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], annotation=Labels["color_label"], width=Constants["window_width"])
     cmds.setParent('..')
     cmds.button(command=cls.generate, label="Generate")
     cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    live_preview.attach(cls)
 
 
 class PerforatedBar(Generator):
   """ Generates your standard lego block """
+  perforation_mode = "topology"
+  Parameters = collections.namedtuple("PerforatedBarParameters", ("width",))
+
   @classmethod
-  def generate(cls, *args):
+  def build(cls, width):
+    if cls.perforation_mode == "boolean":
+      return cls.generate_boolean(width)
+    return create_mesh(kernel_mesh(cls, width), get_unique_name(cls.get_prefix(), ""))
+
+  @classmethod
+  def generate_boolean(cls, width):
     components = []
     boolean = []
-    width = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], query=True, value=True)
-    rgb = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], query=True, rgbValue=True)
-
     block_width = width * Constants["block_width_unit"]
     block_height = Constants["block_height_unit"]
     block_depth = Constants["block_depth_unit"]
 
     for x in range(0, width + 1):
-      hole = cmds.polyCylinder(name=get_unique_name(cls.get_prefix(), "Hole"), radius=Constants["perforation_radius"], height=Constants["block_depth_unit"] + 0.2)
+      hole = templates.stamp("hole", get_unique_name(cls.get_prefix(), "Hole"), Constants["perforation_radius"], Constants["block_depth_unit"] + 0.2)
       boolean.append(hole[0])
       cmds.rotate('90deg', 0, 0, hole[0])
       cmds.move(Constants["block_width_unit"] * x , 0, half(Constants["block_depth_unit"]), hole[0])
@@ -230,73 +973,86 @@ class PerforatedBar(Generator):
     cmds.move(half(width * Constants["block_width_unit"]), 0, half(Constants["block_depth_unit"]), cube)
 
     #caps
-    cap_one = cmds.polyCylinder(sc=1, sy=2, radius=half(Constants["block_height_unit"]), height=Constants["block_depth_unit"],name=get_unique_name(cls.get_prefix(), "cap"))
+    cap_one = templates.stamp("cap", get_unique_name(cls.get_prefix(), "cap"), half(Constants["block_height_unit"]), Constants["block_depth_unit"])
     cmds.rotate('90deg',0,0,cap_one[0])
     cmds.move(0,0,half(Constants["block_depth_unit"]),cap_one[0])
-    cmds.delete(cap_one[0] + ".f[0:3]", cap_one[0] + ".f[14:23]", cap_one[0] + ".f[34:43]", cap_one[0] + ".f[54:63]", cap_one[0] + ".f[74:79]")
     components.append(cap_one[0])
 
     #caps
-    cap_two = cmds.polyCylinder(sc=1, sy=2, radius=half(Constants["block_height_unit"]), height=Constants["block_depth_unit"])
+    cap_two = templates.stamp("cap", get_unique_name(cls.get_prefix(), "cap"), half(Constants["block_height_unit"]), Constants["block_depth_unit"])
     cmds.rotate('90deg','180deg',0,cap_two[0])
-    cmds.delete(cap_two[0] + ".f[0:3]", cap_two[0] + ".f[14:23]", cap_two[0] + ".f[34:43]", cap_two[0] + ".f[54:63]", cap_two[0] + ".f[74:79]")
     cmds.move(block_width,0,half(Constants["block_depth_unit"]),cap_two[0])
     components.append(cap_two[0])
 
     solid = cmds.polyUnite(components, name=get_unique_name(cls.get_prefix(), ""))
-    boolean_group = cmds.polyUnite(boolean, name=get_unique_name(cls.get_prefix(),"boolean"))
-    cmds.polyMergeVertex( solid[0], d=0.15 )
     cmds.delete(solid[0],ch=1)
-    final = cmds.polyBoolOp( solid[0], boolean_group[0], op=2, n=get_unique_name(cls.get_prefix(), "") )
-
-    shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name(cls.get_prefix(),"mat"))
-    cmds.setAttr(shader + ".color", rgb[0],rgb[1],rgb[2], type='double3')
-    cmds.select(final[0], r=True)
-    cmds.hyperShade(assign=shader)
+    weld_node(solid[0])
+    return subtract(cls.get_prefix(), solid[0], boolean)
 
   
   @classmethod
-  def draw_ui(cls, *args):
-    if cmds.window(cls.get_prefix(), exists=True):
-      cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+  def draw_panel(cls):
     cmds.frameLayout(collapsable=True, width=Constants["window_width"], label=Labels["dimensions_label"])
     cmds.columnLayout(width=Constants["window_width"])
     
     cmds.text(Labels["width_label"])
-    width_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], annotation=Labels["width_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"], field=True)
+    width_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], annotation=Labels["width_label"], width=Constants["window_width"], field=True, **cls.slider_range("width"))
     cmds.text(Labels["color_label"])
     color_slider = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], annotation=Labels["color_label"], width=Constants["window_width"])
     cmds.setParent('..')
     cmds.button(command=cls.generate, label="Generate")
     cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    live_preview.attach(cls)
 
-class PerforatedBarWithKink(Generator):
-  """ Generates your standard lego block """
-  @classmethod
-  def generate(cls, *args):
-    before_kink = cmds.intSliderGrp(cls.get_prefix() + Labels["before_kink_label"], query=True, value=True)
-    after_kink = cmds.intSliderGrp(cls.get_prefix() + Labels["after_kink_label"], query=True, value=True)
-    rgb = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], query=True, rgbValue=True)
-    before = cls.generate_kink_peice(before_kink)
-    after = cls.generate_kink_peice(after_kink)
-    cmds.rotate(0,0,'143.5deg', after[0])
-    final = cmds.polyUnite(before[0], after[0])
+class ComposedBar(Generator):
+  """ The bars put together from perforated segments. Every distinct
+      segment length is built once and copied into place for the rest. """
+  perforation_mode = "topology"
+  kink_angle = 180
 
-    shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name(cls.get_prefix(),"mat"))
-    cmds.setAttr(shader + ".color", rgb[0],rgb[1],rgb[2], type='double3')
-    cmds.select(final[0], r=True)
-    cmds.hyperShade(assign=shader)
+  @classmethod
+  def build(cls, before_kink, after_kink):
+    if cls.perforation_mode != "boolean":
+      return create_mesh(kernel_mesh(cls, before_kink, after_kink), get_unique_name(cls.get_prefix(), ""))
+    return cls.compose([(before_kink, 180), (after_kink, cls.kink_angle - 180)], start=(before_kink, 0))
 
+  @classmethod
+  def compose(cls, segments, start=(0, 0)):
+    """ Builds a bar from a list of (length, angle) segments, each turned
+        angle degrees from the one before, see LegoGeometry.composed_bar.
+        The kernel mesh is welded like kernel_part welds it. """
+    if cls.perforation_mode != "boolean":
+      mesh = LegoMeshOps.welded(cls.__name__, LegoGeometry.composed_bar(segments, start))
+      return create_mesh(mesh, get_unique_name(cls.get_prefix(), ""))
+
+    masters = {}
+    pieces = []
+    x, y = start[0] * Constants["block_width_unit"], start[1] * Constants["block_width_unit"]
+    heading = 0
+    for length, angle in segments:
+      heading += angle
+      if length not in masters:
+        masters[length] = piece = cls.generate_kink_peice(length)[0]
+      else:
+        piece = cmds.duplicate(masters[length], name=get_unique_name(cls.get_prefix(), "segment"))[0]
+      cmds.rotate(0, 0, '%fdeg' % heading, piece)
+      cmds.move(x, y, 0, piece)
+      pieces.append(piece)
+      x += length * Constants["block_width_unit"] * math.cos(math.radians(heading))
+      y += length * Constants["block_width_unit"] * math.sin(math.radians(heading))
+
+    # one unite for the whole bar, then every piece is welded on its own:
+    # they overlap round the joint holes and are not one solid.
+    bar = cmds.polyUnite(pieces, name=get_unique_name(cls.get_prefix(), ""))
+    cmds.delete(bar[0], ch=1)
+    return weld_node(bar[0], shells=True)
 
   @classmethod
   def generate_kink_peice(cls, block_width):
     components = []
     boolean = []
     for x in range(0, block_width + 1):
-      hole = cmds.polyCylinder(name=get_unique_name(cls.get_prefix(), "Hole"), radius=Constants["perforation_radius"], height=Constants["block_depth_unit"] + 0.2)
+      hole = templates.stamp("hole", get_unique_name(cls.get_prefix(), "Hole"), Constants["perforation_radius"], Constants["block_depth_unit"] + 0.2)
       boolean.append(hole[0])
       cmds.rotate('90deg', 0, 0, hole[0])
       cmds.move(Constants["block_width_unit"] * x , 0, half(Constants["block_depth_unit"]), hole[0])
@@ -307,53 +1063,50 @@ class PerforatedBarWithKink(Generator):
     cmds.move(half(block_width * Constants["block_width_unit"]), 0, half(Constants["block_depth_unit"]), cube)
 
     #caps
-    cap_one = cmds.polyCylinder(sc=1, sy=2, radius=half(Constants["block_height_unit"]), height=Constants["block_depth_unit"],name=get_unique_name(cls.get_prefix(), "cap"))
+    cap_one = templates.stamp("cap", get_unique_name(cls.get_prefix(), "cap"), half(Constants["block_height_unit"]), Constants["block_depth_unit"])
     cmds.rotate('90deg',0,0,cap_one[0])
     cmds.move(0,0,half(Constants["block_depth_unit"]),cap_one[0])
-    cmds.delete(cap_one[0] + ".f[0:3]", cap_one[0] + ".f[14:23]", cap_one[0] + ".f[34:43]", cap_one[0] + ".f[54:63]", cap_one[0] + ".f[74:79]")
     components.append(cap_one[0])
 
     #caps
-    cap_two = cmds.polyCylinder(sc=1, sy=2, radius=half(Constants["block_height_unit"]), height=Constants["block_depth_unit"])
+    cap_two = templates.stamp("cap", get_unique_name(cls.get_prefix(), "cap"), half(Constants["block_height_unit"]), Constants["block_depth_unit"])
     cmds.rotate('90deg','180deg',0,cap_two[0])
-    cmds.delete(cap_two[0] + ".f[0:3]", cap_two[0] + ".f[14:23]", cap_two[0] + ".f[34:43]", cap_two[0] + ".f[54:63]", cap_two[0] + ".f[74:79]")
     cmds.move(block_width,0,half(Constants["block_depth_unit"]),cap_two[0])
     components.append(cap_two[0])
 
     solid = cmds.polyUnite(components, name=get_unique_name(cls.get_prefix(), ""))
-    boolean_group = cmds.polyUnite(boolean, name=get_unique_name(cls.get_prefix(),"boolean"))
-    cmds.polyMergeVertex( solid[0], d=0.15 )
     cmds.delete(solid[0],ch=1)
-    return cmds.polyBoolOp( solid[0], boolean_group[0], op=2, n=get_unique_name(cls.get_prefix(), "") )
+    weld_node(solid[0])
+    return subtract(cls.get_prefix(), solid[0], boolean)
+
+class PerforatedBarWithKink(ComposedBar):
+  """ Generates your standard lego block """
+  kink_angle = Constants["kink_angle"]
+  Parameters = collections.namedtuple("PerforatedBarWithKinkParameters", ("before_kink", "after_kink"))
 
-  
   @classmethod
-  def draw_ui(cls, *args):
-    if cmds.window(cls.get_prefix(), exists=True):
-      cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+  def draw_panel(cls):
     cmds.frameLayout(collapsable=True, width=Constants["window_width"], label=Labels["dimensions_label"])
     cmds.columnLayout(width=Constants["window_width"])
     
     cmds.text(Labels["before_kink_label"])
-    before_kink_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["before_kink_label"], annotation=Labels["before_kink_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"], field=True)
+    before_kink_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["before_kink_label"], annotation=Labels["before_kink_label"], width=Constants["window_width"], field=True, **cls.slider_range("before_kink"))
     cmds.text(Labels["after_kink_label"])
-    after_kink_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["after_kink_label"], annotation=Labels["after_kink_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"], field=True)
+    after_kink_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["after_kink_label"], annotation=Labels["after_kink_label"], width=Constants["window_width"], field=True, **cls.slider_range("after_kink"))
     cmds.text(Labels["color_label"])
     color_slider = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], annotation=Labels["color_label"], width=Constants["window_width"])
     cmds.setParent('..')
     cmds.button(command=cls.generate, label="Generate")
     cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    live_preview.attach(cls)
 
 class Axle(Generator):
   """ Generates your standard lego block """
+  Parameters = collections.namedtuple("AxleParameters", ("width",))
+
   @classmethod
-  def generate(cls, *args):
+  def build(cls, width):
     components = []
-    width = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], query=True, value=True)
-    rgb = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], query=True, rgbValue=True)
     block_width = width * Constants["block_width_unit"]
     block_height = twice(Constants["perforation_radius"])
     block_depth = twice(Constants["perforation_radius"])
@@ -365,78 +1118,49 @@ class Axle(Generator):
     cube_two = cmds.polyCube(name=get_unique_name(cls.get_prefix(), "block"), width=block_width, height=block_height, depth=half(block_depth))
     components.append(cube_two[0])
     cmds.move(half(width * Constants["block_width_unit"]), 0, half(Constants["block_depth_unit"]), cube_two[0])
-    final = cmds.polyUnite(components, name=get_unique_name(cls.get_prefix(), ""))
-
-    shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name(cls.get_prefix(),"mat"))
-    cmds.setAttr(shader + ".color", rgb[0],rgb[1],rgb[2], type='double3')
-    cmds.select(final[0], r=True)
-    cmds.hyperShade(assign=shader)
+    return cmds.polyUnite(components, name=get_unique_name(cls.get_prefix(), ""))
 
 
   
   @classmethod
-  def draw_ui(cls, *args):
-    if cmds.window(cls.get_prefix(), exists=True):
-      cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+  def draw_panel(cls):
     cmds.frameLayout(collapsable=True, width=Constants["window_width"], label=Labels["dimensions_label"])
     cmds.columnLayout(width=Constants["window_width"])
     
     cmds.text(Labels["width_label"])
-    width_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], annotation=Labels["width_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"], field=True)
+    width_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["width_label"], annotation=Labels["width_label"], width=Constants["window_width"], field=True, **cls.slider_range("width"))
     cmds.text(Labels["color_label"])
     color_slider = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], annotation=Labels["color_label"], width=Constants["window_width"])
     cmds.setParent('..')
     cmds.button(command=cls.generate, label="Generate")
     cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    live_preview.attach(cls)
 
 class Wheel(Generator):
   """ Generates your standard lego block """
-  @classmethod
-  def generate(cls, *args):
-    components = []
-    width = cmds.intSliderGrp(cls.get_prefix() + Labels["radius_label"], query=True, value=True)
-    height = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], query=True, value=True)
-    subdivs = cmds.intSliderGrp(cls.get_prefix() + Labels["subdivs_label"], query=True, value=True)
-    rgb = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], query=True, rgbValue=True)
-    wheel_radius = width * Constants["wheel_radius_unit"]
-    wheel_height = height * Constants["wheel_height_unit"]
-    
-    wheel_component = cmds.polyCylinder(name=get_unique_name(cls.get_prefix(), "cylender"), sx=subdivs, h=wheel_height, r=wheel_radius)
-    wheel_extrusion_faces = []
-    cmds.select(r=True)
-
-    for i in range(0, subdivs):
-      if i % 2 == 1:
-        facet_title = wheel_component[0] + ".f[" + str(i) + "]"
-        wheel_extrusion_faces.append(facet_title)
+  Parameters = collections.namedtuple("WheelParameters", ("radius", "height", "subdivs"))
+  # copies keep the lodGroup's camera connection.
+  keep_input_connections = True
+  node_budget = 1 + 2 * len(Constants["wheel_lod_levels"])
 
-    cmds.polyExtrudeFacet(wheel_extrusion_faces, ltz=Constants["wheel_ridge_depth"])
-    shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name(cls.get_prefix(),"mat"))
-    cmds.setAttr(shader + ".color", rgb[0],rgb[1],rgb[2], type='double3')
-    cmds.select(wheel_component[0], r=True)
-    cmds.hyperShade(assign=shader)
+  @classmethod
+  def build(cls, radius, height, subdivs):
+    # every level of detail comes out of the kernel with its ridges on.
+    return create_lod_group(LegoGeometry.wheel_lods(radius, height, subdivs), get_unique_name(cls.get_prefix(), ""))
 
-  
   @classmethod
-  def draw_ui(cls, *args):
-    if cmds.window(cls.get_prefix(), exists=True):
-      cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+  def draw_panel(cls):
     cmds.frameLayout(collapsable=True, width=Constants["window_width"], label=Labels["dimensions_label"])
     cmds.columnLayout(width=Constants["window_width"])
     
     cmds.text(Labels["radius_label"])
-    radius_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["radius_label"], annotation=Labels["radius_label"], width=Constants["window_width"], minValue=Constants["wheel_min_radius"], maxValue=Constants["max_block_width"], field=True)
+    radius_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["radius_label"], annotation=Labels["radius_label"], width=Constants["window_width"], field=True, **cls.slider_range("radius"))
 
     cmds.text(Labels["height_label"])
-    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], annotation=Labels["radius_label"], width=Constants["window_width"], minValue=1, maxValue=Constants["max_block_width"], field=True)
+    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], annotation=Labels["radius_label"], width=Constants["window_width"], field=True, **cls.slider_range("height"))
 
     cmds.text(Labels["subdivs_label"])
-    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["subdivs_label"], annotation=Labels["subdivs_label"], width=Constants["window_width"], minValue=Constants["wheel_min_subdivs"], maxValue=Constants["wheel_max_subdivs"], field=True)
+    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["subdivs_label"], annotation=Labels["subdivs_label"], width=Constants["window_width"], field=True, **cls.slider_range("subdivs"))
 
     cmds.text(Labels["color_label"])
     color_slider = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], annotation=Labels["color_label"], width=Constants["window_width"])
@@ -444,55 +1168,33 @@ class Wheel(Generator):
     cmds.setParent('..')
     cmds.button(command=cls.generate, label="Generate")
     cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    live_preview.attach(cls)
 
 class BigWheel(Generator):
   """ Generates your standard lego block """
+  Parameters = collections.namedtuple("BigWheelParameters", ("radius", "height", "subdivs"))
+  keep_input_connections = True
+  node_budget = 1 + 2 * len(Constants["wheel_lod_levels"])
+
   @classmethod
-  def generate(cls, *args):
-    components = []
-    radius = cmds.intSliderGrp(cls.get_prefix() + Labels["radius_label"], query=True, value=True)
-    height = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], query=True, value=True)
-    subdivs = cmds.intSliderGrp(cls.get_prefix() + Labels["subdivs_label"], query=True, value=True)
-    rgb = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], query=True, rgbValue=True)
-    wheel_radius = radius * Constants["wheel_radius_unit"]
-    wheel_height = height * Constants["wheel_height_unit"]
-    
-    wheel_component = cmds.polyPipe(name=get_unique_name(cls.get_prefix(), "cylender"), sh=4, sc=subdivs, h=wheel_height, r=wheel_radius)
-    wheel_extrusion_faces = []
-    cmds.select(r=True)
-
-    for i in range(0, subdivs):
-      if i % 2 == 1:
-        facet_title = wheel_component[0] + ".f[" + str(i) + "]"
-        wheel_extrusion_faces.append(facet_title)
-
-    #cmds.polyExtrudeFacet(wheel_extrusion_faces, ltz=Constants["wheel_ridge_depth"])
-    cmds.delete(ch=1)
-    cmds.lattice(wheel_component[0],divisions=[2,3,2], name=get_unique_name(cls.get_prefix(),"lattice"), cp=wheel_component[0])
-    shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name(cls.get_prefix(),"mat"))
-    cmds.setAttr(shader + ".color", rgb[0],rgb[1],rgb[2], type='double3')
-    cmds.select(wheel_component[0], r=True)
-    cmds.hyperShade(assign=shader)
+  def build(cls, radius, height, subdivs):
+    # the pipe used to carry a lattice that never deformed it, so the
+    # kernel mesh is all there is and no deformer history is left behind.
+    return create_lod_group(LegoGeometry.big_wheel_lods(radius, height, subdivs), get_unique_name(cls.get_prefix(), ""))
 
-  
   @classmethod
-  def draw_ui(cls, *args):
-    if cmds.window(cls.get_prefix(), exists=True):
-      cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+  def draw_panel(cls):
     cmds.frameLayout(collapsable=True, width=Constants["window_width"], label=Labels["dimensions_label"])
     cmds.columnLayout(width=Constants["window_width"])
     
     cmds.text(Labels["radius_label"])
-    radius_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["radius_label"], annotation=Labels["radius_label"], width=Constants["window_width"], minValue=Constants["wheel_min_radius"], maxValue=Constants["max_block_width"], field=True)
+    radius_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["radius_label"], annotation=Labels["radius_label"], width=Constants["window_width"], field=True, **cls.slider_range("radius"))
 
     cmds.text(Labels["height_label"])
-    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], annotation=Labels["radius_label"], width=Constants["window_width"], minValue=1, maxValue=Constants["max_block_width"], field=True)
+    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["height_label"], annotation=Labels["radius_label"], width=Constants["window_width"], field=True, **cls.slider_range("height"))
 
     cmds.text(Labels["subdivs_label"])
-    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["subdivs_label"], annotation=Labels["subdivs_label"], width=Constants["window_width"], minValue=Constants["wheel_min_subdivs"], maxValue=Constants["wheel_max_subdivs"], field=True)
+    height_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["subdivs_label"], annotation=Labels["subdivs_label"], width=Constants["window_width"], field=True, **cls.slider_range("subdivs"))
 
     cmds.text(Labels["color_label"])
     color_slider = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], annotation=Labels["color_label"], width=Constants["window_width"])
@@ -500,102 +1202,357 @@ class BigWheel(Generator):
     cmds.setParent('..')
     cmds.button(command=cls.generate, label="Generate")
     cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    live_preview.attach(cls)
 
-class PerforatedBarWithRightAngle(Generator):
+class PerforatedBarWithRightAngle(ComposedBar):
   """ Generates your standard lego block """
-  @classmethod
-  def generate(cls, *args):
-    
-    before_kink = cmds.intSliderGrp(cls.get_prefix() + Labels["before_kink_label"], query=True, value=True)
-    after_kink = cmds.intSliderGrp(cls.get_prefix() + Labels["after_kink_label"], query=True, value=True)
-    rgb = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], query=True, rgbValue=True)
-    before = cls.generate_kink_peice(before_kink)
-    after = cls.generate_kink_peice(after_kink)
-    cmds.rotate(0,0,'90deg', after[0])
-    final = cmds.polyUnite(before[0], after[0])
-    shader = cmds.shadingNode('blinn', asShader=True, name=get_unique_name(cls.get_prefix(),"mat"))
-    cmds.setAttr(shader + ".color", rgb[0],rgb[1],rgb[2], type='double3')
-    cmds.select(final[0], r=True)
-    cmds.hyperShade(assign=shader)
-
-
-  @classmethod
-  def generate_kink_peice(cls, block_width):
-    components = []
-    boolean = []
-    for x in range(0, block_width + 1):
-      hole = cmds.polyCylinder(name=get_unique_name(cls.get_prefix(), "Hole"), radius=Constants["perforation_radius"], height=Constants["block_depth_unit"] + 0.2)
-      boolean.append(hole[0])
-      cmds.rotate('90deg', 0, 0, hole[0])
-      cmds.move(Constants["block_width_unit"] * x , 0, half(Constants["block_depth_unit"]), hole[0])
-
-    cube = cmds.polyCube(sx=5,sy=2,sz=2,name=get_unique_name(cls.get_prefix(), "block"), width=block_width, height=Constants["block_height_unit"], depth=Constants["block_depth_unit"])
-    components.append(cube[0])
-    cmds.delete(cube[0] + ".f[40:47]")
-    cmds.move(half(block_width * Constants["block_width_unit"]), 0, half(Constants["block_depth_unit"]), cube)
-
-    #caps
-    cap_one = cmds.polyCylinder(sc=1, sy=2, radius=half(Constants["block_height_unit"]), height=Constants["block_depth_unit"],name=get_unique_name(cls.get_prefix(), "cap"))
-    cmds.rotate('90deg',0,0,cap_one[0])
-    cmds.move(0,0,half(Constants["block_depth_unit"]),cap_one[0])
-    cmds.delete(cap_one[0] + ".f[0:3]", cap_one[0] + ".f[14:23]", cap_one[0] + ".f[34:43]", cap_one[0] + ".f[54:63]", cap_one[0] + ".f[74:79]")
-    components.append(cap_one[0])
-
-    #caps
-    cap_two = cmds.polyCylinder(sc=1, sy=2, radius=half(Constants["block_height_unit"]), height=Constants["block_depth_unit"])
-    cmds.rotate('90deg','180deg',0,cap_two[0])
-    cmds.delete(cap_two[0] + ".f[0:3]", cap_two[0] + ".f[14:23]", cap_two[0] + ".f[34:43]", cap_two[0] + ".f[54:63]", cap_two[0] + ".f[74:79]")
-    cmds.move(block_width,0,half(Constants["block_depth_unit"]),cap_two[0])
-    components.append(cap_two[0])
-
-    solid = cmds.polyUnite(components, name=get_unique_name(cls.get_prefix(), ""))
-    boolean_group = cmds.polyUnite(boolean, name=get_unique_name(cls.get_prefix(),"boolean"))
-    cmds.polyMergeVertex( solid[0], d=0.15 )
-    cmds.delete(solid[0],ch=1)
-    return cmds.polyBoolOp( solid[0], boolean_group[0], op=2, n=get_unique_name(cls.get_prefix(), "") )
+  kink_angle = Constants["right_kink_angle"]
+  Parameters = collections.namedtuple("PerforatedBarWithRightAngleParameters", ("before_kink", "after_kink"))
 
-  
   @classmethod
-  def draw_ui(cls, *args):
-    if cmds.window(cls.get_prefix(), exists=True):
-      cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+  def draw_panel(cls):
     cmds.frameLayout(collapsable=True, width=Constants["window_width"], label=Labels["dimensions_label"])
     cmds.columnLayout(width=Constants["window_width"])
     
     cmds.text(Labels["before_kink_label"])
-    before_kink_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["before_kink_label"], annotation=Labels["before_kink_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"],field=True)
+    before_kink_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["before_kink_label"], annotation=Labels["before_kink_label"], width=Constants["window_width"], field=True, **cls.slider_range("before_kink"))
     cmds.text(Labels["after_kink_label"])
-    after_kink_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["after_kink_label"], annotation=Labels["after_kink_label"], width=Constants["window_width"], minValue=Constants["min_block_width"], maxValue=Constants["max_block_width"],field=True)
+    after_kink_slider = cmds.intSliderGrp(cls.get_prefix() + Labels["after_kink_label"], annotation=Labels["after_kink_label"], width=Constants["window_width"], field=True, **cls.slider_range("after_kink"))
     cmds.text(Labels["color_label"])
     color_slider = cmds.colorSliderGrp(cls.get_prefix() + Labels["color_label"], annotation=Labels["color_label"], width=Constants["window_width"])
     cmds.setParent('..')
     cmds.button(command=cls.generate, label="Generate")
     cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    live_preview.attach(cls)
+
+class Picker(object):
+  """ The LegoBuilder window, one tab per registered generator. A tab's
+      panel is drawn the first time it is opened and kept from then on,
+      and closing the window only hides it, so opening it again or going
+      back to a tab draws nothing. The window is drawn again only when
+      generators have been added since or profiling was switched on or
+      off, which adds or removes its Profile frame. """
+  # the generator names with a tab, and those whose panel is drawn.
+  tabs = []
+  panels = set()
+  # whether the window was drawn with the Profile frame.
+  profiled = False
 
-class Picker(Generator):
   @classmethod
-  def draw_ui(cls):
-    if cmds.window(cls.get_prefix(), exists=True):
+  def get_prefix(cls):
+    return cls.__name__
+
+  @classmethod
+  def panel_name(cls, name):
+    return cls.get_prefix() + name + "Panel"
+
+  @classmethod
+  def draw_ui(cls, *args):
+    generators = Generator.registered()
+    selected = None
+    if cmds.window(cls.get_prefix(), exists=True) and (list(generators) != cls.tabs or profiler.enabled != cls.profiled):
+      if cls.tabs:
+        selected = cls.tabs[cmds.tabLayout(cls.get_prefix() + "Tabs", query=True, selectTabIndex=True) - 1]
       cmds.deleteUI(cls.get_prefix())
-    cmds.window(cls.get_prefix())
-    cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
-    cmds.frameLayout(collapsable=True, width=Constants["window_width"], label="LEGGGOOO")
-    cmds.columnLayout(width=Constants["window_width"])
-    cmds.button(command=Block.draw_ui, label="Block")
-    cmds.button(command=PerforatedBlock.draw_ui, label="Perforated Block")
-    cmds.button(command=PerforatedBar.draw_ui, label="Perforated Bar")
-    cmds.button(command=PerforatedBarWithKink.draw_ui, label="Perforated Bar With Kink")
-    cmds.button(command=PerforatedBarWithRightAngle.draw_ui, label="Perforated Bar With Kink")
-    cmds.button(command=Wheel.draw_ui, label="Wheel")
-    cmds.setParent('..')
-    cmds.setParent('..')
-    cmds.showWindow(cls.__name__)
+    if not cmds.window(cls.get_prefix(), exists=True):
+      cls.tabs = list(generators)
+      cls.panels = set()
+      cls.profiled = profiler.enabled
+      cmds.window(cls.get_prefix(), retain=True)
+      cmds.columnLayout(adjustableColumn=True, width=Constants["window_width"], height=Constants["window_height"])
+      cmds.tabLayout(cls.get_prefix() + "Tabs", selectCommand=lambda *args: cls.tab_selected())
+      for name in cls.tabs:
+        # an empty layout per tab until the tab is first opened.
+        cmds.columnLayout(cls.panel_name(name), adjustableColumn=True, width=Constants["window_width"])
+        cmds.setParent('..')
+      labels = [(cls.panel_name(name), re.sub(r"(?<=[a-z])(?=[A-Z])", " ", name)) for name in cls.tabs]
+      cmds.tabLayout(cls.get_prefix() + "Tabs", edit=True, tabLabel=labels)
+      cmds.setParent('..')
+      if profiler.enabled:
+        cmds.frameLayout(collapsable=True, width=Constants["window_width"], label="Profile")
+        cmds.scrollField(cls.get_prefix() + "Profile", editable=False, wordWrap=False, height=Constants["window_height"] / 2)
+        cmds.setParent('..')
+        cls.show_profile()
+      if selected in generators:
+        # drawn again, so back to the tab that was open.
+        cls.draw_panel(generators[selected])
+        cmds.tabLayout(cls.get_prefix() + "Tabs", edit=True, selectTabIndex=cls.tabs.index(selected) + 1)
+      elif cls.tabs:
+        cls.draw_panel(generators[cls.tabs[0]])
+    cmds.showWindow(cls.get_prefix())
 
-Picker.draw_ui()
+  @classmethod
+  def refresh(cls):
+    """ Draws the window again if it is open and out of date. """
+    if maya_cmds.window(cls.get_prefix(), exists=True) and maya_cmds.window(cls.get_prefix(), query=True, visible=True):
+      cls.draw_ui()
+
+  @classmethod
+  def draw_panel(cls, generator):
+    """ Draws generator's panel into its tab, unless it already is. """
+    if generator.__name__ in cls.panels:
+      return
+    cmds.setParent(cls.panel_name(generator.__name__))
+    generator.draw_panel()
+    cls.panels.add(generator.__name__)
+
+  @classmethod
+  def tab_selected(cls):
+    index = cmds.tabLayout(cls.get_prefix() + "Tabs", query=True, selectTabIndex=True)
+    cls.draw_panel(Generator.registered()[cls.tabs[index - 1]])
+
+  @classmethod
+  def show(cls, generator):
+    """ Shows the window on generator's tab. """
+    cls.draw_ui()
+    cls.draw_panel(generator)
+    cmds.tabLayout(cls.get_prefix() + "Tabs", edit=True, selectTabIndex=cls.tabs.index(generator.__name__) + 1)
+
+  @classmethod
+  def show_profile(cls):
+    """ Refreshes the profile summary if the window is showing it. """
+    if maya_cmds.scrollField(cls.get_prefix() + "Profile", exists=True):
+      maya_cmds.scrollField(cls.get_prefix() + "Profile", edit=True, text="\n".join(profiler_summary.lines()))
+
+# BATCH
+
+Part = collections.namedtuple("Part", ("generator", "parameters", "color"))
+
+def build_part(part):
+  """ Builds one Part and returns the name of its transform. """
+  profile = profiler.begin(part.generator.__name__)
+  try:
+    if profiler.current is not None:
+      profiler.current.parameters = dict(zip(part.parameters._fields, part.parameters))
+    final = part_cache.fetch(part.generator, part.parameters)
+    material_pool.assign(final[0], part.color)
+    register_part(final[0], part)
+    return final[0]
+  finally:
+    profiler.end(profile)
+
+def build_parts(parts):
+  """ Builds every Part in parts as a single undo step with the viewport
+      refresh suspended, returns the transform names in the same order. """
+  names = []
+  by_color = collections.OrderedDict()
+  cmds.undoInfo(openChunk=True, chunkName="LegoBuilder")
+  cmds.refresh(suspend=True)
+  try:
+    for part in parts:
+      profile = profiler.begin(part.generator.__name__)
+      try:
+        if profile is not None:
+          profile.parameters = dict(zip(part.parameters._fields, part.parameters))
+        final = part_cache.fetch(part.generator, part.parameters)
+      finally:
+        profiler.end(profile)
+      names.append(final[0])
+      register_part(final[0], part)
+      by_color.setdefault(tuple(part.color), []).append(final[0])
+    for color, nodes in by_color.items():
+      material_pool.assign(nodes, color)
+  finally:
+    cmds.refresh(suspend=False)
+    cmds.undoInfo(closeChunk=True)
+  return names
+
+def read_manifest(path):
+  """ Reads a list of Parts from a .json or .csv manifest. Every entry
+      names its generator, gives its parameters by name and optionally a
+      color ("r g b" in csv) and a count, e.g.
+        {"generator": "Block", "width": 2, "height": 1, "depth": 4, "count": 12} """
+  with open(path) as manifest:
+    if path.lower().endswith(".csv"):
+      entries = [dict((key, value) for key, value in row.items() if value not in (None, "")) for row in csv.DictReader(manifest)]
+    else:
+      entries = json.load(manifest)
+
+  generators = Generator.registered()
+  parts = []
+  for entry in entries:
+    entry = dict(entry)
+    generator = generators[entry.pop("generator")]
+    count = int(entry.pop("count", 1))
+    color = entry.pop("color", (1.0, 1.0, 1.0))
+    if not isinstance(color, (list, tuple)):
+      color = [float(value) for value in color.split()]
+    values = dict((name, int(value)) for name, value in entry.items())
+    parts.extend([generator.part(color=color, **values)] * count)
+  return parts
+
+def build_manifest(path):
+  """ Builds every part listed in a manifest, see read_manifest. """
+  return build_parts(read_manifest(path))
+
+# PART REGISTRY
+
+# the fileInfo entry the registry is saved in.
+registry_key = "LegoBuilderParts"
+part_registry = LegoRegistry.PartRegistry()
+
+def register_part(name, part):
+  part_registry.add(name, part.generator.__name__, part.parameters._fields, part.parameters,
+                    material_pool.quantize(part.color))
+
+def find_parts(generator=None, color=None, **dimensions):
+  """ The parts in the scene built by generator, in color (an rgb or a
+      Palette name) with the given parameters, from the registry, e.g.
+      find_parts("Block", "red", width=2, depth=4). Parts deleted since
+      they were built are dropped from the registry as they are met. """
+  if color is not None:
+    color = tuple(material_pool.quantize(Palette[color] if isinstance(color, str) else color))
+  names = []
+  for name in part_registry.query(generator, color, **dimensions):
+    if cmds.objExists(name):
+      names.append(name)
+    else:
+      part_registry.remove(name)
+  return names
+
+def select_parts(generator=None, color=None, **dimensions):
+  """ Selects the parts find_parts finds and returns them. """
+  names = find_parts(generator, color, **dimensions)
+  cmds.select(names, replace=True)
+  return names
+
+def export_bill_of_materials(path):
+  """ Writes how many of every part the scene holds to a .csv or .json
+      manifest, which build_manifest can build again. """
+  part_registry.prune(cmds.objExists)
+  return part_registry.write_bill_of_materials(path)
+
+def save_registry(*args):
+  part_registry.prune(cmds.objExists)
+  cmds.fileInfo(registry_key, part_registry.dumps())
+
+def load_registry(*args):
+  saved = cmds.fileInfo(registry_key, query=True)
+  part_registry.loads(saved[0] if saved else None)
+
+def clear_registry(*args):
+  part_registry.clear()
+
+# the registry rides along with the scene file.
+registry_callbacks = [
+  om.MSceneMessage.addCallback(om.MSceneMessage.kBeforeSave, save_registry),
+  om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, load_registry),
+  om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, clear_registry)
+]
+
+def build_assembly(grid):
+  """ Builds a voxel build, a dict of (x, y, z) -> rgb, as one merged and
+      culled mesh per colour (see LegoAssembly). Returns the transforms. """
+  names = []
+  cmds.undoInfo(openChunk=True, chunkName="LegoBuilder")
+  cmds.refresh(suspend=True)
+  try:
+    for color, mesh in LegoAssembly.assembly_meshes(grid).items():
+      final = create_mesh(mesh, get_unique_name("LegoBuilder", "assembly"))
+      material_pool.assign(final[0], color)
+      names.append(final[0])
+  finally:
+    cmds.refresh(suspend=False)
+    cmds.undoInfo(closeChunk=True)
+  return names
+
+class BuildScheduler:
+  """ Builds a list of Parts a chunk at a time from idle callbacks, so
+      Maya stays responsive and a long batch can be cancelled. The chunk
+      size adapts to keep each slice near frame_time seconds. Every node
+      created while a slice runs is tracked, and cancelling deletes them
+      again; nodes made between slices are not the scheduler's and stay.
+      done is called with the transform names at the end. """
+
+  def __init__(self, parts, frame_time=None, done=None):
+    self.parts = list(parts)
+    self.frame_time = frame_time or Constants["scheduler_frame_time"]
+    self.done = done
+    self.chunk = 1
+    self.position = 0
+    self.names = []
+    self.tracker = NodeTracker()
+    self.state = "waiting"
+    self.interactive = not cmds.about(batch=True)
+
+  def start(self):
+    self.state = "running"
+    if self.interactive:
+      cmds.progressWindow(title="LegoBuilder", progress=0, maxValue=len(self.parts), status="Building parts", isInterruptable=True)
+    cmds.evalDeferred(self.step, lowestPriority=True)
+    return self
+
+  def step(self):
+    if self.state != "running":
+      return
+    if self.interactive and cmds.progressWindow(query=True, isCancelled=True):
+      return self.cancel()
+    # a slice that raises must not leave the progressWindow up and the
+    # scheduler running; the queued step sees the state and does nothing.
+    try:
+      self.build_slice()
+    except Exception:
+      self.finish("failed")
+      raise
+
+  def build_slice(self):
+    start = time.time()
+    chunk = self.parts[self.position:self.position + self.chunk]
+    by_color = collections.OrderedDict()
+    self.tracker.start()
+    try:
+      for part in chunk:
+        final = part_cache.fetch(part.generator, part.parameters)
+        self.names.append(final[0])
+        register_part(final[0], part)
+        by_color.setdefault(tuple(part.color), []).append(final[0])
+      for color, nodes in by_color.items():
+        material_pool.assign(nodes, color)
+    finally:
+      self.tracker.stop()
+    self.position += len(chunk)
+    elapsed = time.time() - start
+
+    # aim the next slice at frame_time, but never more than double it.
+    if elapsed > 0:
+      self.chunk = max(1, min(2 * self.chunk, int(self.chunk * self.frame_time / elapsed)))
+    else:
+      self.chunk *= 2
+
+    if self.interactive:
+      cmds.progressWindow(edit=True, progress=self.position, status="Built %d of %d parts" % (self.position, len(self.parts)))
+    if self.position < len(self.parts):
+      cmds.evalDeferred(self.step, lowestPriority=True)
+    else:
+      self.finish("done")
+      if self.done is not None:
+        self.done(self.names)
+
+  def cancel(self):
+    """ Stops building and deletes everything built so far. """
+    if self.state != "running":
+      return
+    self.finish("cancelled")
+    self.tracker.delete()
+    for name in self.names:
+      part_registry.remove(name)
+    self.names = []
+
+  def finish(self, state):
+    self.state = state
+    if self.interactive:
+      cmds.progressWindow(endProgress=True)
+
+def schedule_parts(parts, done=None):
+  """ Starts building parts in the background, see BuildScheduler. """
+  return BuildScheduler(parts, done=done).start()
+
+def schedule_manifest(path, done=None):
+  return schedule_parts(read_manifest(path), done)
+
+# mayapy has no UI to draw into.
+if not cmds.about(batch=True):
+  Picker.draw_ui()
 
 
 
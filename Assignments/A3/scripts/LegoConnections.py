@@ -0,0 +1,326 @@
+""" LegoConnections - where placed parts are and what they can snap to.
+
+    Every placed part is kept as a PlacedPart: its generator, parameters
+    and translation plus a Shape shared by all parts of that generator
+    and parameters, holding the body bounds, the stud centres on top and
+    the socket centres underneath (where the centre of a stud pushed up
+    into it sits), all worked out from the Constants units. Parts are
+    hashed into a grid of connection_cell_size cells, so finding the
+    parts near a point only looks at a handful of cells however many
+    parts there are. Parts are only translated, never rotated. Nothing
+    in here imports maya.
+
+      python LegoConnections.py --parts 100000 """
+
+import argparse
+import collections
+import math
+import random
+import time
+
+import LegoGeometry
+from LegoConstants import Constants
+
+
+Shape = collections.namedtuple("Shape", ("low", "high", "studs", "sockets"))
+
+# how far apart two points may be and still count as the same place.
+tolerance = 1e-6
+
+
+def half(num):
+  return num/2.00
+
+
+def bounds(mesh):
+  points = mesh.points
+  return (tuple(min(points[axis::3]) for axis in range(0, 3)),
+          tuple(max(points[axis::3]) for axis in range(0, 3)))
+
+
+def block_body(width, height, depth):
+  return LegoGeometry.block(width, height, depth, studs=False), LegoGeometry.stud_positions(width, height, depth)
+
+
+def perforated_block_body(width):
+  return LegoGeometry.perforated_block(width, studs=False), LegoGeometry.stud_positions(width, 1, 1)
+
+
+# the generators with studs, as their body without studs and the studs.
+Studded = {
+  "Block" : block_body,
+  "PerforatedBlock" : perforated_block_body
+}
+
+shapes = {}
+
+def shape(name, parameters):
+  """ The Shape of a part, worked out once per generator and parameters. """
+  key = (name,) + tuple(parameters)
+  if key not in shapes:
+    if name in Studded:
+      body, studs = Studded[name](*parameters)
+    else:
+      body, studs = LegoGeometry.Parts[name](*parameters), []
+    low, high = bounds(body)
+    # a socket takes the stud of the part below, whose top is our bottom.
+    drop = high[1] - low[1]
+    sockets = [(x, y - drop, z) for x, y, z in studs]
+    shapes[key] = Shape(low, high, tuple(studs), tuple(sockets))
+  return shapes[key]
+
+
+class PlacedPart(object):
+  __slots__ = ("id", "name", "parameters", "shape", "position", "cells")
+
+  def __init__(self, id, name, parameters, position):
+    self.id = id
+    self.name = name
+    self.parameters = tuple(parameters)
+    self.shape = shape(name, parameters)
+    self.position = tuple(position)
+    self.cells = ()
+
+  def box(self, position=None):
+    x, y, z = position or self.position
+    low, high = self.shape.low, self.shape.high
+    return (low[0] + x, low[1] + y, low[2] + z), (high[0] + x, high[1] + y, high[2] + z)
+
+  def studs(self):
+    x, y, z = self.position
+    return [(sx + x, sy + y, sz + z) for sx, sy, sz in self.shape.studs]
+
+
+def boxes_overlap(a, b):
+  """ Whether two (low, high) boxes share some volume. Touching faces do
+      not count, so stacked bricks do not overlap. """
+  return all(a[0][axis] < b[1][axis] - tolerance and b[0][axis] < a[1][axis] - tolerance for axis in range(0, 3))
+
+
+def box_contains(box, point):
+  return all(box[0][axis] + tolerance < point[axis] < box[1][axis] - tolerance for axis in range(0, 3))
+
+
+def distance(a, b):
+  return math.sqrt(sum((a[axis] - b[axis]) ** 2 for axis in range(0, 3)))
+
+
+class ConnectionIndex:
+  """ The placed parts, by id and hashed by grid cell. """
+
+  def __init__(self, cell_size=None):
+    self.cell_size = float(cell_size or Constants["connection_cell_size"])
+    self.parts = {}
+    self.grid = collections.defaultdict(set)
+
+  def __len__(self):
+    return len(self.parts)
+
+  def cell(self, point):
+    return tuple(int(math.floor(value / self.cell_size)) for value in point)
+
+  def cells(self, box):
+    low, high = self.cell(box[0]), self.cell(box[1])
+    return [(i, j, k) for i in range(low[0], high[0] + 1)
+                      for j in range(low[1], high[1] + 1)
+                      for k in range(low[2], high[2] + 1)]
+
+  def add(self, id, name, parameters, position=(0, 0, 0)):
+    if id in self.parts:
+      self.remove(id)
+    part = self.parts[id] = PlacedPart(id, name, parameters, position)
+    self.insert(part)
+    return part
+
+  def insert(self, part):
+    part.cells = self.cells(part.box())
+    for cell in part.cells:
+      self.grid[cell].add(part.id)
+
+  def remove(self, id):
+    part = self.parts.pop(id, None)
+    if part is None:
+      return
+    for cell in part.cells:
+      members = self.grid[cell]
+      members.discard(id)
+      if not members:
+        del self.grid[cell]
+
+  def move(self, id, position):
+    """ Moves a part, rehashing it only when it changes cells. """
+    part = self.parts[id]
+    part.position = tuple(position)
+    cells = self.cells(part.box())
+    if cells != part.cells:
+      for cell in part.cells:
+        members = self.grid[cell]
+        members.discard(id)
+        if not members:
+          del self.grid[cell]
+      part.cells = cells
+      for cell in cells:
+        self.grid[cell].add(id)
+
+  def near(self, box):
+    """ The ids of the parts in the cells box touches. """
+    found = set()
+    for cell in self.cells(box):
+      members = self.grid.get(cell)
+      if members:
+        found.update(members)
+    return found
+
+  def overlaps(self, box, ignore=None):
+    """ The ids of the parts whose bodies share volume with box. """
+    return [id for id in self.near(box) if id != ignore and boxes_overlap(box, self.parts[id].box())]
+
+  def part_overlaps(self, id):
+    return self.overlaps(self.parts[id].box(), ignore=id)
+
+  def occupied(self, point, ignore=None):
+    """ Whether point is inside the body of a part, as a stud is when a
+        part sits on it. """
+    members = self.grid.get(self.cell(point), ())
+    return any(id != ignore and box_contains(self.parts[id].box(), point) for id in members)
+
+  def free_studs(self, point, radius, ignore=None):
+    """ The studs within radius of point that nothing sits on, nearest
+        first, as (distance, stud, owning part id). """
+    reach = ((point[0] - radius, point[1] - radius, point[2] - radius),
+             (point[0] + radius, point[1] + radius, point[2] + radius))
+    found = []
+    for id in self.near(reach):
+      if id == ignore:
+        continue
+      for stud in self.parts[id].studs():
+        gap = distance(stud, point)
+        if gap <= radius and not self.occupied(stud, ignore):
+          found.append((gap, stud, id))
+    found.sort(key=lambda entry: entry[0])
+    return found
+
+  def snap(self, name, parameters, position, radius=None, ignore=None):
+    """ The position nearest to position, within radius, at which a part
+        of name and parameters has one of its sockets on a free stud and
+        overlaps nothing, or None when there is none. """
+    radius = radius if radius is not None else self.cell_size
+    part_shape = shape(name, parameters)
+    if not part_shape.sockets:
+      return None
+    reach = max(distance(socket, (0, 0, 0)) for socket in part_shape.sockets)
+    center = tuple(position)
+    candidates = []
+    for gap, stud, owner in self.free_studs(center, radius + reach, ignore):
+      for socket in part_shape.sockets:
+        placed = (stud[0] - socket[0], stud[1] - socket[1], stud[2] - socket[2])
+        offset = distance(placed, center)
+        if offset <= radius:
+          candidates.append((offset, placed))
+    candidates.sort()
+    low, high = part_shape.low, part_shape.high
+    for offset, placed in candidates:
+      box = (tuple(low[axis] + placed[axis] for axis in range(0, 3)),
+             tuple(high[axis] + placed[axis] for axis in range(0, 3)))
+      if not self.overlaps(box, ignore):
+        return placed
+    return None
+
+  def snap_part(self, id, radius=None):
+    """ Snaps a placed part onto the nearest free stud and moves it there.
+        Returns the new position, or None if it was left where it was. """
+    part = self.parts[id]
+    placed = self.snap(part.name, part.parameters, part.position, radius, ignore=id)
+    if placed is not None:
+      self.move(id, placed)
+    return placed
+
+  def clear(self):
+    self.parts.clear()
+    self.grid.clear()
+
+
+def floor_layout(count, seed=0, tile=None):
+  """ count random Blocks, one to a tile of a square floor so none of them
+      overlap, as (id, name, parameters, position). """
+  choice = random.Random(seed)
+  tile = tile or Constants["max_block_width"]
+  side = int(math.ceil(math.sqrt(count)))
+  unit_width = Constants["block_width_unit"]
+  unit_depth = Constants["block_depth_unit"]
+  layout = []
+  for index in range(0, count):
+    width = choice.randint(Constants["min_block_width"], tile)
+    depth = choice.randint(Constants["min_block_width"], tile)
+    height = choice.randint(Constants["min_block_height"], Constants["max_block_height"])
+    x = (index % side) * tile + choice.randint(0, tile - width)
+    z = (index // side) * tile + choice.randint(0, tile - depth)
+    position = (x * unit_width, half(height * Constants["block_height_unit"]), z * unit_depth)
+    layout.append((index, "Block", (width, height, depth), position))
+  return layout
+
+
+def connection_stats(count=100000, queries=1000, seed=0):
+  """ Builds an index of count parts laid out by floor_layout and times
+      adding them, snapping a 2x1x2 brick near random points, overlap
+      queries and moving parts. Every snap is checked to land free. """
+  choice = random.Random(seed)
+  layout = floor_layout(count, seed)
+  index = ConnectionIndex()
+  start = time.time()
+  for id, name, parameters, position in layout:
+    index.add(id, name, parameters, position)
+  add_seconds = time.time() - start
+
+  side = math.sqrt(count) * Constants["max_block_width"]
+  points = [(choice.uniform(0, side), Constants["max_block_height"], choice.uniform(0, side)) for query in range(0, queries)]
+
+  start = time.time()
+  snapped = bad = 0
+  for number, point in enumerate(points):
+    placed = index.snap("Block", (2, 1, 2), point)
+    if placed is None:
+      continue
+    snapped += 1
+    part = index.add(("snapped", number), "Block", (2, 1, 2), placed)
+    if index.part_overlaps(part.id):
+      bad += 1
+  snap_seconds = time.time() - start
+
+  start = time.time()
+  overlapping = sum(1 for id in range(0, min(queries, count)) if index.part_overlaps(id))
+  overlap_seconds = time.time() - start
+
+  start = time.time()
+  for id in range(0, min(queries, count)):
+    x, y, z = index.parts[id].position
+    index.move(id, (x + choice.randint(-3, 3), y, z + choice.randint(-3, 3)))
+  move_seconds = time.time() - start
+
+  return {
+    "parts" : count,
+    "cells" : len(index.grid),
+    "add_seconds" : add_seconds,
+    "snaps" : queries,
+    "snapped" : snapped,
+    "snapped_onto_overlap" : bad,
+    "snap_seconds" : snap_seconds,
+    "overlapping_parts" : overlapping,
+    "overlap_seconds" : overlap_seconds,
+    "move_seconds" : move_seconds
+  }
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Time the connection index on a random floor of bricks.")
+  parser.add_argument("--parts", type=int, default=100000)
+  parser.add_argument("--queries", type=int, default=1000)
+  arguments = parser.parse_args(argv)
+  stats = connection_stats(arguments.parts, arguments.queries)
+  print("%(parts)d parts in %(cells)d cells, added in %(add_seconds).2fs" % stats)
+  print("%(snapped)d of %(snaps)d snaps found a free stud in %(snap_seconds).2fs, %(snapped_onto_overlap)d overlapped" % stats)
+  print("%(overlapping_parts)d overlapping parts found in %(overlap_seconds).3fs, moves took %(move_seconds).3fs" % stats)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,85 @@
+""" LegoConstants - units and labels shared by the LegoBuilder modules.
+
+    Kept free of any maya imports so the geometry can be built headless. """
+
+Constants = {
+  "window_width" : 500,
+  "window_height" : 400,
+  "window_padding" : 10,
+  "block_height_unit" : 1,
+  "block_width_unit" : 1,
+  "block_depth_unit" : 1,
+  "stub_height" : 0.1,
+  "stub_radius" : 0.3,
+  "perforation_radius" : 0.3,
+  "min_block_width" : 2,
+  "max_block_width" : 10,
+  "min_block_height" : 1,
+  "max_block_height" : 3,
+  "kink_angle" : 143.5,
+  "right_kink_angle" : 90,
+  "wheel_min_radius" : 2,
+  "wheel_min_height" : 1,
+  "wheel_radius_unit" : 1,
+  "wheel_ridge_depth" : 0.1,
+  "wheel_height_unit" : 0.5,
+  "wheel_pipe_thickness" : 0.5,
+  "wheel_min_subdivs" : 5,
+  "wheel_max_subdivs" : 30,
+  "cylinder_subdivs" : 20,
+  "part_cache_size" : 64,
+  "preview_interval" : 0.05,
+  "wheel_lod_levels" : (1, 2, 4),
+  "wheel_lod_distances" : (20, 60),
+  "part_library_bytes" : 256 * 1024 * 1024,
+  "scheduler_frame_time" : 0.03,
+  "connection_cell_size" : 4,
+  "weld_tolerance" : 1e-4
+}
+
+# the slider ranges of every generator, as (parameter, min, max).
+Ranges = {
+  "Block" : (("width", Constants["min_block_width"], Constants["max_block_width"]),
+             ("height", Constants["min_block_height"], Constants["max_block_height"]),
+             ("depth", Constants["min_block_width"], Constants["max_block_width"])),
+  "PerforatedBlock" : (("width", Constants["min_block_width"], Constants["max_block_width"]),),
+  "PerforatedBar" : (("width", Constants["min_block_width"], Constants["max_block_width"]),),
+  "PerforatedBarWithKink" : (("before_kink", Constants["min_block_width"], Constants["max_block_width"]),
+                             ("after_kink", Constants["min_block_width"], Constants["max_block_width"])),
+  "PerforatedBarWithRightAngle" : (("before_kink", Constants["min_block_width"], Constants["max_block_width"]),
+                                   ("after_kink", Constants["min_block_width"], Constants["max_block_width"])),
+  "Axle" : (("width", Constants["min_block_width"], Constants["max_block_width"]),),
+  "Wheel" : (("radius", Constants["wheel_min_radius"], Constants["max_block_width"]),
+             ("height", Constants["wheel_min_height"], Constants["max_block_width"]),
+             ("subdivs", Constants["wheel_min_subdivs"], Constants["wheel_max_subdivs"])),
+  "BigWheel" : (("radius", Constants["wheel_min_radius"], Constants["max_block_width"]),
+                ("height", Constants["wheel_min_height"], Constants["max_block_width"]),
+                ("subdivs", Constants["wheel_min_subdivs"], Constants["wheel_max_subdivs"]))
+}
+
+Labels = {
+  "width_label" : "Width",
+  "depth_label" : "Depth",
+  "height_label" : "Height",
+  "dimensions_label" : "Dimensions",
+  "before_kink_label" : "before_kink",
+  "after_kink_label" : "after_kink",
+  "radius_label" : "Radius",
+  "subdivs_label" : "Subdivs",
+  "color_label" : "Color"
+}
+
+# the classic brick colours, for snapping picked colours with a MaterialPool.
+Palette = {
+  "white" : (0.95, 0.95, 0.95),
+  "black" : (0.05, 0.05, 0.05),
+  "red" : (0.70, 0.00, 0.00),
+  "blue" : (0.00, 0.34, 0.65),
+  "yellow" : (0.97, 0.82, 0.09),
+  "green" : (0.00, 0.52, 0.17),
+  "orange" : (0.85, 0.43, 0.09),
+  "light_gray" : (0.63, 0.65, 0.64),
+  "dark_gray" : (0.39, 0.37, 0.38),
+  "tan" : (0.89, 0.80, 0.62),
+  "brown" : (0.35, 0.16, 0.07)
+}
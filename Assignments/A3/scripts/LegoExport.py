@@ -0,0 +1,97 @@
+""" LegoExport - bakes the LegoBuilder part catalog to mesh files.
+
+    Runs the LegoGeometry kernel over every slider combination of every
+    generator and writes one binary PLY (or OBJ) per part, spread over a
+    process pool. Needs nothing but python, no Maya.
+
+      python LegoExport.py catalog/ --format ply --workers 8 """
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import itertools
+import os
+import time
+
+import LegoMeshOps
+import LegoPly
+from LegoConstants import Ranges
+
+
+def parameter_grid(generators=None):
+  """ Yields (generator name, parameters) for every slider combination. """
+  for name in sorted(generators or Ranges):
+    ranges = [range(low, high + 1) for parameter, low, high in Ranges[name]]
+    for parameters in itertools.product(*ranges):
+      yield name, parameters
+
+
+def part_file_name(name, parameters, extension):
+  return "%s_%s.%s" % (name, "x".join(str(value) for value in parameters), extension)
+
+
+# WRITERS
+
+def write_obj(mesh, path):
+  """ Wavefront OBJ, joined into a single string before writing. """
+  points = mesh.points
+  lines = ["v %.6g %.6g %.6g" % (points[i], points[i + 1], points[i + 2]) for i in range(0, len(points), 3)]
+  start = 0
+  for count in mesh.counts:
+    lines.append("f " + " ".join(str(vertex_id + 1) for vertex_id in mesh.connects[start:start + count]))
+    start += count
+  body = ("\n".join(lines) + "\n").encode("ascii")
+  with open(path, "wb") as output:
+    output.write(body)
+  return len(body)
+
+
+Writers = {
+  "ply" : LegoPly.write_ply,
+  "obj" : write_obj
+}
+
+
+# EXPORT
+
+def export_part(job):
+  """ Builds and writes one part, returns the bytes written. Runs in the
+      worker processes, so it only takes and returns plain values. """
+  name, parameters, directory, file_format = job
+  mesh = LegoMeshOps.kernel_part(name, parameters)
+  return Writers[file_format](mesh, os.path.join(directory, part_file_name(name, parameters, file_format)))
+
+
+def export_catalog(directory, file_format="ply", workers=None, generators=None):
+  """ Exports the whole catalog into directory and returns a summary with
+      the part count, bytes written, seconds taken and parts per second. """
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+  jobs = [(name, parameters, directory, file_format) for name, parameters in parameter_grid(generators)]
+  workers = workers or os.cpu_count()
+
+  start = time.time()
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    written = sum(executor.map(export_part, jobs, chunksize=max(1, len(jobs) // (workers * 8))))
+  seconds = time.time() - start
+  return {
+    "parts" : len(jobs),
+    "bytes" : written,
+    "seconds" : seconds,
+    "workers" : workers,
+    "parts_per_second" : len(jobs) / seconds if seconds else 0.0
+  }
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Export the LegoBuilder part catalog.")
+  parser.add_argument("directory")
+  parser.add_argument("--format", choices=sorted(Writers), default="ply")
+  parser.add_argument("--workers", type=int, default=None)
+  parser.add_argument("--generator", action="append", choices=sorted(Ranges), dest="generators")
+  arguments = parser.parse_args(argv)
+  summary = export_catalog(arguments.directory, arguments.format, arguments.workers, arguments.generators)
+  print("%(parts)d parts, %(bytes)d bytes in %(seconds).2fs with %(workers)d workers: %(parts_per_second).1f parts/sec" % summary)
+
+
+if __name__ == "__main__":
+  main()
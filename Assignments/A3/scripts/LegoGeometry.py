@@ -0,0 +1,536 @@
+""" LegoGeometry - pure python mesh kernel for the LegoBuilder parts.
+
+    Parts are computed as flat vertex and face arrays, laid out the way
+    MFnMesh.create wants them, so a whole part becomes one mesh node in a
+    single call. Nothing in here imports maya. Running the module checks
+    the drilled parts against the counts and extents worked out for them:
+
+      python LegoGeometry.py """
+
+from array import array
+import math
+import sys
+
+from LegoConstants import Constants
+
+
+# bumped with every kernel change that changes the meshes it makes, so a
+# LegoLibrary store stops handing out the meshes of an older kernel.
+kernel_version = 1
+
+def half(num):
+  return num/2.00
+
+
+class Mesh:
+  """ A polygon mesh as three flat arrays: xyz triples for the points,
+      the vertex count of every face and the vertex ids of every face. """
+
+  def __init__(self):
+    self.points = array('d')
+    self.counts = array('i')
+    self.connects = array('i')
+
+  def vertex_count(self):
+    return len(self.points) // 3
+
+  def face_count(self):
+    return len(self.counts)
+
+  def add_point(self, x, y, z):
+    self.points.extend((x, y, z))
+    return self.vertex_count() - 1
+
+  def add_face(self, vertex_ids):
+    self.counts.append(len(vertex_ids))
+    self.connects.extend(vertex_ids)
+
+  def append(self, other, offset=(0, 0, 0), angle=0):
+    """ Copies other into this mesh, turned angle degrees around the z
+        axis and then moved by offset. """
+    base = self.vertex_count()
+    dx, dy, dz = offset
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    points = other.points
+    for i in range(0, len(points), 3):
+      x, y = points[i], points[i + 1]
+      self.points.extend((x * c - y * s + dx, x * s + y * c + dy, points[i + 2] + dz))
+    self.counts.extend(other.counts)
+    self.connects.extend([vertex_id + base for vertex_id in other.connects])
+    return self
+
+  def bounding_box(self):
+    """ Returns ((min x, min y, min z), (max x, max y, max z)). """
+    xs = self.points[0::3]
+    ys = self.points[1::3]
+    zs = self.points[2::3]
+    return (min(xs), min(ys), min(zs)), (max(xs), max(ys), max(zs))
+
+
+# PRIMITIVES
+
+def box(width, height, depth, center=(0, 0, 0)):
+  """ A six sided box, same vertex and face order as polyCube. """
+  mesh = Mesh()
+  cx, cy, cz = center
+  x, y, z = half(width), half(height), half(depth)
+  for px, py, pz in ((-x, -y, z), (x, -y, z), (-x, y, z), (x, y, z),
+                     (-x, y, -z), (x, y, -z), (-x, -y, -z), (x, -y, -z)):
+    mesh.add_point(cx + px, cy + py, cz + pz)
+  for face in ((0, 1, 3, 2), (2, 3, 5, 4), (4, 5, 7, 6),
+               (6, 7, 1, 0), (1, 7, 5, 3), (6, 0, 2, 4)):
+    mesh.add_face(face)
+  return mesh
+
+
+def cylinder(radius, height, subdivs=None, center=(0, 0, 0)):
+  """ A capped cylinder standing on the y axis, like polyCylinder with
+      one height span and n-gon caps. """
+  subdivs = subdivs or Constants["cylinder_subdivs"]
+  mesh = Mesh()
+  cx, cy, cz = center
+  for y in (cy - half(height), cy + half(height)):
+    for i in range(0, subdivs):
+      angle = 2 * math.pi * i / subdivs
+      mesh.add_point(cx + radius * math.cos(angle), y, cz - radius * math.sin(angle))
+  for i in range(0, subdivs):
+    j = (i + 1) % subdivs
+    mesh.add_face((i, j, subdivs + j, subdivs + i))
+  mesh.add_face(list(range(subdivs - 1, -1, -1)))
+  mesh.add_face(list(range(subdivs, 2 * subdivs)))
+  return mesh
+
+
+def revolve(profile, segments):
+  """ Sweeps a closed loop of (radius, y) points once around the y axis. """
+  mesh = Mesh()
+  for i in range(0, segments):
+    angle = 2 * math.pi * i / segments
+    c, s = math.cos(angle), math.sin(angle)
+    for radius, y in profile:
+      mesh.add_point(radius * c, y, -radius * s)
+  count = len(profile)
+  for i in range(0, segments):
+    j = (i + 1) % segments
+    for k in range(0, count):
+      l = (k + 1) % count
+      mesh.add_face((i * count + k, j * count + k, j * count + l, i * count + l))
+  return mesh
+
+
+def extrude_faces(mesh, faces, distance):
+  """ Pushes each of the given faces out along its normal by distance,
+      adding a wall along every edge, like polyExtrudeFacet with ltz.
+      The faces must not share edges with each other. """
+  starts = []
+  start = 0
+  for count in mesh.counts:
+    starts.append(start)
+    start += count
+  extruded = Mesh()
+  extruded.points = array('d', mesh.points)
+  moved = set(faces)
+  for face, count in enumerate(mesh.counts):
+    ids = mesh.connects[starts[face]:starts[face] + count]
+    if face not in moved:
+      extruded.add_face(ids)
+      continue
+    nx, ny, nz = face_normal(mesh, ids)
+    tops = [extruded.add_point(mesh.points[3 * i] + nx * distance, mesh.points[3 * i + 1] + ny * distance,
+                               mesh.points[3 * i + 2] + nz * distance) for i in ids]
+    extruded.add_face(tops)
+    for k in range(0, count):
+      l = (k + 1) % count
+      extruded.add_face((ids[k], ids[l], tops[l], tops[k]))
+  return extruded
+
+
+def face_normal(mesh, ids):
+  """ The unit normal of a face, from Newell's method. """
+  points = mesh.points
+  nx = ny = nz = 0.0
+  for k in range(0, len(ids)):
+    a, b = 3 * ids[k], 3 * ids[(k + 1) % len(ids)]
+    nx += (points[a + 1] - points[b + 1]) * (points[a + 2] + points[b + 2])
+    ny += (points[a + 2] - points[b + 2]) * (points[a] + points[b])
+    nz += (points[a] - points[b]) * (points[a + 1] + points[b + 1])
+  length = math.sqrt(nx * nx + ny * ny + nz * nz) or 1.0
+  return nx / length, ny / length, nz / length
+
+
+def perforated_slab(holes, left=None, right=None, subdivs=None):
+  """ A one unit tall slab drilled through along z, one hole per entry in
+      holes (x positions, a width unit apart). The holes are cut straight
+      into the topology: every hole sits in its own cell whose outline is
+      ray cast from the hole, so no boolean is needed. left and right are
+      the x of a flat end, or None for a round cap like the bar ends. """
+  subdivs = subdivs or Constants["cylinder_subdivs"]
+  radius = Constants["perforation_radius"]
+  depth = Constants["block_depth_unit"]
+  half_width = half(Constants["block_width_unit"])
+  half_height = half(Constants["block_height_unit"])
+  corner_angle = math.atan2(half_height, half_width)
+
+  mesh = Mesh()
+  outline_ids = {}
+  profile = []
+
+  def profile_point(x, y):
+    key = (round(x, 9), round(y, 9))
+    if key not in outline_ids:
+      outline_ids[key] = len(profile)
+      profile.append((x, y))
+    return outline_ids[key]
+
+  def outline_point(cx, angle, capped):
+    c, s = math.cos(angle), math.sin(angle)
+    if capped:
+      return cx + half_height * c, half_height * s
+    if abs(c) * half_height >= abs(s) * half_width:
+      return cx + math.copysign(half_width, c), half_width * s / abs(c)
+    return cx + half_height * c / abs(s), math.copysign(half_height, s)
+
+  faces = []
+  walls = []
+  hole_walls = []
+  for n, cx in enumerate(holes):
+    cap_left = n == 0 and left is None
+    cap_right = n == len(holes) - 1 and right is None
+    inner = [profile_point(cx + radius * math.cos(2 * math.pi * k / subdivs), radius * math.sin(2 * math.pi * k / subdivs))
+             for k in range(0, subdivs)]
+    for k in range(0, subdivs):
+      start = 2 * math.pi * k / subdivs
+      end = 2 * math.pi * (k + 1) / subdivs
+      outline = []
+      for angle in (start, end):
+        c = math.cos(angle)
+        outline.append(outline_point(cx, angle, (cap_left and c < -1e-9) or (cap_right and c > 1e-9)))
+      for corner in (corner_angle, math.pi - corner_angle, math.pi + corner_angle, 2 * math.pi - corner_angle):
+        c = math.cos(corner)
+        if start + 1e-9 < corner < end - 1e-9 and not ((cap_left and c < 0) or (cap_right and c > 0)):
+          outline.insert(1, outline_point(cx, corner, False))
+      ids = [profile_point(x, y) for x, y in outline]
+      faces.append([inner[k]] + ids + [inner[(k + 1) % subdivs]])
+      hole_walls.append((inner[k], inner[(k + 1) % subdivs]))
+      # only the outline walls facing out of the slab, not the seams
+      # between neighbouring cells, get a wall.
+      for a, b in zip(ids, ids[1:]):
+        ax, bx = profile[a][0], profile[b][0]
+        on_left = abs(ax - (cx - half_width)) < 1e-9 and abs(bx - ax) < 1e-9
+        on_right = abs(ax - (cx + half_width)) < 1e-9 and abs(bx - ax) < 1e-9
+        if not ((on_left and (n > 0 or left is not None)) or (on_right and (n < len(holes) - 1 or right is not None))):
+          walls.append((a, b))
+
+  # flat ends are padded out from the first and last cell to the end.
+  for end, edge in ((left, holes[0] - half_width), (right, holes[-1] + half_width)):
+    if end is None:
+      continue
+    seam = sorted([i for i, (x, y) in enumerate(profile) if abs(x - edge) < 1e-9], key=lambda i: profile[i][1])
+    bottom, top = profile_point(end, -half_height), profile_point(end, half_height)
+    if end < edge:
+      outline = [bottom] + seam + [top]
+    else:
+      outline = [bottom, top] + list(reversed(seam))
+    faces.append(outline)
+    for a, b in zip(outline, outline[1:] + outline[:1]):
+      if not (a in seam and b in seam):
+        walls.append((a, b))
+
+  for x, y in profile:
+    mesh.add_point(x, y, 0)
+  for x, y in profile:
+    mesh.add_point(x, y, depth)
+  back = len(profile)
+  for face in faces:
+    mesh.add_face([vertex_id + back for vertex_id in face])
+    mesh.add_face(list(reversed(face)))
+  for a, b in walls:
+    mesh.add_face((a, b, b + back, a + back))
+  for a, b in hole_walls:
+    mesh.add_face((a, a + back, b + back, b))
+  return mesh
+
+
+# PARTS
+
+def stud_positions(width, height, depth):
+  """ Where the centre of every stud on top of a brick goes. """
+  unit_width = Constants["block_width_unit"]
+  unit_depth = Constants["block_depth_unit"]
+  stub_y = half(Constants["block_height_unit"]) * height + half(Constants["stub_height"])
+  return [(unit_width * x + half(unit_width), stub_y, unit_depth * z + half(unit_depth))
+          for x in range(0, width) for z in range(0, depth)]
+
+
+def block(width, height, depth, studs=True):
+  """ The standard brick: the body plus one stud per unit of its top,
+      or just the body when studs is off. """
+  unit_width = Constants["block_width_unit"]
+  unit_depth = Constants["block_depth_unit"]
+  mesh = box(width * unit_width, height * Constants["block_height_unit"], depth * unit_depth,
+             center=(half(width * unit_width), 0, half(depth * unit_depth)))
+  if studs:
+    stub = cylinder(Constants["stub_radius"], Constants["stub_height"])
+    for position in stud_positions(width, height, depth):
+      mesh.append(stub, position)
+  return mesh
+
+
+def perforated_block(width, studs=True):
+  """ A one unit deep brick drilled between each pair of studs. """
+  unit_width = Constants["block_width_unit"]
+  mesh = perforated_slab([unit_width * x for x in range(1, width)], left=0, right=width * unit_width)
+  if studs:
+    stub = cylinder(Constants["stub_radius"], Constants["stub_height"])
+    for position in stud_positions(width, 1, 1):
+      mesh.append(stub, position)
+  return mesh
+
+
+def perforated_bar(width):
+  """ A round ended bar with a hole at every unit, ends included. """
+  return perforated_slab([Constants["block_width_unit"] * x for x in range(0, width + 1)])
+
+
+def composed_bar(segments, start=(0, 0)):
+  """ Perforated bars laid end to end, sharing a hole at every joint.
+      segments is a list of (length, angle): each bar is turned angle
+      degrees from the one before it (the first from the x axis) and the
+      chain starts at start, in width units. Every distinct length is
+      only computed once and then copied into place. """
+  unit_width = Constants["block_width_unit"]
+  bars = {}
+  mesh = Mesh()
+  x, y = start[0] * unit_width, start[1] * unit_width
+  heading = 0
+  for length, angle in segments:
+    heading += angle
+    if length not in bars:
+      bars[length] = perforated_bar(length)
+    mesh.append(bars[length], (x, y, 0), heading)
+    x += length * unit_width * math.cos(math.radians(heading))
+    y += length * unit_width * math.sin(math.radians(heading))
+  return mesh
+
+
+def kinked_bar(before, after, angle):
+  """ Two perforated bars sharing the hole at the origin, the second one
+      turned angle degrees around it. """
+  return composed_bar([(before, 180), (after, angle - 180)], start=(before, 0))
+
+
+def axle(width):
+  """ A cross shaped axle, two thin boxes crossing along x. """
+  thickness = 2 * Constants["perforation_radius"]
+  center = (half(width * Constants["block_width_unit"]), 0, half(Constants["block_depth_unit"]))
+  mesh = box(width * Constants["block_width_unit"], half(thickness), thickness, center=center)
+  return mesh.append(box(width * Constants["block_width_unit"], thickness, half(thickness), center=center))
+
+
+def wheel(radius, height, subdivs):
+  """ A cylinder with every other side face pushed out into a ridge. """
+  mesh = cylinder(radius * Constants["wheel_radius_unit"], height * Constants["wheel_height_unit"], subdivs)
+  return extrude_faces(mesh, range(1, subdivs, 2), Constants["wheel_ridge_depth"])
+
+
+def big_wheel(radius, height, subdivs, segments=None):
+  """ A pipe like polyPipe(sh=4, sc=subdivs): four spans up the walls
+      and subdivs rings across each cap, segments around. """
+  outer = radius * Constants["wheel_radius_unit"]
+  inner = outer - Constants["wheel_pipe_thickness"]
+  top = half(height * Constants["wheel_height_unit"])
+  profile = [(outer, -top + 2 * top * i / 4.0) for i in range(0, 4)]
+  profile += [(outer + (inner - outer) * i / float(subdivs), top) for i in range(0, subdivs)]
+  profile += [(inner, top - 2 * top * i / 4.0) for i in range(0, 4)]
+  profile += [(inner + (outer - inner) * i / float(subdivs), -top) for i in range(0, subdivs)]
+  return revolve(profile, segments or Constants["cylinder_subdivs"])
+
+
+def lod_subdivs(subdivs, level, minimum):
+  return max(minimum, int(round(subdivs / float(level))))
+
+
+def wheel_lods(radius, height, subdivs):
+  """ The wheel at every level of wheel_lod_levels (full, half, quarter
+      subdivs by default), ridges included. Levels that come out with the
+      same subdivs share one mesh. """
+  meshes = {}
+  lods = []
+  for level in Constants["wheel_lod_levels"]:
+    count = lod_subdivs(subdivs, level, Constants["wheel_min_subdivs"])
+    if count not in meshes:
+      meshes[count] = wheel(radius, height, count)
+    lods.append(meshes[count])
+  return lods
+
+
+def big_wheel_lods(radius, height, subdivs):
+  """ The big wheel at every level of wheel_lod_levels, with both the
+      cap rings and the segments around cut down. """
+  meshes = {}
+  lods = []
+  for level in Constants["wheel_lod_levels"]:
+    counts = (lod_subdivs(subdivs, level, 1), lod_subdivs(Constants["cylinder_subdivs"], level, Constants["wheel_min_subdivs"]))
+    if counts not in meshes:
+      meshes[counts] = big_wheel(radius, height, *counts)
+    lods.append(meshes[counts])
+  return lods
+
+
+# the kernel function behind every generator, by generator name.
+Parts = {
+  "Block" : block,
+  "PerforatedBlock" : perforated_block,
+  "PerforatedBar" : perforated_bar,
+  "PerforatedBarWithKink" : lambda before_kink, after_kink: kinked_bar(before_kink, after_kink, Constants["kink_angle"]),
+  "PerforatedBarWithRightAngle" : lambda before_kink, after_kink: kinked_bar(before_kink, after_kink, Constants["right_kink_angle"]),
+  "Axle" : axle,
+  "Wheel" : wheel,
+  "BigWheel" : big_wheel
+}
+
+# how the kernel mesh of a part is welded before it is used, in maya or
+# exported, see LegoMeshOps.welded. Parts not listed are used as made.
+# The segments of the kinked bars overlap round their joint hole, each a
+# closed shell, so they are welded a shell at a time.
+Welds = {
+  "PerforatedBarWithKink" : "shells",
+  "PerforatedBarWithRightAngle" : "shells"
+}
+
+
+# CHECKS
+
+# the subdivisionsAxis of the polyCylinders the boolean path builds its
+# holes, caps and studs from: maya's default, not cylinder_subdivs.
+boolean_subdivs = 20
+
+
+def polygon_area(radius, sides):
+  """ The area of the regular polygon polyCylinder rounds a circle to. """
+  return 0.5 * sides * radius * radius * math.sin(2 * math.pi / sides)
+
+
+def boolean_volumes(width):
+  """ The volumes of the parts the boolean path builds for width: the
+      polyCube less the polyCylinder holes polyBoolOp cuts through it,
+      plus the half polyCylinder caps of the bar and the studs of the
+      block. Returns (block, studs, bar). """
+  unit_width = Constants["block_width_unit"]
+  height = Constants["block_height_unit"]
+  depth = Constants["block_depth_unit"]
+  hole = polygon_area(Constants["perforation_radius"], boolean_subdivs) * depth
+  slab = width * unit_width * height * depth
+  studs = width * polygon_area(Constants["stub_radius"], boolean_subdivs) * Constants["stub_height"]
+  caps = polygon_area(half(height), boolean_subdivs) * depth
+  return slab - (width - 1) * hole, studs, slab + caps - (width + 1) * hole
+
+
+def volume(mesh):
+  """ The signed volume of a closed mesh, positive when its faces wind
+      counter clockwise seen from outside. """
+  total = 0.0
+  start = 0
+  for count in mesh.counts:
+    ids = mesh.connects[start:start + count]
+    start += count
+    ox, oy, oz = mesh.points[3 * ids[0]:3 * ids[0] + 3]
+    for k in range(1, count - 1):
+      ax, ay, az = mesh.points[3 * ids[k]:3 * ids[k] + 3]
+      bx, by, bz = mesh.points[3 * ids[k + 1]:3 * ids[k + 1] + 3]
+      total += ox * (ay * bz - az * by) + oy * (az * bx - ax * bz) + oz * (ax * by - ay * bx)
+  return total / 6.0
+
+
+def edge_uses(mesh):
+  """ How many times every directed edge is walked by the faces. """
+  uses = {}
+  start = 0
+  for count in mesh.counts:
+    ids = mesh.connects[start:start + count]
+    start += count
+    for k in range(0, count):
+      edge = (ids[k], ids[(k + 1) % count])
+      uses[edge] = uses.get(edge, 0) + 1
+  return uses
+
+
+def open_edges(mesh):
+  """ How many directed edges are not walked exactly once, with their
+      reverse walked exactly once: 0 for a closed, manifold mesh. """
+  uses = edge_uses(mesh)
+  return len([edge for edge, count in uses.items() if count != 1 or uses.get((edge[1], edge[0])) != 1])
+
+
+def checks():
+  """ Checks the drilled parts at every width against what the boolean
+      path builds: the volume polyBoolOp leaves (boolean_volumes) and the
+      extents of the cube, caps and studs it puts together. Every part has
+      to be closed (every edge used by exactly two faces, once each way)
+      with one handle per hole (V - E + F = 2 - 2 holes). The kinked bars,
+      at every size, and a composed bar are checked the same way as
+      LegoMeshOps welds them, their volume being that of the bars the
+      boolean path unites. Returns the failures. """
+  failures = []
+  unit_width = Constants["block_width_unit"]
+  half_height = half(Constants["block_height_unit"])
+  depth = Constants["block_depth_unit"]
+
+  def check_volume(name, mesh, expected):
+    found = volume(mesh)
+    if abs(found - expected) > 1e-9 * max(1.0, abs(expected)):
+      failures.append("%s has volume %.9f, the boolean path %.9f" % (name, found, expected))
+
+  for width in range(Constants["min_block_width"], Constants["max_block_width"] + 1):
+    stud_top = half_height + Constants["stub_height"]
+    block_volume, studs_volume, bar_volume = boolean_volumes(width)
+    cases = [
+      ("perforated_block(%d)" % width, perforated_block(width, studs=False), width - 1, 0, block_volume,
+       ((0, -half_height, 0), (width * unit_width, half_height, depth))),
+      ("perforated_block(%d) with studs" % width, perforated_block(width), width - 1, width, block_volume + studs_volume,
+       ((0, -half_height, 0), (width * unit_width, stud_top, depth))),
+      ("perforated_bar(%d)" % width, perforated_bar(width), width + 1, 0, bar_volume,
+       ((-half_height, -half_height, 0), (width * unit_width + half_height, half_height, depth)))
+    ]
+    for name, mesh, holes, studs, expected, extents in cases:
+      check_volume(name, mesh, expected)
+      box = mesh.bounding_box()
+      if any(abs(box[side][axis] - extents[side][axis]) > 1e-9 for side in range(0, 2) for axis in range(0, 3)):
+        failures.append("%s spans %s, not %s" % (name, box, extents))
+      uses = edge_uses(mesh)
+      if open_edges(mesh):
+        failures.append("%s has %d edges not used by exactly two faces" % (name, open_edges(mesh)))
+      # the studs are closed shells of their own, each adding 2.
+      euler = mesh.vertex_count() - len(uses) // 2 + mesh.face_count()
+      if euler != 2 - 2 * holes + 2 * studs:
+        failures.append("%s has Euler characteristic %d, not %d" % (name, euler, 2 - 2 * holes + 2 * studs))
+
+  # the kinked and composed bars as they are welded for maya and the
+  # catalog, one shell per segment like the pieces the boolean path unites.
+  import LegoMeshOps
+  bars = []
+  for name in ("PerforatedBarWithKink", "PerforatedBarWithRightAngle"):
+    for before in range(Constants["min_block_width"], Constants["max_block_width"] + 1):
+      for after in range(Constants["min_block_width"], Constants["max_block_width"] + 1):
+        bars.append(("welded %s(%d, %d)" % (name, before, after), LegoMeshOps.kernel_part(name, (before, after)), (before, after)))
+  segments = [(3, 0), (4, 60), (2, -90), (5, 45)]
+  bars.append(("welded composed_bar(%s)" % segments, LegoMeshOps.welded("PerforatedBarWithKink", composed_bar(segments)), [length for length, angle in segments]))
+  for name, mesh, lengths in bars:
+    bad = open_edges(mesh)
+    if bad:
+      failures.append("%s has %d edges not used by exactly two faces" % (name, bad))
+    check_volume(name, mesh, sum(boolean_volumes(length)[2] for length in lengths))
+  return failures
+
+
+def main():
+  failures = checks()
+  for failure in failures:
+    print("FAILED: " + failure)
+  if not failures:
+    print("drilled parts match the boolean path's volumes and extents")
+  return 1 if failures else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
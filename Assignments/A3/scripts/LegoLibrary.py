@@ -0,0 +1,235 @@
+""" LegoLibrary - an on disk store of finished part meshes.
+
+    Entries are binary PLY files named after a hash of the generator, its
+    parameters, whether it is welded, the kernel version and the whole
+    Constants table, so changing a unit or the kernel never hands out a
+    stale part. index.json records the size and last use of every entry
+    and the least recently used ones are evicted once the store grows past
+    its byte limit. Loads only note the time they used an entry; the
+    times are written to the index in one go every flush_every loads, with
+    every store and on close. Several sessions (or machines on a shared
+    directory) can use one store: the index is only written while holding
+    a lock file and every file is written next to its final name and
+    renamed into place. Nothing in here imports maya. """
+
+import errno
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import LegoGeometry
+import LegoPly
+from LegoConstants import Constants
+
+
+def part_key(name, parameters, weld=None):
+  """ The content address of a part, welded as weld (a LegoGeometry.Welds
+      value) or as the kernel made it. """
+  source = json.dumps([name, list(parameters), weld, LegoGeometry.kernel_version, Constants], sort_keys=True)
+  return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+def temporary_path(path):
+  """ A name next to path to write into before renaming it over path. The
+      uuid keeps it apart from every other session, on this machine or
+      another one sharing the directory, where a pid would not. """
+  return "%s.%s.tmp" % (path, uuid.uuid4().hex)
+
+
+def write_atomic(path, data):
+  temporary = temporary_path(path)
+  with open(temporary, "wb") as output:
+    output.write(data)
+  os.replace(temporary, path)
+
+
+class LockTimeout(Exception):
+  pass
+
+
+class Lock:
+  """ A lock file created with O_EXCL, which works across processes and on
+      network shares. A lock older than stale seconds is assumed to have
+      been left behind by a crashed session and is broken. """
+
+  def __init__(self, path, timeout=10.0, stale=30.0):
+    self.path = path
+    self.timeout = timeout
+    self.stale = stale
+
+  def __enter__(self):
+    start = time.time()
+    while True:
+      try:
+        handle = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.write(handle, str(os.getpid()).encode("ascii"))
+        os.close(handle)
+        return self
+      except OSError as error:
+        if error.errno != errno.EEXIST:
+          raise
+      try:
+        if time.time() - os.path.getmtime(self.path) > self.stale:
+          self.break_stale()
+          continue
+      except OSError:
+        continue
+      if time.time() - start > self.timeout:
+        raise LockTimeout("could not lock " + self.path)
+      time.sleep(0.01)
+
+  def break_stale(self):
+    """ Moves a stale lock out of the way. The rename is atomic, so of the
+        sessions that found it stale only one gets it; the others fail to
+        find it and go back to O_EXCL. If the lock moved was a fresh one,
+        taken by a session that broke the stale one first, it is linked
+        back unless yet another session holds the lock by then. """
+    broken = "%s.%s.stale" % (self.path, uuid.uuid4().hex)
+    os.rename(self.path, broken)
+    try:
+      if time.time() - os.path.getmtime(broken) <= self.stale:
+        try:
+          os.link(broken, self.path)
+        except OSError:
+          pass
+    finally:
+      os.remove(broken)
+
+  def __exit__(self, *args):
+    try:
+      os.remove(self.path)
+    except OSError:
+      pass
+    return False
+
+
+class PartLibrary:
+  """ The store in directory, holding at most limit bytes of meshes. """
+
+  # how many loads may note their use before the index is written.
+  flush_every = 64
+
+  def __init__(self, directory, limit=None):
+    self.directory = directory
+    self.limit = limit if limit is not None else Constants["part_library_bytes"]
+    self.index_path = os.path.join(directory, "index.json")
+    self.lock = Lock(os.path.join(directory, "index.lock"))
+    self.hits = 0
+    self.misses = 0
+    # the last index read and the stat it was read at, see cached_index.
+    self.index = {}
+    self.index_stat = None
+    # key -> time of the loads not in the index yet.
+    self.used = {}
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+
+  def entry_path(self, key):
+    return os.path.join(self.directory, key + ".ply")
+
+  def read_index(self):
+    try:
+      with open(self.index_path) as index:
+        return json.load(index)
+    except (IOError, OSError, ValueError):
+      return {}
+
+  def write_index(self, index):
+    write_atomic(self.index_path, json.dumps(index, sort_keys=True).encode("utf-8"))
+
+  def cached_index(self):
+    """ The index, read again only when the file changed. The index is
+        always renamed into place, so it can be read without the lock. """
+    try:
+      stat = os.stat(self.index_path)
+      stat = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    except OSError:
+      stat = None
+    if stat != self.index_stat:
+      self.index = self.read_index()
+      self.index_stat = stat
+    return self.index
+
+  def note_uses(self, index):
+    """ Puts the pending load times into index, for the entries still in
+        it. """
+    for key, used in self.used.items():
+      if key in index:
+        index[key]["last_used"] = max(index[key]["last_used"], used)
+    self.used = {}
+
+  def flush(self):
+    """ Writes the pending load times to the index. """
+    if not self.used:
+      return
+    with self.lock:
+      index = self.read_index()
+      self.note_uses(index)
+      self.write_index(index)
+
+  def close(self):
+    self.flush()
+
+  def load(self, key):
+    """ Returns the stored Mesh for key, or None if there is none. """
+    if key not in self.cached_index() or not os.path.exists(self.entry_path(key)):
+      self.misses += 1
+      return None
+    try:
+      mesh = LegoPly.read_ply(self.entry_path(key))
+    except (IOError, OSError):
+      # evicted by another session since the index was read.
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.used[key] = time.time()
+    if len(self.used) >= self.flush_every:
+      self.flush()
+    return mesh
+
+  def store(self, key, mesh):
+    """ Adds mesh under key, then evicts down to the byte limit. """
+    path = self.entry_path(key)
+    temporary = temporary_path(path)
+    size = LegoPly.write_ply(mesh, temporary)
+    os.replace(temporary, path)
+    with self.lock:
+      index = self.read_index()
+      self.note_uses(index)
+      index[key] = {"bytes" : size, "last_used" : time.time()}
+      self.evict(index)
+      self.write_index(index)
+
+  def evict(self, index):
+    total = sum(entry["bytes"] for entry in index.values())
+    for key in sorted(index, key=lambda key: index[key]["last_used"]):
+      if total <= self.limit:
+        break
+      total -= index.pop(key)["bytes"]
+      try:
+        os.remove(self.entry_path(key))
+      except OSError:
+        pass
+
+  def fetch(self, name, parameters, build, weld=None):
+    """ The mesh for name and parameters, loaded from the library or made
+        by calling build(*parameters) and stored for next time. weld says
+        how build welds the kernel mesh, see part_key. """
+    key = part_key(name, parameters, weld)
+    mesh = self.load(key)
+    if mesh is None:
+      mesh = build(*parameters)
+      self.store(key, mesh)
+    return mesh
+
+  def clear(self):
+    with self.lock:
+      for key in self.read_index():
+        try:
+          os.remove(self.entry_path(key))
+        except OSError:
+          pass
+      self.used = {}
+      self.write_index({})
@@ -0,0 +1,103 @@
+""" LegoMeshCommand - an undoable legoMesh command for LegoBuilder's meshes.
+
+    OpenMaya calls made from a script never go on the undo queue, so a
+    mesh made with MFnMesh().create stays in the scene when the Generate
+    that made it is undone. This plug-in wraps the same calls in a
+    command that can undo and redo them:
+
+      cmds.legoMesh("create", name, encode(mesh))   makes a mesh node
+      cmds.legoMesh("edit", transform, encode(mesh)) replaces its geometry
+
+    The mesh goes through the command as text, so the command keeps
+    everything it needs to redo itself. LegoBuilder loads the plug-in the
+    first time it makes a mesh. """
+
+from array import array
+import base64
+
+import maya.api.OpenMaya as om
+
+
+def maya_useNewAPI():
+  """ Tells Maya the plug-in uses the Python API 2.0. """
+  pass
+
+
+def encode(mesh):
+  """ A LegoGeometry.Mesh (or anything with points, counts and connects)
+      as one line of ASCII. """
+  return " ".join(base64.b64encode(array(code, values).tobytes()).decode("ascii")
+                  for code, values in (('d', mesh.points), ('i', mesh.counts), ('i', mesh.connects)))
+
+
+def decode(text):
+  """ The points, counts and connects arrays encode packed into text. """
+  arrays = []
+  for code, part in zip(('d', 'i', 'i'), text.split(" ")):
+    values = array(code)
+    values.frombytes(base64.b64decode(part))
+    arrays.append(values)
+  return arrays
+
+
+def vertices(points):
+  return [om.MPoint(points[i], points[i + 1], points[i + 2]) for i in range(0, len(points), 3)]
+
+
+def mesh_of(transform):
+  return om.MFnMesh(om.MSelectionList().add(transform).getDagPath(0))
+
+
+class LegoMeshCommand(om.MPxCommand):
+  name = "legoMesh"
+
+  def __init__(self):
+    om.MPxCommand.__init__(self)
+    self.handle = None
+    self.previous = None
+
+  @staticmethod
+  def creator():
+    return LegoMeshCommand()
+
+  def isUndoable(self):
+    return True
+
+  def doIt(self, args):
+    self.mode, self.target, text = args.asString(0), args.asString(1), args.asString(2)
+    self.points, self.counts, self.connects = decode(text)
+    if self.mode == "edit":
+      shape = mesh_of(self.target)
+      points = []
+      for point in shape.getPoints():
+        points.extend((point.x, point.y, point.z))
+      self.previous = (points,) + tuple(shape.getVertices())
+    self.redoIt()
+
+  def redoIt(self):
+    if self.mode == "edit":
+      mesh_of(self.target).createInPlace(vertices(self.points), self.counts, self.connects)
+      self.setResult(self.target)
+      return
+    transform = om.MFnMesh().create(vertices(self.points), self.counts, self.connects)
+    self.handle = om.MObjectHandle(transform)
+    self.setResult(om.MFnDependencyNode(transform).setName(self.target))
+
+  def undoIt(self):
+    if self.mode == "edit":
+      points, counts, connects = self.previous
+      mesh_of(self.target).createInPlace(vertices(points), counts, connects)
+      return
+    if self.handle is not None and self.handle.isValid():
+      modifier = om.MDagModifier()
+      modifier.deleteNode(self.handle.object())
+      modifier.doIt()
+    self.handle = None
+
+
+def initializePlugin(plugin):
+  om.MFnPlugin(plugin, "LegoBuilder").registerCommand(LegoMeshCommand.name, LegoMeshCommand.creator)
+
+
+def uninitializePlugin(plugin):
+  om.MFnPlugin(plugin).deregisterCommand(LegoMeshCommand.name)
@@ -0,0 +1,429 @@
+""" LegoMeshOps - cleans LegoGeometry meshes up before they go to Maya.
+
+    weld merges every point lying within an exact tolerance of one kept
+    before it. Points are hashed into cells 32 tolerances wide, so a
+    point only looks at its own cell and, when it sits that close to a
+    cell wall, at the cells across it. drop_degenerate_faces removes the
+    faces welding collapsed: repeated ids, fewer than three corners or
+    no area. clean_shells cleans every closed shell on its own, for parts
+    whose shells overlap without being one solid, as welding them
+    together would leave edges shared by three and four faces.
+    face_normals (which AdjustSelected uses too) and vertex_normals work
+    with numpy when it is installed and plain python when it is not.
+    Nothing in here imports maya.
+
+      python LegoMeshOps.py --vertices 1000000 """
+
+from array import array
+import argparse
+import itertools
+import math
+import random
+import sys
+import time
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+import LegoGeometry
+from LegoConstants import Constants, Ranges
+
+
+def weld_ids(mesh, tolerance=None):
+  """ The points weld keeps, as flat xyz, and the kept id of every point
+      of mesh. """
+  tolerance = Constants["weld_tolerance"] if tolerance is None else tolerance
+  # cells are wide enough that most points are nowhere near a wall.
+  size = 32.0 * tolerance
+  margin = tolerance / size
+  limit = tolerance * tolerance
+  points = mesh.points
+  cells = {}
+  kept = array('d')
+  remap = array('i', [0]) * mesh.vertex_count()
+  floor = math.floor
+  for i in range(0, mesh.vertex_count()):
+    x, y, z = points[3 * i], points[3 * i + 1], points[3 * i + 2]
+    fx, fy, fz = x / size, y / size, z / size
+    cx, cy, cz = int(floor(fx)), int(floor(fy)), int(floor(fz))
+    keys = [(cx, cy, cz)]
+    # the cells across a wall only need a look when the point is near it.
+    near = []
+    for cell, fraction in ((cx, fx - cx), (cy, fy - cy), (cz, fz - cz)):
+      if fraction < margin:
+        near.append((cell, cell - 1))
+      elif fraction > 1.0 - margin:
+        near.append((cell, cell + 1))
+      else:
+        near.append((cell,))
+    if len(near[0]) + len(near[1]) + len(near[2]) > 3:
+      keys = itertools.product(*near)
+    found = -1
+    for key in keys:
+      for j in cells.get(key, ()):
+        dx, dy, dz = kept[3 * j] - x, kept[3 * j + 1] - y, kept[3 * j + 2] - z
+        if dx * dx + dy * dy + dz * dz <= limit:
+          found = j
+          break
+      if found >= 0:
+        break
+    if found < 0:
+      found = len(kept) // 3
+      kept.extend((x, y, z))
+      cells.setdefault((cx, cy, cz), []).append(found)
+    remap[i] = found
+  return kept, remap
+
+
+def weld(mesh, tolerance=None):
+  """ A copy of mesh with every point closer than tolerance to an earlier
+      kept point merged into it, and the faces pointed at the kept ids.
+      The faces are left as they are, see drop_degenerate_faces.
+
+      One tolerance does for every seam. The kernel works out both sides
+      of a seam with the same arithmetic, so they agree to rounding
+      (about 1e-12), and maya's boolean output to about 1e-6, while the
+      closest distinct points within any part shell are over 0.016 apart
+      (the ring of a 30 subdiv BigWheel). checks() makes sure ten times
+      the tolerance still merges nothing in any part. """
+  kept, remap = weld_ids(mesh, tolerance)
+  welded = LegoGeometry.Mesh()
+  welded.points = kept
+  welded.counts = array('i', mesh.counts)
+  welded.connects = array('i', [remap[vertex_id] for vertex_id in mesh.connects])
+  return welded
+
+
+def drop_degenerate_faces(mesh, area=1e-12):
+  """ A copy of mesh without repeated corners in its faces and without
+      the faces left with fewer than three corners, with less than area
+      or going round the same corners as a face before them. Points no
+      face uses anymore are dropped, the rest keep their order. """
+  points = mesh.points
+  faces = []
+  seen = set()
+  start = 0
+  for count in mesh.counts:
+    ids = mesh.connects[start:start + count]
+    start += count
+    corners = [vertex_id for k, vertex_id in enumerate(ids) if vertex_id != ids[k - 1]]
+    if len(corners) < 3:
+      continue
+    nx, ny, nz = newell(points, corners)
+    if 0.25 * (nx * nx + ny * ny + nz * nz) < area * area:
+      continue
+    first = corners.index(min(corners))
+    key = tuple(corners[first:] + corners[:first])
+    if key in seen:
+      continue
+    seen.add(key)
+    faces.append(corners)
+
+  used = array('i', [-1]) * mesh.vertex_count()
+  for corners in faces:
+    for vertex_id in corners:
+      used[vertex_id] = 0
+  cleaned = LegoGeometry.Mesh()
+  for vertex_id in range(0, mesh.vertex_count()):
+    if used[vertex_id] == 0:
+      used[vertex_id] = cleaned.add_point(points[3 * vertex_id], points[3 * vertex_id + 1], points[3 * vertex_id + 2])
+  for corners in faces:
+    cleaned.add_face([used[vertex_id] for vertex_id in corners])
+  return cleaned
+
+
+def clean(mesh, tolerance=None):
+  """ weld followed by drop_degenerate_faces, which is skipped when
+      nothing was welded as there is then nothing to have collapsed. """
+  welded = weld(mesh, tolerance)
+  if welded.vertex_count() == mesh.vertex_count():
+    return welded
+  return drop_degenerate_faces(welded)
+
+
+def shells(mesh):
+  """ The faces of mesh split into the groups that share points, as
+      lists of face ids in the order of their first face. """
+  parent = list(range(0, mesh.vertex_count()))
+
+  def root(vertex_id):
+    while parent[vertex_id] != vertex_id:
+      parent[vertex_id] = parent[parent[vertex_id]]
+      vertex_id = parent[vertex_id]
+    return vertex_id
+
+  starts = []
+  start = 0
+  for count in mesh.counts:
+    starts.append(start)
+    first = root(mesh.connects[start])
+    for vertex_id in mesh.connects[start + 1:start + count]:
+      parent[root(vertex_id)] = first
+    start += count
+  groups = {}
+  for face, start in enumerate(starts):
+    groups.setdefault(root(mesh.connects[start]), []).append(face)
+  return list(groups.values())
+
+
+def clean_shells(mesh, tolerance=None):
+  """ clean run over every shell of mesh on its own, so points are only
+      welded to points of their own shell. """
+  cleaned = LegoGeometry.Mesh()
+  starts = array('i', [0]) * mesh.face_count()
+  start = 0
+  for face, count in enumerate(mesh.counts):
+    starts[face] = start
+    start += count
+  for faces in shells(mesh):
+    shell = LegoGeometry.Mesh()
+    ids = {}
+    for face in faces:
+      corners = []
+      for vertex_id in mesh.connects[starts[face]:starts[face] + mesh.counts[face]]:
+        if vertex_id not in ids:
+          ids[vertex_id] = shell.add_point(*mesh.points[3 * vertex_id:3 * vertex_id + 3])
+        corners.append(ids[vertex_id])
+      shell.add_face(corners)
+    cleaned.append(clean(shell, tolerance))
+  return cleaned
+
+
+def welded(name, mesh):
+  """ mesh, a kernel mesh of the part name, welded the way
+      LegoGeometry.Welds says: "mesh" cleans it as a whole and "shells"
+      a shell at a time. """
+  weld = LegoGeometry.Welds.get(name)
+  if weld == "mesh":
+    return clean(mesh)
+  if weld == "shells":
+    return clean_shells(mesh)
+  return mesh
+
+
+def kernel_part(name, parameters):
+  """ The kernel mesh of the part name, welded as LegoGeometry.Welds says.
+      LegoBuilder and LegoExport both build parts through here, so a part
+      comes out the same in the scene and in the exported catalog. """
+  return welded(name, LegoGeometry.Parts[name](*parameters))
+
+
+def newell(points, ids):
+  """ The normal of a face scaled to twice its area. """
+  nx = ny = nz = 0.0
+  for k in range(0, len(ids)):
+    a, b = 3 * ids[k], 3 * ids[(k + 1) % len(ids)]
+    nx += (points[a + 1] - points[b + 1]) * (points[a + 2] + points[b + 2])
+    ny += (points[a + 2] - points[b + 2]) * (points[a] + points[b])
+    nz += (points[a] - points[b]) * (points[a + 1] + points[b + 1])
+  return nx, ny, nz
+
+
+def normalize(vectors):
+  for i in range(0, len(vectors), 3):
+    length = math.sqrt(vectors[i] ** 2 + vectors[i + 1] ** 2 + vectors[i + 2] ** 2) or 1.0
+    vectors[i] /= length
+    vectors[i + 1] /= length
+    vectors[i + 2] /= length
+  return vectors
+
+
+def area_normals(mesh):
+  """ Every face's area scaled normal, as flat xyz. """
+  if numpy is not None:
+    return numpy_area_normals(mesh)
+  normals = array('d')
+  start = 0
+  for count in mesh.counts:
+    normals.extend(newell(mesh.points, mesh.connects[start:start + count]))
+    start += count
+  return normals
+
+
+def numpy_area_normals(mesh):
+  points = numpy.frombuffer(mesh.points, dtype=numpy.float64).reshape(-1, 3)
+  counts = numpy.frombuffer(mesh.counts, dtype=numpy.int32)
+  connects = numpy.frombuffer(mesh.connects, dtype=numpy.int32)
+  ends = numpy.cumsum(counts)
+  starts = ends - counts
+  following = numpy.arange(1, len(connects) + 1)
+  following[ends - 1] = starts
+  a, b = points[connects], points[connects[following]]
+  terms = numpy.empty_like(a)
+  terms[:, 0] = (a[:, 1] - b[:, 1]) * (a[:, 2] + b[:, 2])
+  terms[:, 1] = (a[:, 2] - b[:, 2]) * (a[:, 0] + b[:, 0])
+  terms[:, 2] = (a[:, 0] - b[:, 0]) * (a[:, 1] + b[:, 1])
+  return array('d', numpy.add.reduceat(terms, starts, axis=0).ravel().tobytes())
+
+
+def first_three_normals(mesh):
+  """ Every face's (b - a) x (c - a) for its first three corners, as flat
+      xyz. """
+  if numpy is not None:
+    points = numpy.frombuffer(mesh.points, dtype=numpy.float64).reshape(-1, 3)
+    counts = numpy.frombuffer(mesh.counts, dtype=numpy.int32)
+    connects = numpy.frombuffer(mesh.connects, dtype=numpy.int32)
+    starts = numpy.cumsum(counts) - counts
+    a, b, c = points[connects[starts]], points[connects[starts + 1]], points[connects[starts + 2]]
+    return array('d', numpy.cross(b - a, c - a).ravel().tobytes())
+  points = mesh.points
+  normals = array('d')
+  start = 0
+  for count in mesh.counts:
+    a, b, c = 3 * mesh.connects[start], 3 * mesh.connects[start + 1], 3 * mesh.connects[start + 2]
+    start += count
+    u = (points[b] - points[a], points[b + 1] - points[a + 1], points[b + 2] - points[a + 2])
+    v = (points[c] - points[a], points[c + 1] - points[a + 1], points[c + 2] - points[a + 2])
+    normals.extend((u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0]))
+  return normals
+
+
+def face_normals(mesh, first_three=False):
+  """ The unit normal of every face, as flat xyz: from all its corners
+      (see newell), or from its first three with first_three, the way
+      the tutorial MEL works it out. Faces without area get zeros. """
+  normals = first_three_normals(mesh) if first_three else area_normals(mesh)
+  if numpy is not None:
+    vectors = numpy.frombuffer(normals, dtype=numpy.float64).reshape(-1, 3)
+    lengths = numpy.linalg.norm(vectors, axis=1)
+    lengths[lengths == 0] = 1.0
+    return array('d', (vectors / lengths[:, None]).ravel().tobytes())
+  return normalize(normals)
+
+
+def vertex_normals(mesh, tolerance=None):
+  """ The unit normal of every point, as flat xyz: the area weighted sum
+      of the normals of the faces round it, summed over every point it
+      welds to, so both sides of an unwelded seam get the same normal. """
+  normals = area_normals(mesh)
+  kept, remap = weld_ids(mesh, tolerance)
+  if numpy is not None:
+    counts = numpy.frombuffer(mesh.counts, dtype=numpy.int32)
+    connects = numpy.frombuffer(mesh.connects, dtype=numpy.int32)
+    remap = numpy.frombuffer(remap, dtype=numpy.int32)
+    faces = numpy.frombuffer(normals, dtype=numpy.float64).reshape(-1, 3)
+    sums = numpy.zeros((len(kept) // 3, 3))
+    numpy.add.at(sums, remap[connects], numpy.repeat(faces, counts, axis=0))
+    lengths = numpy.linalg.norm(sums, axis=1)
+    lengths[lengths == 0] = 1.0
+    return array('d', (sums / lengths[:, None])[remap].ravel().tobytes())
+  sums = array('d', [0.0]) * len(kept)
+  start = 0
+  for face, count in enumerate(mesh.counts):
+    nx, ny, nz = normals[3 * face], normals[3 * face + 1], normals[3 * face + 2]
+    for vertex_id in mesh.connects[start:start + count]:
+      kept_id = 3 * remap[vertex_id]
+      sums[kept_id] += nx
+      sums[kept_id + 1] += ny
+      sums[kept_id + 2] += nz
+    start += count
+  normalize(sums)
+  unit = array('d')
+  for kept_id in remap:
+    unit.extend(sums[3 * kept_id:3 * kept_id + 3])
+  return unit
+
+
+# CHECKS
+
+def split_grid(size):
+  """ A size x size grid of quads on the xz plane where every quad has
+      its own four points, so welding should bring the points down to
+      (size + 1) squared. Points are jittered by a tenth of the weld
+      tolerance so the welding is not down to exact equality. """
+  jitter = random.Random(0)
+  tolerance = Constants["weld_tolerance"]
+  mesh = LegoGeometry.Mesh()
+  for i in range(0, size):
+    for j in range(0, size):
+      ids = [mesh.add_point(x + jitter.uniform(-0.1, 0.1) * tolerance, 0.0, z + jitter.uniform(-0.1, 0.1) * tolerance)
+             for x, z in ((i, j + 1), (i + 1, j + 1), (i + 1, j), (i, j))]
+      mesh.add_face(ids)
+  return mesh
+
+
+def checks():
+  """ Runs the ops over small meshes whose answers are known and returns
+      the failures. """
+  failures = []
+  welded = weld(split_grid(10))
+  if welded.vertex_count() != 121:
+    failures.append("split grid welded to %d points, not 121" % welded.vertex_count())
+
+  box = LegoGeometry.box(1, 1, 1)
+  if weld(box).vertex_count() != 8:
+    failures.append("a box lost points to welding")
+  # a sliver one hundredth of the tolerance high has to stay apart.
+  sliver = LegoGeometry.box(1, Constants["weld_tolerance"] * 0.01, 1)
+  if weld(sliver, Constants["weld_tolerance"] * 0.001).vertex_count() != 8:
+    failures.append("a tight tolerance merged the sliver box")
+  # welded flat the sides go and the top and bottom stay.
+  if clean(sliver).face_count() != 2:
+    failures.append("collapsing the sliver box left %d faces, not 2" % clean(sliver).face_count())
+
+  expected = [(0, 0, 1), (0, 1, 0), (0, 0, -1), (0, -1, 0), (1, 0, 0), (-1, 0, 0)]
+  for first_three in (False, True):
+    normals = face_normals(box, first_three)
+    for face, direction in enumerate(expected):
+      if any(abs(normals[3 * face + axis] - direction[axis]) > 1e-9 for axis in range(0, 3)):
+        failures.append("box face %d normal is not %s (first_three %s)" % (face, direction, first_three))
+
+  # every corner of a box points out along its diagonal, also when each
+  # face has its own copy of the corner.
+  split_box = LegoGeometry.Mesh()
+  start = 0
+  for count in box.counts:
+    split_box.add_face([split_box.add_point(*box.points[3 * vertex_id:3 * vertex_id + 3])
+                        for vertex_id in box.connects[start:start + count]])
+    start += count
+  for name, mesh in (("box", box), ("split box", split_box)):
+    normals = vertex_normals(mesh)
+    for vertex_id in range(0, mesh.vertex_count()):
+      point = mesh.points[3 * vertex_id:3 * vertex_id + 3]
+      if any(abs(normals[3 * vertex_id + axis] - math.copysign(1 / math.sqrt(3), point[axis])) > 1e-9 for axis in range(0, 3)):
+        failures.append("%s corner %s has normal %s" % (name, list(point), list(normals[3 * vertex_id:3 * vertex_id + 3])))
+        break
+
+  # one tolerance has to do for every seam: ten times it still merges
+  # no two points of any part, smallest or largest.
+  for name in sorted(LegoGeometry.Parts):
+    for pick in (1, 2):
+      parameters = tuple(bounds[pick] for bounds in Ranges[name])
+      mesh = LegoGeometry.Parts[name](*parameters)
+      weld_shell = clean_shells if LegoGeometry.Welds.get(name) == "shells" else clean
+      if weld_shell(mesh, 10 * Constants["weld_tolerance"]).vertex_count() != mesh.vertex_count():
+        failures.append("ten weld tolerances merge points of %s%s" % (name, parameters))
+
+  triangle = LegoGeometry.Mesh()
+  for point in ((0, 0, 0), (1, 0, 0), (2, 0, 0), (0, 1, 0)):
+    triangle.add_point(*point)
+  triangle.add_face((0, 1, 2))
+  triangle.add_face((0, 0, 1, 3))
+  cleaned = drop_degenerate_faces(triangle)
+  if list(cleaned.counts) != [3] or cleaned.vertex_count() != 3:
+    failures.append("degenerate faces left %s" % list(cleaned.counts))
+  return failures
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Check the mesh ops and time them on a large split grid.")
+  parser.add_argument("--vertices", type=int, default=1000000)
+  arguments = parser.parse_args(argv)
+  failures = checks()
+  for failure in failures:
+    print("FAILED: " + failure)
+  mesh = split_grid(int(math.sqrt(arguments.vertices / 4)))
+  print("%d points, %d faces, normals with %s" % (mesh.vertex_count(), mesh.face_count(), "numpy" if numpy is not None else "python"))
+  for name, op in (("weld", weld), ("drop_degenerate_faces", drop_degenerate_faces), ("face_normals", face_normals), ("vertex_normals", vertex_normals)):
+    start = time.time()
+    result = op(mesh)
+    print("%s: %.2fs" % (name, time.time() - start))
+    if name == "weld":
+      print("  %d points left" % result.vertex_count())
+  return 1 if failures else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,64 @@
+""" LegoPly - reads and writes LegoGeometry meshes as binary PLY files.
+
+    Kept apart from LegoExport so the part library can store meshes
+    without pulling in the export process pool. Nothing in here imports
+    maya. """
+
+from array import array
+import struct
+import sys
+
+import LegoGeometry
+
+
+def write_ply(mesh, path):
+  """ Binary PLY: the points as one float block, faces as uchar counts
+      followed by int ids, assembled in memory and written in one go. """
+  little = sys.byteorder == "little"
+  header = ("ply\nformat binary_%s_endian 1.0\n"
+            "element vertex %d\nproperty float x\nproperty float y\nproperty float z\n"
+            "element face %d\nproperty list uchar int vertex_indices\nend_header\n"
+            % ("little" if little else "big", mesh.vertex_count(), mesh.face_count()))
+  body = bytearray(header.encode("ascii"))
+  body += array('f', mesh.points).tobytes()
+  start = 0
+  for count in mesh.counts:
+    body += struct.pack("=B%di" % count, count, *mesh.connects[start:start + count])
+    start += count
+  with open(path, "wb") as output:
+    output.write(body)
+  return len(body)
+
+
+def read_ply(path):
+  """ Reads a binary PLY written by write_ply back into a Mesh. """
+  with open(path, "rb") as source:
+    data = source.read()
+  end = data.index(b"end_header\n") + len(b"end_header\n")
+  header = data[:end].decode("ascii").split("\n")
+  order = "<" if "format binary_little_endian 1.0" in header else ">"
+  vertices = faces = 0
+  for line in header:
+    if line.startswith("element vertex "):
+      vertices = int(line.split()[2])
+    elif line.startswith("element face "):
+      faces = int(line.split()[2])
+
+  mesh = LegoGeometry.Mesh()
+  points = array('f')
+  points.frombytes(data[end:end + 12 * vertices])
+  if (order == "<") != (sys.byteorder == "little"):
+    points.byteswap()
+  mesh.points = array('d', points)
+  # walk the counts, then convert all the ids in one go.
+  offset = end + 12 * vertices
+  ids = []
+  for face in range(0, faces):
+    count = data[offset]
+    mesh.counts.append(count)
+    ids.append(data[offset + 1:offset + 1 + 4 * count])
+    offset += 1 + 4 * count
+  mesh.connects.frombytes(b"".join(ids))
+  if (order == "<") != (sys.byteorder == "little"):
+    mesh.connects.byteswap()
+  return mesh
@@ -0,0 +1,196 @@
+""" LegoProfiler - opt in instrumentation for the LegoBuilder generators.
+
+    While enabled, every generate records its wall time, how long was
+    spent in each phase (parameter query, primitive creation, transforms,
+    unite, boolean, shading and plain python), how many times each cmds
+    command ran and how many nodes were created, and hands the Profile to
+    every sink. While disabled the hooks return straight away. """
+
+import collections
+import json
+import time
+
+
+# which phase a maya.cmds command counts towards.
+Phases = {
+  "intSliderGrp" : "query",
+  "colorSliderGrp" : "query",
+  "polyCube" : "primitive",
+  "polyCylinder" : "primitive",
+  "polyPipe" : "primitive",
+  "duplicate" : "primitive",
+  "instance" : "primitive",
+  "createNode" : "primitive",
+  "parent" : "transform",
+  "move" : "transform",
+  "rotate" : "transform",
+  "polyUnite" : "unite",
+  "polyMergeVertex" : "unite",
+  "polyBoolOp" : "boolean",
+  "shadingNode" : "shading",
+  "sets" : "shading",
+  "connectAttr" : "shading",
+  "hyperShade" : "shading"
+}
+
+
+class Profile:
+  """ What one generate cost. """
+  def __init__(self, generator):
+    self.generator = generator
+    self.parameters = {}
+    self.phases = {}
+    self.calls = {}
+    self.nodes_created = 0
+    self.seconds = 0.0
+    self.start = time.time()
+    self.active_phase = None
+
+  def add_time(self, phase, seconds):
+    self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+  def as_dict(self):
+    return {
+      "generator" : self.generator,
+      "parameters" : self.parameters,
+      "seconds" : self.seconds,
+      "phases" : self.phases,
+      "calls" : self.calls,
+      "nodes_created" : self.nodes_created
+    }
+
+
+class NullPhase:
+  """ Handed out by Profiler.phase while nothing is being profiled. """
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    return False
+
+null_phase = NullPhase()
+
+
+class Phase:
+  """ Times a block of python work into a phase of the current profile.
+      cmds calls made inside it are counted but not timed again. """
+  def __init__(self, profile, name):
+    self.profile = profile
+    self.name = name
+
+  def __enter__(self):
+    self.outer = self.profile.active_phase
+    self.profile.active_phase = self.name
+    self.start = time.time()
+    return self
+
+  def __exit__(self, *args):
+    self.profile.active_phase = self.outer
+    if self.outer is None:
+      self.profile.add_time(self.name, time.time() - self.start)
+    return False
+
+
+class Profiler:
+  def __init__(self):
+    self.enabled = False
+    self.sinks = []
+    self.current = None
+
+  def begin(self, generator):
+    """ Starts a profile, unless profiling is off or one is running. """
+    if not self.enabled or self.current is not None:
+      return None
+    self.current = Profile(generator)
+    return self.current
+
+  def end(self, profile):
+    if profile is None:
+      return
+    profile.seconds = time.time() - profile.start
+    # whatever no phase accounts for went on plain python work.
+    profile.add_time("python", max(0.0, profile.seconds - sum(profile.phases.values())))
+    self.current = None
+    for sink in self.sinks:
+      sink.write(profile)
+
+  def phase(self, name):
+    if self.current is None:
+      return null_phase
+    return Phase(self.current, name)
+
+  def node_added(self, *args):
+    if self.current is not None:
+      self.current.nodes_created += 1
+
+
+class CountingCmds:
+  """ Stands in for maya.cmds while profiling, counting every command and
+      timing it into its phase of the current profile. """
+
+  def __init__(self, cmds, profiler):
+    self.cmds = cmds
+    self.profiler = profiler
+
+  def __getattr__(self, name):
+    command = getattr(self.cmds, name)
+    if not callable(command):
+      return command
+
+    def counted(*args, **kwargs):
+      profile = self.profiler.current
+      if profile is None:
+        return command(*args, **kwargs)
+      profile.calls[name] = profile.calls.get(name, 0) + 1
+      if profile.active_phase is not None:
+        return command(*args, **kwargs)
+      start = time.time()
+      try:
+        return command(*args, **kwargs)
+      finally:
+        profile.add_time(Phases.get(name, "other"), time.time() - start)
+    return counted
+
+
+# SINKS
+
+class RingBufferSink:
+  """ Keeps the last size profiles in memory. """
+  def __init__(self, size=256):
+    self.profiles = collections.deque(maxlen=size)
+
+  def write(self, profile):
+    self.profiles.append(profile)
+
+
+class JsonlSink:
+  """ Appends every profile to a file as one JSON object per line. """
+  def __init__(self, path):
+    self.path = path
+
+  def write(self, profile):
+    with open(self.path, "a") as output:
+      output.write(json.dumps(profile.as_dict(), sort_keys=True) + "\n")
+
+
+class SummarySink:
+  """ Running totals per generator, for showing in a window. """
+  def __init__(self):
+    self.totals = collections.OrderedDict()
+
+  def write(self, profile):
+    total = self.totals.setdefault(profile.generator, {"runs" : 0, "seconds" : 0.0, "calls" : 0, "nodes" : 0, "phases" : {}})
+    total["runs"] += 1
+    total["seconds"] += profile.seconds
+    total["calls"] += sum(profile.calls.values())
+    total["nodes"] += profile.nodes_created
+    for phase, seconds in profile.phases.items():
+      total["phases"][phase] = total["phases"].get(phase, 0.0) + seconds
+
+  def lines(self):
+    lines = []
+    for generator, total in self.totals.items():
+      lines.append("%s: %d runs, %.3fs, %d cmds, %d nodes" % (generator, total["runs"], total["seconds"], total["calls"], total["nodes"]))
+      for phase, seconds in sorted(total["phases"].items(), key=lambda item: -item[1]):
+        lines.append("    %s %.3fs" % (phase, seconds))
+    return lines
@@ -0,0 +1,342 @@
+""" PlaneAnalysis - the A01 selection inspection, for whole selections.
+
+    Does what IMD3002_A01_J.CATAFORD_Script.mel does for the planes and
+    locators in the selection, with the same formulas:
+      normal = (a - c) x (b - c) for the first three corners of face 0
+      plane = (normal, -normal . a), so Ax + By + Cz + D = 0
+      distance = (normal . p + D) / |normal|
+    but every corner is read in one bulk MFnMesh.getPoints per plane
+    and every (plane, locator) pair is worked out at once, with numpy
+    broadcasting when numpy is installed and plain python when it is
+    not, so thousands of planes and points stay quick.
+
+    The line intersection solves normal . (a + t (a - b)) + D = 0. The
+    MEL adds D where this subtracts it, so the two only agree for planes
+    through the origin, and the MEL measures every locator against the
+    last plane only. Here every locator is measured against every plane.
+    A plane whose first three corners lie in a line has no normal, where
+    the MEL divides by zero: both paths give it nan normals, distances
+    and crossings, and analyze lists it under "degenerate". maya is only
+    imported to read the selection, the maths runs without
+    it:
+
+      python PlaneAnalysis.py --planes 2000 --points 2000 """
+
+import argparse
+import math
+import random
+import sys
+import time
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
+def cross(u, v):
+  return (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+
+
+def dot(u, v):
+  return u[0] * v[0] + u[1] * v[1] + u[2] * v[2]
+
+
+def plane_equations(corners):
+  """ (A, B, C, D) for every plane given as its first three corners, a
+      flat list of nine coordinates per plane. """
+  if numpy is not None:
+    corners = numpy.asarray(corners, dtype=float).reshape(-1, 3, 3)
+    a, b, c = corners[:, 0], corners[:, 1], corners[:, 2]
+    normals = numpy.cross(a - c, b - c)
+    return numpy.column_stack((normals, -numpy.einsum("ij,ij->i", normals, a)))
+  planes = []
+  for plane in corners:
+    a, b, c = plane[0:3], plane[3:6], plane[6:9]
+    normal = cross([a[k] - c[k] for k in range(0, 3)], [b[k] - c[k] for k in range(0, 3)])
+    planes.append(normal + (-dot(normal, a),))
+  return planes
+
+
+def normal_lengths(planes):
+  """ The length of every plane's normal, nan for the degenerate ones. """
+  if numpy is not None:
+    lengths = numpy.linalg.norm(numpy.asarray(planes, dtype=float).reshape(-1, 4)[:, :3], axis=1)
+    lengths[lengths == 0] = numpy.nan
+    return lengths
+  return [math.sqrt(dot(plane, plane[:3])) or float("nan") for plane in planes]
+
+
+def degenerate(planes):
+  """ The ids of the planes with a zero normal, from corners in a line. """
+  return [i for i, length in enumerate(normal_lengths(planes)) if math.isnan(length)]
+
+
+def unit_normals(planes):
+  """ The normal of every plane scaled to unit length, nan for the
+      degenerate ones. """
+  lengths = normal_lengths(planes)
+  if numpy is not None:
+    return numpy.asarray(planes, dtype=float).reshape(-1, 4)[:, :3] / lengths[:, None]
+  return [tuple(value / length for value in plane[:3]) for plane, length in zip(planes, lengths)]
+
+
+def distances(planes, points):
+  """ The signed distance from every point to every plane, one row per
+      plane and one column per point. Rows of degenerate planes are nan. """
+  lengths = normal_lengths(planes)
+  if numpy is not None:
+    planes = numpy.asarray(planes, dtype=float).reshape(-1, 4)
+    points = numpy.asarray(points, dtype=float).reshape(-1, 3)
+    return (planes[:, :3].dot(points.T) + planes[:, 3:4]) / lengths[:, None]
+  return [[(dot(plane, point) + plane[3]) / length for point in points] for plane, length in zip(planes, lengths)]
+
+
+def intersections(planes, starts, ends):
+  """ Where the line through starts[i] and ends[i] crosses every plane,
+      one row per plane and one xyz per line. Lines parallel to a plane
+      (or lying in it) come out as nan. """
+  if numpy is not None:
+    planes = numpy.asarray(planes, dtype=float)
+    starts = numpy.asarray(starts, dtype=float).reshape(-1, 3)
+    rays = starts - numpy.asarray(ends, dtype=float).reshape(-1, 3)
+    along = planes[:, :3].dot(rays.T)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+      t = -(planes[:, :3].dot(starts.T) + planes[:, 3:4]) / along
+    t[along == 0] = numpy.nan
+    return starts[None, :, :] + t[:, :, None] * rays[None, :, :]
+  rows = []
+  for plane in planes:
+    row = []
+    for start, end in zip(starts, ends):
+      ray = [start[k] - end[k] for k in range(0, 3)]
+      along = dot(plane, ray)
+      if along == 0:
+        row.append((float("nan"),) * 3)
+        continue
+      t = -(dot(plane, start) + plane[3]) / along
+      row.append(tuple(start[k] + t * ray[k] for k in range(0, 3)))
+    rows.append(row)
+  return rows
+
+
+def angle(a, b, c):
+  """ The cross product of ba and bc and the angle between them, what the
+      MEL prints for three locators. """
+  ba = [a[k] - b[k] for k in range(0, 3)]
+  bc = [c[k] - b[k] for k in range(0, 3)]
+  lengths = math.sqrt(dot(ba, ba)) * math.sqrt(dot(bc, bc))
+  if lengths == 0:
+    raise ValueError("The vectors you are attempting to get the angle of are zero length.")
+  return cross(ba, bc), math.acos(max(-1.0, min(1.0, dot(ba, bc) / lengths)))
+
+
+# SELECTION
+
+def read_planes(meshes):
+  """ The first three corners of face 0 of every mesh, world and local,
+      each from one bulk getPoints. """
+  import maya.api.OpenMaya as om
+  world, local = [], []
+  for mesh in meshes:
+    shape = om.MFnMesh(om.MSelectionList().add(mesh).getDagPath(0))
+    ids = shape.getPolygonVertices(0)[:3]
+    for corners, space in ((world, om.MSpace.kWorld), (local, om.MSpace.kObject)):
+      points = shape.getPoints(space)
+      corners.append([value for i in ids for value in (points[i].x, points[i].y, points[i].z)])
+  return world, local
+
+
+def read_locators(locators):
+  """ The world position of every locator, from its world matrix. """
+  import maya.api.OpenMaya as om
+  positions = []
+  for locator in locators:
+    matrix = om.MSelectionList().add(locator).getDagPath(0).inclusiveMatrix()
+    positions.append((matrix[12], matrix[13], matrix[14]))
+  return positions
+
+
+def analyze(selection=None):
+  """ Measures every locator in the selection (or in selection) against
+      every plane in it. Lines run through the locators two at a time,
+      as the MEL does for exactly two. Returns a dict of the results. """
+  import maya.cmds as cmds
+  if selection is None:
+    selection = cmds.ls(selection=True, type="transform")
+  meshes = cmds.filterExpand(selection, selectionMask=12) or []
+  locators = cmds.filterExpand(selection, selectionMask=22) or []
+  if not meshes:
+    raise ValueError("Can't analyze, need at least one mesh to be selected.")
+  world, local = read_planes(meshes)
+  planes = plane_equations(world)
+  points = read_locators(locators)
+  result = {
+    "meshes" : meshes,
+    "locators" : locators,
+    "planes" : planes,
+    "degenerate" : [meshes[i] for i in degenerate(planes)],
+    "world_normals" : unit_normals(planes),
+    "local_normals" : unit_normals(plane_equations(local)),
+    "positions" : points,
+    "distances" : distances(planes, points) if points else []
+  }
+  if len(points) >= 2:
+    result["intersections"] = intersections(planes, points[0:len(points) - 1:2], points[1::2])
+  if len(points) == 3:
+    result["cross"], result["angle"] = angle(*points)
+  return result
+
+
+def print_report(result, limit=20):
+  """ Prints an analyze result like the MEL debug output, the first
+      limit planes and locators of it. """
+  print("%d Locators\n%d Meshes\n" % (len(result["locators"]), len(result["meshes"])))
+  for mesh in result["degenerate"]:
+    print("Plane '%s' has its first three corners in a line, it has no normal." % mesh)
+  for i, mesh in enumerate(result["meshes"][:limit]):
+    a, b, c, d = result["planes"][i]
+    print("Plane '%s':\n\tA: %g B: %g C: %g D: %g" % (mesh, a, b, c, d))
+    print("\tNormalized World Normal Vector: X: %g Y: %g Z: %g" % tuple(result["world_normals"][i]))
+    for j, locator in enumerate(result["locators"][:limit]):
+      print("\tLocator '%s' Point Plane Distance: %g" % (locator, result["distances"][i][j]))
+    for j, point in enumerate(result.get("intersections", [[]] * (i + 1))[i][:limit]):
+      print("\tLine %d intersection: x: %g y: %g z: %g" % ((j,) + tuple(point)))
+  if "angle" in result:
+    print("cross product of BA and BC is: x: %g y: %g z: %g" % tuple(result["cross"]))
+    print("angle between them is: theta (in radians): %g" % result["angle"])
+
+
+# CHECKS
+
+def mel_plane_equation(a, b, c):
+  """ getPlaneEquation, line by line. """
+  v1 = [a[0] - c[0], a[1] - c[1], a[2] - c[2]]
+  v2 = [b[0] - c[0], b[1] - c[1], b[2] - c[2]]
+  n = [v1[1] * v2[2] - v1[2] * v2[1], v1[2] * v2[0] - v1[0] * v2[2], v1[0] * v2[1] - v1[1] * v2[0]]
+  d = 0
+  d += n[0] * a[0]
+  d += n[1] * a[1]
+  d += n[2] * a[2]
+  return [n[0], n[1], n[2], -d]
+
+
+def mel_point_plane_distance(plane, point):
+  """ getPointPlaneDistance, line by line. """
+  return (plane[0] * point[0] + plane[1] * point[1] + plane[2] * point[2] + plane[3]) / math.sqrt(plane[0] ** 2 + plane[1] ** 2 + plane[2] ** 2)
+
+
+def mel_line_plane_intersection(plane, a, b):
+  """ getLinePlaneIntersection, line by line, slip included. """
+  ba = [a[0] - b[0], a[1] - b[1], a[2] - b[2]]
+  n_dot_a = plane[0] * a[0] + plane[1] * a[1] + plane[2] * a[2]
+  n_dot_ba = plane[0] * ba[0] + plane[1] * ba[1] + plane[2] * ba[2]
+  return [a[k] + ((plane[3] - n_dot_a) / n_dot_ba) * ba[k] for k in range(0, 3)]
+
+
+def random_layout(planes, points, seed=0):
+  """ planes random triangles' corners and points random positions. """
+  choice = random.Random(seed)
+  value = lambda: choice.uniform(-10, 10)
+  return [[value() for k in range(0, 9)] for i in range(0, planes)], [(value(), value(), value()) for i in range(0, points)]
+
+
+def close(a, b, tolerance=1e-6):
+  return abs(a - b) <= tolerance * max(1.0, abs(a), abs(b))
+
+
+def checks(seed=0):
+  """ Compares the bulk results against the MEL formulas on random
+      planes and locators and returns the failures. """
+  failures = []
+  corners, points = random_layout(50, 40, seed)
+  planes = plane_equations(corners)
+  table = distances(planes, points)
+  for i, plane in enumerate(corners):
+    expected = mel_plane_equation(plane[0:3], plane[3:6], plane[6:9])
+    if not all(close(planes[i][k], expected[k]) for k in range(0, 4)):
+      failures.append("plane %d is %s, the MEL gives %s" % (i, list(planes[i]), expected))
+    for j, point in enumerate(points):
+      if not close(table[i][j], mel_point_plane_distance(expected, point)):
+        failures.append("distance from point %d to plane %d differs from the MEL" % (j, i))
+
+  # the MEL intersection is right for planes through the origin.
+  through_origin = [list(plane[:3]) + [0.0] for plane in planes]
+  crossings = intersections(through_origin, points[0::2], points[1::2])
+  for i, plane in enumerate(through_origin):
+    for j, (a, b) in enumerate(zip(points[0::2], points[1::2])):
+      expected = mel_line_plane_intersection(plane, a, b)
+      if not all(close(crossings[i][j][k], expected[k], 1e-5) for k in range(0, 3)):
+        failures.append("line %d crosses plane %d somewhere else than the MEL says" % (j, i))
+  # and everywhere else the crossing has to lie on both plane and line.
+  crossings = intersections(planes, points[0::2], points[1::2])
+  for i, plane in enumerate(planes):
+    for j, (a, b) in enumerate(zip(points[0::2], points[1::2])):
+      point = crossings[i][j]
+      if not close(mel_point_plane_distance(plane, point), 0.0, 1e-6):
+        failures.append("line %d crosses plane %d off the plane" % (j, i))
+      off_line = cross([point[k] - a[k] for k in range(0, 3)], [b[k] - a[k] for k in range(0, 3)])
+      if not close(math.sqrt(dot(off_line, off_line)), 0.0, 1e-5):
+        failures.append("line %d crosses plane %d off the line" % (j, i))
+
+  failures.extend(degenerate_checks())
+  parallel = intersections([(0.0, 1.0, 0.0, -1.0)], [(0, 0, 0)], [(1, 0, 0)])
+  if not math.isnan(parallel[0][0][0]):
+    failures.append("a line parallel to its plane crossed it")
+  if not close(angle((1, 0, 0), (0, 0, 0), (0, 1, 0))[1], math.pi / 2):
+    failures.append("the angle between x and y is not a right angle")
+  return failures
+
+
+def degenerate_checks():
+  """ A plane from corners in a line has to come out the same way with
+      and without numpy: listed by degenerate, with nan normals,
+      distances and crossings, leaving the good plane beside it alone. """
+  global numpy
+  failures = []
+  installed = numpy
+  corners = [[0, 0, 0, 1, 1, 1, 2, 2, 2], [0, 0, 0, 1, 0, 0, 0, 0, 1]]
+  try:
+    for path in ([installed, None] if installed is not None else [None]):
+      numpy = path
+      label = "numpy" if path is not None else "python"
+      planes = plane_equations(corners)
+      if degenerate(planes) != [0]:
+        failures.append("%s: the degenerate planes are %s, not [0]" % (label, degenerate(planes)))
+      normals = unit_normals(planes)
+      if not all(math.isnan(value) for value in normals[0]) or any(math.isnan(value) for value in normals[1]):
+        failures.append("%s: the normals are %s" % (label, [list(normal) for normal in normals]))
+      table = distances(planes, [(0, 1, 0), (0, -2, 0)])
+      if not all(math.isnan(value) for value in table[0]) or [round(value, 9) for value in table[1]] != [-1.0, 2.0]:
+        failures.append("%s: the distances are %s" % (label, [list(row) for row in table]))
+      if not all(math.isnan(value) for value in intersections(planes, [(0, 1, 0)], [(0, -1, 0)])[0][0]):
+        failures.append("%s: a line crossed the degenerate plane" % label)
+  finally:
+    numpy = installed
+  return failures
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Check the plane analysis against the MEL formulas and time it on random planes and points.")
+  parser.add_argument("--planes", type=int, default=2000)
+  parser.add_argument("--points", type=int, default=2000)
+  arguments = parser.parse_args(argv)
+  failures = checks()
+  for failure in failures:
+    print("FAILED: " + failure)
+  corners, points = random_layout(arguments.planes, arguments.points, seed=1)
+  print("%d planes x %d points, with %s" % (arguments.planes, arguments.points, "numpy" if numpy is not None else "python"))
+  start = time.time()
+  planes = plane_equations(corners)
+  print("plane equations: %.3fs" % (time.time() - start))
+  start = time.time()
+  distances(planes, points)
+  print("distances: %.3fs" % (time.time() - start))
+  start = time.time()
+  intersections(planes, points[0::2], points[1::2])
+  print("intersections: %.3fs" % (time.time() - start))
+  return 1 if failures else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())